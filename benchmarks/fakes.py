@@ -0,0 +1,106 @@
+"""
+Stand-ins for the discord.py objects the cogs touch.
+
+Enough of discord.Interaction, its response/followup and the bot for the
+command callbacks to run without a gateway connection: responses are
+recorded instead of sent, and dispatched events run the cogs' listeners as
+background tasks like discord.py does.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.mention = f'<@{user_id}>'
+        self.bot = False
+
+class FakeResponse:
+    """interaction.response: records what would have been sent"""
+
+    def __init__(self, interaction: 'FakeInteraction'):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        self._done = True
+        self._interaction.sent.append((content, kwargs))
+
+    async def edit_message(self, content: Optional[str] = None, **kwargs):
+        self._done = True
+        self._interaction.sent.append((content, kwargs))
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+class FakeFollowup:
+    def __init__(self, interaction: 'FakeInteraction'):
+        self._interaction = interaction
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        self._interaction.sent.append((content, kwargs))
+
+class FakeInteraction:
+    """One slash command or button click from a user in a guild"""
+
+    def __init__(self, client: 'FakeBot', user: FakeUser, guild_id: int):
+        self.client = client
+        self.user = user
+        self.guild_id = guild_id
+        self.guild = None
+        self.channel = None
+        self.message = None
+        self.extras: Dict[str, Any] = {}
+        self.sent: List[Tuple[Optional[str], dict]] = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def original_response(self):
+        return None
+
+class FakeBot:
+    """The parts of the bot the cogs use: dispatch() and their listeners"""
+
+    def __init__(self):
+        self.cogs: List[Any] = []
+        self.latency = 0.0
+        # Events dispatched by each running task (so a worker can see the
+        # trade IDs its own command created)
+        self.dispatched: Dict[asyncio.Task, List[Tuple[str, tuple]]] = {}
+        self._listener_tasks: Set[asyncio.Task] = set()
+
+    async def add_cog(self, cog):
+        await cog.cog_load()
+        self.cogs.append(cog)
+
+    def add_dynamic_items(self, *items):
+        pass
+
+    def remove_dynamic_items(self, *items):
+        pass
+
+    def dispatch(self, event: str, *args):
+        task = asyncio.current_task()
+        if task is not None:
+            self.dispatched.setdefault(task, []).append((event, args))
+
+        for cog in self.cogs:
+            for name, listener in cog.get_listeners():
+                if name == f'on_{event}':
+                    listener_task = asyncio.create_task(listener(*args))
+                    self._listener_tasks.add(listener_task)
+                    listener_task.add_done_callback(self._listener_tasks.discard)
+
+    def take_events(self) -> List[Tuple[str, tuple]]:
+        """Events dispatched by the current task since the last call"""
+        return self.dispatched.pop(asyncio.current_task(), [])
+
+    async def drain(self):
+        """Wait for every listener still running"""
+        while self._listener_tasks:
+            await asyncio.gather(*list(self._listener_tasks), return_exceptions=True)
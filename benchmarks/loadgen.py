@@ -0,0 +1,451 @@
+"""
+Synthetic load generator for the trading cogs and the storage layer.
+
+Drives the real /sell, /buy, /search, /market, /mylistings, /offer and
+/accept callbacks (and the offer Accept button) with fake interactions,
+against a scratch database seeded with listings. Workers pick commands by
+weight from a workload mix and run them back to back, so --concurrency is
+the number of commands in flight.
+
+Latency is recorded per command (the whole callback) and per storage
+function (the blocking call itself, without queueing; SQLite writes also
+exclude the group commit). The report is written as JSON so runs of two
+versions can be compared, optionally against a --baseline report.
+
+Run from the repository root:
+
+    python -m benchmarks.loadgen --mix search=70,sell=20,offer=5,accept=5 --concurrency 16 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.fakes import FakeBot, FakeInteraction, FakeUser
+from cogs.market import Market
+from cogs.matching import Matching
+from cogs.offers import AcceptOfferButton, Offers
+from cogs.trading import Trading
+from database import async_db
+from database.memory_storage import MemoryStorage
+from database.storage import SQLiteStorage, Storage
+from utils.catalog import get_catalog
+
+DEFAULT_MIX = 'search=40,market=15,mylistings=5,sell=20,buy=5,offer=8,accept=4,accept_offer=3'
+
+# Listings written concurrently while seeding
+SEED_BATCH = 256
+
+# Words for synthetic item names (on top of the catalog)
+ADJECTIVES = ['Iron', 'Steel', 'Mithril', 'Ancient', 'Cursed', 'Blessed', 'Dragon', 'Shadow', 'Crystal', 'Rusty']
+NOUNS = ['Sword', 'Shield', 'Helmet', 'Gloves', 'Boots', 'Ring', 'Amulet', 'Bow', 'Staff', 'Axe', 'Ore', 'Potion']
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'search=70,sell=30' -> {'search': 70.0, 'sell': 30.0}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in Workload.OPERATIONS:
+            raise ValueError(f"Unknown command '{name}' (choose from {', '.join(Workload.OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError('The workload mix needs at least one positive weight')
+    return mix
+
+def summarize(samples: List[float], elapsed: float) -> dict:
+    """Count, throughput and latency percentiles (ms) of a list of durations (s)"""
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        # Nearest rank
+        index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'throughput': round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'max_ms': round(ordered[-1] * 1000, 3)
+    }
+
+class TimedStorage:
+    """Wraps a storage backend and records how long every call takes"""
+
+    def __init__(self, storage: Storage):
+        self._storage = storage
+        self.threaded = storage.threaded
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._storage, name)
+        if not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.samples[name].append(elapsed)
+
+        return timed
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+
+class Pool:
+    """Set of (trade ID -> seller ID) with O(1) random choice and removal"""
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.sellers: Dict[int, int] = {}
+        self._index: Dict[int, int] = {}
+
+    def add(self, trade_id: int, seller_id: int):
+        if trade_id not in self._index:
+            self._index[trade_id] = len(self.ids)
+            self.ids.append(trade_id)
+        self.sellers[trade_id] = seller_id
+
+    def discard(self, trade_id: int):
+        index = self._index.pop(trade_id, None)
+        if index is None:
+            return
+        last = self.ids.pop()
+        if last != trade_id:
+            self.ids[index] = last
+            self._index[last] = index
+        del self.sellers[trade_id]
+
+    def choice(self, rnd: random.Random) -> Optional[Tuple[int, int]]:
+        if not self.ids:
+            return None
+        trade_id = rnd.choice(self.ids)
+        return trade_id, self.sellers[trade_id]
+
+class Workload:
+    """Synthetic users and listings, and one coroutine per command"""
+
+    OPERATIONS = ['search', 'market', 'mylistings', 'sell', 'buy', 'offer', 'accept', 'accept_offer']
+
+    def __init__(self, bot: FakeBot, cogs: dict, users: int, guilds: int, seed: int):
+        self.bot = bot
+        self.trading_cog = cogs['trading']
+        self.market_cog = cogs['market']
+        self.offers_cog = cogs['offers']
+        self.rnd = random.Random(seed)
+        self.users = [FakeUser(100000 + i, f'trader{i}') for i in range(users)]
+        self.users_by_id = {user.id: user for user in self.users}
+        self.guilds = [900000 + i for i in range(guilds)]
+        self.items = get_catalog().names() + [f'{a} {n}' for a in ADJECTIVES for n in NOUNS]
+
+        # Open WTS listings per guild (trade ID -> seller user ID), and
+        # pending offers (offer ID, seller user ID)
+        self.listings: Dict[int, Pool] = {guild: Pool() for guild in self.guilds}
+        self.pending: Dict[int, List[Tuple[int, int]]] = {guild: [] for guild in self.guilds}
+
+    async def seed(self, trades: int):
+        """Give every user a trade name and fill the market (through async_db, so
+        SQLite writes are group-committed)"""
+        await asyncio.gather(*(async_db.set_trade_name(str(user.id), user.name.title()) for user in self.users))
+
+        for start in range(0, trades, SEED_BATCH):
+            listings = []
+            for _ in range(min(SEED_BATCH, trades - start)):
+                guild = self.rnd.choice(self.guilds)
+                user = self.rnd.choice(self.users)
+                trade_type = 'WTS' if self.rnd.random() < 0.7 else 'WTB'
+                listings.append((guild, user, trade_type, self.rnd.choice(self.items),
+                                 self.rnd.randint(1, 5), self._price()))
+
+            trade_ids = await asyncio.gather(*(
+                async_db.add_trade(str(guild), str(user.id), user.name, trade_type, item, quantity, price, None)
+                for guild, user, trade_type, item, quantity, price in listings
+            ))
+            for (guild, user, trade_type, *_), trade_id in zip(listings, trade_ids):
+                if trade_type == 'WTS':
+                    self.listings[guild].add(trade_id, user.id)
+
+    def _price(self) -> Optional[str]:
+        roll = self.rnd.random()
+        if roll < 0.1:
+            return None
+        if roll < 0.15:
+            return 'offers'
+        return f'{self.rnd.randint(1, 999)}k'
+
+    def _interaction(self, guild: int, user: Optional[FakeUser] = None) -> FakeInteraction:
+        return FakeInteraction(self.bot, user or self.rnd.choice(self.users), guild)
+
+    def _buyer(self, seller_id: int) -> FakeUser:
+        while True:
+            user = self.rnd.choice(self.users)
+            if user.id != seller_id:
+                return user
+
+    def _track(self, guild: int, seller_id: Optional[int] = None):
+        """Keep the listing pools in step with the events the command dispatched"""
+        for event, args in self.bot.take_events():
+            if event == 'trade_added' and seller_id is not None:
+                self.listings[guild].add(args[0], seller_id)
+            elif event == 'trades_added' and seller_id is not None:
+                for trade_id in args[1]:
+                    self.listings[guild].add(trade_id, seller_id)
+            elif event == 'trade_closed':
+                self.listings[guild].discard(args[0])
+
+    async def search(self, guild: int) -> FakeInteraction:
+        interaction = self._interaction(guild)
+        query = self.rnd.choice(self.rnd.choice(self.items).split())[:self.rnd.randint(3, 6)]
+        await self.market_cog.search.callback(self.market_cog, interaction, query)
+        return interaction
+
+    async def market(self, guild: int) -> FakeInteraction:
+        interaction = self._interaction(guild)
+        sort = self.rnd.choice(['newest', 'newest', 'price_low', 'price_high'])
+        await self.market_cog.market.callback(self.market_cog, interaction, None, sort)
+        return interaction
+
+    async def mylistings(self, guild: int) -> FakeInteraction:
+        interaction = self._interaction(guild)
+        await self.market_cog.mylistings.callback(self.market_cog, interaction)
+        return interaction
+
+    async def sell(self, guild: int) -> FakeInteraction:
+        interaction = self._interaction(guild)
+        item = f'{self.rnd.randint(1, 5)}x {self.rnd.choice(self.items)}'
+        await self.trading_cog.sell.callback(self.trading_cog, interaction, item, self._price())
+        self._track(guild, interaction.user.id)
+        return interaction
+
+    async def buy(self, guild: int) -> FakeInteraction:
+        interaction = self._interaction(guild)
+        item = f'{self.rnd.randint(1, 5)}x {self.rnd.choice(self.items)}'
+        await self.trading_cog.buy.callback(self.trading_cog, interaction, item, self._price())
+        self._track(guild)
+        return interaction
+
+    async def offer(self, guild: int) -> FakeInteraction:
+        listing = self.listings[guild].choice(self.rnd)
+        if listing is None:
+            return await self.sell(guild)
+        trade_id, seller_id = listing
+        interaction = self._interaction(guild, self._buyer(seller_id))
+        await self.offers_cog.offer.callback(self.offers_cog, interaction, trade_id, self._price() or '1k')
+
+        # The offer's buttons carry its ID
+        for _, kwargs in interaction.sent:
+            view = kwargs.get('view')
+            if view is not None and view.children:
+                offer_id = int(view.children[0].custom_id.rsplit(':', 1)[1])
+                self.pending[guild].append((offer_id, seller_id))
+        return interaction
+
+    async def accept(self, guild: int) -> FakeInteraction:
+        listing = self.listings[guild].choice(self.rnd)
+        if listing is None:
+            return await self.sell(guild)
+        trade_id, seller_id = listing
+        interaction = self._interaction(guild, self._buyer(seller_id))
+        await self.offers_cog.accept.callback(self.offers_cog, interaction, trade_id)
+        self._track(guild)
+        return interaction
+
+    async def accept_offer(self, guild: int) -> FakeInteraction:
+        if not self.pending[guild]:
+            return await self.offer(guild)
+        offer_id, seller_id = self.pending[guild].pop(self.rnd.randrange(len(self.pending[guild])))
+        interaction = self._interaction(guild, self.users_by_id[seller_id])
+        await AcceptOfferButton(offer_id).callback(interaction)
+        self._track(guild)
+        return interaction
+
+def _is_error(interaction: FakeInteraction) -> bool:
+    """Commands report their own failures as '❌ Error ...' messages"""
+    return any(isinstance(content, str) and content.startswith('❌ Error') for content, _ in interaction.sent)
+
+async def run_load(workload: Workload, mix: Dict[str, float], concurrency: int,
+                   duration: Optional[float], total_ops: Optional[int]) -> Tuple[dict, float]:
+    """Run the workload; returns ({'samples': {command: [durations]}, 'errors': {command: count}}, elapsed)"""
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    remaining = [total_ops]
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    async def worker():
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if remaining[0] is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+
+            name = workload.rnd.choices(names, weights)[0]
+            guild = workload.rnd.choice(workload.guilds)
+            began = time.perf_counter()
+            try:
+                interaction = await getattr(workload, name)(guild)
+                if _is_error(interaction):
+                    errors[name] += 1
+            except Exception as e:
+                errors[name] += 1
+                print(f'[ERROR] {name}: {type(e).__name__}: {e}', flush=True)
+            samples[name].append(time.perf_counter() - began)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await workload.bot.drain()
+    return {'samples': samples, 'errors': errors}, elapsed
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def build_report(args, mix: Dict[str, float], results: dict, elapsed: float, storage: TimedStorage) -> dict:
+    samples, errors = results['samples'], results['errors']
+    commands = {}
+    for name in sorted(samples):
+        commands[name] = summarize(samples[name], elapsed)
+        commands[name]['errors'] = errors.get(name, 0)
+    every = [duration for durations in samples.values() for duration in durations]
+
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': sys.platform,
+            'backend': args.backend,
+            'mix': mix,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'ops': args.ops,
+            'seed_trades': args.seed_trades,
+            'users': args.users,
+            'guilds': args.guilds,
+            'seed': args.seed
+        },
+        'elapsed_s': round(elapsed, 3),
+        'total': dict(summarize(every, elapsed), errors=sum(errors.values())) if every else {},
+        'commands': commands,
+        'storage': {name: summarize(durations, elapsed) for name, durations in sorted(storage.samples.items())}
+    }
+
+def print_report(report: dict, baseline: Optional[dict] = None):
+    """Table of the command and storage latencies (and p95 change against a baseline)"""
+    for section in ('commands', 'storage'):
+        print(f'\n{section}', flush=True)
+        print(f"  {'name':<28}{'count':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+              + (f"{'p95 vs base':>14}" if baseline else ''), flush=True)
+        for name, stats in report[section].items():
+            line = (f"  {name:<28}{stats['count']:>8}{stats['throughput']:>10.1f}"
+                    f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+            old = (baseline or {}).get(section, {}).get(name)
+            if old and old['p95_ms']:
+                line += f"{(stats['p95_ms'] / old['p95_ms'] - 1) * 100:>+13.1f}%"
+            print(line, flush=True)
+
+    total = report['total']
+    if total:
+        print(f"\n{total['count']} command(s) in {report['elapsed_s']}s: {total['throughput']:.1f}/s, "
+              f"p95 {total['p95_ms']:.2f} ms, {total['errors']} error(s)", flush=True)
+
+async def main(args) -> dict:
+    mix = parse_mix(args.mix)
+    scratch = None
+    if args.backend == 'sqlite':
+        path = args.db
+        if not path:
+            scratch = tempfile.TemporaryDirectory(prefix='tradebench-')
+            path = os.path.join(scratch.name, 'bench.db')
+        backend = SQLiteStorage(path)
+    else:
+        backend = MemoryStorage()
+
+    storage = TimedStorage(backend)
+    backend.init()
+    async_db.start(storage)
+
+    try:
+        bot = FakeBot()
+        cogs = {'trading': Trading(bot), 'market': Market(bot), 'offers': Offers(bot)}
+        workload = Workload(bot, cogs, args.users, args.guilds, args.seed)
+
+        print(f'Seeding {args.seed_trades} trade(s) for {args.users} user(s)...', flush=True)
+        await workload.seed(args.seed_trades)
+        for cog in list(cogs.values()) + [Matching(bot)]:
+            await bot.add_cog(cog)
+        storage.reset()
+
+        limit = f'{args.ops} command(s)' if args.ops else f'{args.duration}s'
+        print(f'Running {limit} at concurrency {args.concurrency} on {args.backend}...', flush=True)
+        results, elapsed = await run_load(workload, mix, args.concurrency,
+                                          None if args.ops else args.duration, args.ops)
+    finally:
+        async_db.close()
+        if scratch is not None:
+            scratch.cleanup()
+
+    report = build_report(args, mix, results, elapsed, storage)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'\n[OK] Report written to {args.output}', flush=True)
+    return report
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Synthetic load benchmark for the trading bot')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f'command=weight list (commands: {", ".join(Workload.OPERATIONS)})')
+    parser.add_argument('--concurrency', type=int, default=8, help='commands in flight at once')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds to run (ignored with --ops)')
+    parser.add_argument('--ops', type=int, default=None, help='run exactly this many commands')
+    parser.add_argument('--backend', choices=['sqlite', 'memory'], default='sqlite')
+    parser.add_argument('--db', default=None,
+                        help='new SQLite file to use (default: a scratch file); never point this at the bot\'s database')
+    parser.add_argument('--force', action='store_true',
+                        help='let --db use an existing, non-empty file (its data is modified)')
+    parser.add_argument('--seed-trades', type=int, default=5000, help='listings created before the run')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--guilds', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    parser.add_argument('--output', default='bench_results.json', help='JSON report path')
+    parser.add_argument('--baseline', default=None, help='earlier JSON report to compare against')
+    args = parser.parse_args(argv)
+    # The run seeds, closes and archives trades, so a real database would be ruined
+    if args.db and os.path.exists(args.db) and os.path.getsize(args.db) > 0 and not args.force:
+        parser.error(f'{args.db} already exists and is not empty; pick a new file or pass --force')
+    return args
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -4,7 +4,11 @@ from discord.ext import commands
 import os
 import asyncio
 import sys
-from database.db_manager import init_database
+from database.storage import create_storage
+from database import async_db
+from utils.command_sync import dev_guild, sync_commands
+from utils.ratelimit import RateLimitedTree
+from utils.notifications import notifier
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -17,27 +21,41 @@ intents.messages = True
 intents.guilds = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# Sharding: Discord recommends the shard count unless SHARD_COUNT is set, and
+# SHARD_IDS (e.g. "0,1") runs only some of the shards in this process
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+SHARD_IDS = [int(shard) for shard in os.getenv('SHARD_IDS', '').split(',') if shard.strip()] or None
+
+# The tree times every slash command (utils/metrics.py) and answers the ones
+# turned away by rate limits (utils/ratelimit.py)
+bot = commands.AutoShardedBot(command_prefix='!', intents=intents,
+                              shard_count=SHARD_COUNT, shard_ids=SHARD_IDS,
+                              tree_cls=RateLimitedTree)
+
+# Sync slash commands on the first on_ready even if they look unchanged
+# (python bot.py --sync)
+FORCE_SYNC = '--sync' in sys.argv[1:]
 
 # Event: Bot is ready
 @bot.event
 async def on_ready():
+    global FORCE_SYNC
     print(f'{bot.user} has connected to Discord!', flush=True)
-    print(f'Bot is in {len(bot.guilds)} server(s)', flush=True)
+    print(f'Bot is in {len(bot.guilds)} server(s) across {len(bot.shards)} shard(s)', flush=True)
     
-    # Debug: Check what commands we have before syncing
-    print(f'Commands in tree before sync: {len(bot.tree.get_commands())}', flush=True)
-    for cmd in bot.tree.get_commands():
-        print(f'  - {cmd.name}', flush=True)
+    print(f'Commands in tree: {len(bot.tree.get_commands())}', flush=True)
     
-    # Sync slash commands
+    # Sync slash commands, but only if they changed since the last sync
+    # (on_ready runs again after every reconnect)
+    guild = dev_guild()
     try:
-        # Try syncing without clearing first
-        synced = await bot.tree.sync()
-        print(f'Synced {len(synced)} slash command(s)', flush=True)
-        
-        # List all synced commands
-        if synced:
+        synced = await sync_commands(bot.tree, guild=guild, force=FORCE_SYNC)
+        FORCE_SYNC = False
+        scope = f'server {guild.id}' if guild else 'all servers'
+        if synced is None:
+            print(f'Slash commands unchanged since the last sync ({scope}), not syncing', flush=True)
+        elif synced:
+            print(f'Synced {len(synced)} slash command(s) to {scope}', flush=True)
             for cmd in synced:
                 print(f'  - /{cmd.name}', flush=True)
         else:
@@ -63,7 +81,7 @@ async def on_message(message):
 
 # Load all cogs (command modules)
 async def load_cogs():
-    cogs = ['cogs.trading', 'cogs.market', 'cogs.admin', 'cogs.offers']
+    cogs = ['cogs.trading', 'cogs.market', 'cogs.admin', 'cogs.offers', 'cogs.board', 'cogs.matching', 'cogs.maintenance', 'cogs.stats']
     for cog in cogs:
         try:
             await bot.load_extension(cog)
@@ -78,8 +96,10 @@ async def load_cogs():
 async def main():
     # Initialize database
     print('Initializing database...', flush=True)
-    init_database()
-    print('[OK] Database ready!', flush=True)
+    storage = create_storage()
+    cached = storage.init()
+    async_db.start(storage)
+    print(f'[OK] Database ready! ({cached} trade name(s) cached)', flush=True)
     
     # Load command modules
     print('Loading command modules...', flush=True)
@@ -97,7 +117,13 @@ async def main():
         return
     
     # Start the bot
-    await bot.start(TOKEN)
+    notifier.start(bot)
+    try:
+        await bot.start(TOKEN)
+    finally:
+        await notifier.stop()
+        # Flush queued writes and close database connections
+        async_db.close()
 
 # Run the bot
 if __name__ == '__main__':
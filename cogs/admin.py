@@ -1,7 +1,18 @@
+import asyncio
+import tempfile
+import time
 import discord
 from discord import app_commands
 from discord.ext import commands
-from database.db_manager import clear_all_trades
+from typing import Literal
+from database import async_db, db_manager
+from database.async_db import clear_all_trades
+from database.backup import GUILD_TABLES, backup_filename, export_table, parse_backup_filename, read_chunks
+from database.storage import SQLiteStorage
+from utils.command_sync import dev_guild, sync_commands
+
+# Seconds between progress updates while /import runs
+IMPORT_PROGRESS_INTERVAL = 2.0
 
 class Admin(commands.Cog):
     """Administrative commands"""
@@ -11,20 +22,143 @@ class Admin(commands.Cog):
     
     @app_commands.command(name="clearmarket", description="Clear all trades from the market (Admin only)")
     @app_commands.default_permissions(administrator=True)
+    @app_commands.guild_only()
     async def clearmarket(self, interaction: discord.Interaction):
-        """Clear all trades from the market (admin only)"""
+        """Clear all of this server's trades from the market (admin only)"""
         try:
-            rows_affected = clear_all_trades()
+            guild_id = str(interaction.guild_id)
+            rows_affected = await clear_all_trades(guild_id)
+            self.bot.dispatch('market_cleared', guild_id)
             await interaction.response.send_message(f"✅ Market cleared! {rows_affected} trade(s) removed.")
-            
+        
         except Exception as e:
             await interaction.response.send_message(f"❌ Error clearing market: {str(e)}", ephemeral=True)
     
     @app_commands.command(name="ping", description="Check if the bot is responsive")
     async def ping(self, interaction: discord.Interaction):
         """Check bot latency"""
-        latency = round(self.bot.latency * 1000)
+        # Latency of the shard serving this server (or the average in DMs)
+        shard = self.bot.get_shard(interaction.guild.shard_id) if interaction.guild else None
+        latency = round((shard.latency if shard else self.bot.latency) * 1000)
         await interaction.response.send_message(f'🏓 Pong! Latency: {latency}ms')
+    
+    @app_commands.command(name="synccommands", description="Upload the slash commands to Discord again (bot owner only)")
+    @app_commands.default_permissions(administrator=True)
+    async def synccommands(self, interaction: discord.Interaction):
+        """Force a command tree sync (normally only done when the commands change)"""
+        # Syncing counts against the whole application's rate limit, and the
+        # commands are shared by every server, so only the bot's owner may force it
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("❌ Only the bot's owner can sync commands.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        guild = dev_guild()
+        try:
+            synced = await sync_commands(self.bot.tree, guild=guild, force=True)
+            scope = f"server `{guild.id}`" if guild else "all servers"
+            await interaction.followup.send(f"✅ Synced {len(synced)} slash command(s) to {scope}.", ephemeral=True)
+        
+        except discord.HTTPException as e:
+            await interaction.followup.send(f"❌ Error syncing commands: {str(e)}", ephemeral=True)
+    
+    @app_commands.command(name="export", description="Download this server's trades, offers and sales (Admin only)")
+    @app_commands.describe(
+        format="File format (default: jsonl)",
+        compress="Gzip the files (default: yes)"
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def export(self, interaction: discord.Interaction, format: Literal["jsonl", "csv"] = "jsonl",
+                     compress: bool = True):
+        """Export this server's rows of every per-server table, one file each"""
+        if not isinstance(async_db.current_storage(), SQLiteStorage):
+            await interaction.response.send_message("❌ Export needs the SQLite storage backend.", ephemeral=True)
+            return
+        
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        exports = []
+        try:
+            # Each table streams into a temporary file on a reader thread
+            lines = []
+            for table in GUILD_TABLES:
+                f = tempfile.TemporaryFile()
+                exports.append((table, f))
+                count = await async_db.run_read(export_table, table, f, format, compress, str(interaction.guild_id))
+                lines.append(f"`{backup_filename(table, format, compress)}`: {count} row(s)")
+            
+            size = sum(f.tell() for _, f in exports)
+            if size > interaction.guild.filesize_limit:
+                await interaction.followup.send(
+                    f"❌ The export is {size / 1024 / 1024:.1f} MB, over this server's upload limit. "
+                    f"The bot's host can run `python -m database.backup export --guild {interaction.guild_id}` instead.",
+                    ephemeral=True)
+                return
+            
+            files = []
+            for table, f in exports:
+                f.seek(0)
+                files.append(discord.File(f, filename=backup_filename(table, format, compress)))
+            await interaction.followup.send("📦 Export ready:\n" + "\n".join(lines), files=files, ephemeral=True)
+        
+        except Exception as e:
+            await interaction.followup.send(f"❌ Error exporting: {str(e)}", ephemeral=True)
+        finally:
+            for _, f in exports:
+                f.close()
+    
+    @app_commands.command(name="import", description="Load rows from an export file (bot owner only)")
+    @app_commands.describe(file="A file from /export or database.backup, e.g. trades.jsonl or completed_trades.csv.gz")
+    @app_commands.default_permissions(administrator=True)
+    async def import_file(self, interaction: discord.Interaction, file: discord.Attachment):
+        """Insert an export file's rows chunk by chunk, skipping rows already stored"""
+        # Imports write to every server's tables, so only the bot's owner may run them
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("❌ Only the bot's owner can import data.", ephemeral=True)
+            return
+        if not isinstance(async_db.current_storage(), SQLiteStorage):
+            await interaction.response.send_message("❌ Import needs the SQLite storage backend.", ephemeral=True)
+            return
+        try:
+            table, fmt, compress = parse_backup_filename(file.filename)
+        except ValueError as e:
+            await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+            return
+        
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        read = inserted = 0
+        with tempfile.TemporaryFile() as f:
+            try:
+                await file.save(f)
+                chunks = read_chunks(f, fmt, compress)
+                reported = time.monotonic()
+                while True:
+                    # Parse on a worker thread, insert each chunk as one write
+                    chunk = await asyncio.to_thread(next, chunks, None)
+                    if chunk is None:
+                        break
+                    columns, rows = chunk
+                    inserted += await async_db.run_write(db_manager.import_rows, table, columns, rows)
+                    read += len(rows)
+                    
+                    if time.monotonic() - reported >= IMPORT_PROGRESS_INTERVAL:
+                        reported = time.monotonic()
+                        await interaction.edit_original_response(
+                            content=f"⏳ `{table}`: {read} row(s) read, {inserted} inserted...")
+            
+            except Exception as e:
+                await interaction.edit_original_response(
+                    content=f"❌ Import of `{table}` stopped after {read} row(s) ({inserted} inserted): {str(e)}\n"
+                            f"Rows already inserted stay; running the import again skips them.")
+                return
+        
+        # Refresh what's cached from the imported table
+        if table == 'trade_names':
+            await async_db.run_read(db_manager.preload_trade_names)
+        elif table == 'trades':
+            self.bot.dispatch('market_imported')
+        
+        await interaction.edit_original_response(
+            content=f"✅ `{table}`: {read} row(s) read, {inserted} inserted, {read - inserted} already present.")
 
 # Setup function for cog
 async def setup(bot):
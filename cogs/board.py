@@ -0,0 +1,174 @@
+import asyncio
+from typing import List, Optional, Set
+import discord
+from discord import app_commands
+from discord.ext import commands
+from database.async_db import (
+    get_trades_page, count_active_trades, get_trade_guild,
+    set_market_board, get_market_boards, remove_market_board
+)
+from utils.pagination import field_text
+
+# Trades shown on the board
+BOARD_SIZE = 20
+
+# Minimum seconds between two board refreshes, however many trades change.
+# Keeps edits well inside Discord's per-channel message edit rate limit.
+BOARD_REFRESH_INTERVAL = 15
+
+class Board(commands.Cog):
+    """Live market board: one channel message kept up to date by the bot"""
+    
+    def __init__(self, bot):
+        self.bot = bot
+        # Guilds whose board needs a refresh (None: every board)
+        self._dirty: Optional[Set[str]] = None
+        self._wake = asyncio.Event()
+        self._task = None
+    
+    async def cog_load(self):
+        self._mark(None)  # Render every board once at startup
+        self._task = asyncio.create_task(self._refresh_loop())
+    
+    async def cog_unload(self):
+        if self._task:
+            self._task.cancel()
+    
+    def _mark(self, guild_id: Optional[str]):
+        """Mark one guild's board dirty (None: every board)"""
+        if guild_id is None:
+            self._dirty = None
+        elif self._dirty is not None:
+            self._dirty.add(guild_id)
+        self._wake.set()
+    
+    # Every market change just marks its guild's board dirty; the refresh
+    # loop coalesces them into at most one edit per board per interval
+    @commands.Cog.listener()
+    async def on_trade_added(self, trade_id: int):
+        guild_id = await get_trade_guild(trade_id)
+        if guild_id is not None:
+            self._mark(guild_id)
+    
+    @commands.Cog.listener()
+    async def on_trades_added(self, guild_id: str, trade_ids: List[int]):
+        self._mark(guild_id)
+    
+    @commands.Cog.listener()
+    async def on_trade_closed(self, trade_id: int):
+        guild_id = await get_trade_guild(trade_id)
+        if guild_id is not None:
+            self._mark(guild_id)
+    
+    @commands.Cog.listener()
+    async def on_market_cleared(self, guild_id: str):
+        self._mark(guild_id)
+    
+    @commands.Cog.listener()
+    async def on_market_imported(self):
+        self._mark(None)
+    
+    async def _refresh_loop(self):
+        await self.bot.wait_until_ready()
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            guilds, self._dirty = self._dirty, set()
+            try:
+                await self._refresh_boards(guilds)
+            except Exception as e:
+                print(f'[ERROR] Market board refresh failed: {type(e).__name__}: {e}', flush=True)
+            await asyncio.sleep(BOARD_REFRESH_INTERVAL)
+    
+    async def _render(self, guild_id: str) -> discord.Embed:
+        """Build the board embed from a guild's newest active trades"""
+        results, _ = await get_trades_page(guild_id, None, None, True, BOARD_SIZE)
+        total = await count_active_trades(guild_id)
+        
+        embed = discord.Embed(title="🏪 Live Market Board", color=discord.Color.purple())
+        
+        # Separate WTS and WTB
+        wts_items = [r for r in results if r[2] == 'WTS']
+        wtb_items = [r for r in results if r[2] == 'WTB']
+        
+        if wts_items:
+            wts_lines = []
+            for item in wts_items:
+                trade_id, username, _, item_name, quantity, price, _ = item
+                price_str = f" - {price}" if price else ""
+                wts_lines.append(f"`[{trade_id}]` {quantity}x {item_name}{price_str} (by {username})")
+            embed.add_field(name="🏪 For Sale", value=field_text(wts_lines), inline=False)
+        
+        if wtb_items:
+            wtb_lines = []
+            for item in wtb_items:
+                trade_id, username, _, item_name, quantity, offer, _ = item
+                offer_str = f" - {offer}" if offer else ""
+                wtb_lines.append(f"`[{trade_id}]` {quantity}x {item_name}{offer_str} (by {username})")
+            embed.add_field(name="💰 Wanted", value=field_text(wtb_lines), inline=False)
+        
+        if not results:
+            embed.description = "The market is empty!"
+        
+        embed.set_footer(text=f"Showing the newest {len(results)} of {total} trade(s) - updates automatically")
+        embed.timestamp = discord.utils.utcnow()
+        return embed
+    
+    async def _refresh_boards(self, guilds: Optional[Set[str]] = None):
+        """Re-render the boards of the given guilds (None: every board)"""
+        boards = await get_market_boards()
+        if not boards:
+            return
+        
+        for guild_id, channel_id, message_id in boards:
+            if guilds is not None and guild_id not in guilds:
+                continue
+            # Channel deleted, or its guild is served by another bot process
+            channel = self.bot.get_channel(int(channel_id))
+            if channel is None:
+                continue
+            try:
+                embed = await self._render(guild_id)
+                await channel.get_partial_message(int(message_id)).edit(embed=embed)
+            except discord.NotFound:
+                # Board message was deleted; stop updating it
+                await remove_market_board(guild_id)
+            except discord.HTTPException as e:
+                print(f'[ERROR] Could not update market board in {channel_id}: {e}', flush=True)
+    
+    @app_commands.command(name="setboard", description="Post a live market board in a channel (Admin only)")
+    @app_commands.describe(channel="The channel to post the board in")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def setboard(self, interaction: discord.Interaction, channel: discord.TextChannel):
+        """Post a live market board (admin only)"""
+        try:
+            message = await channel.send(embed=await self._render(str(interaction.guild_id)))
+            await set_market_board(str(interaction.guild_id), str(channel.id), str(message.id))
+            await interaction.response.send_message(
+                f"✅ Market board posted in {channel.mention}. It updates at most every {BOARD_REFRESH_INTERVAL}s.",
+                ephemeral=True
+            )
+        
+        except discord.Forbidden:
+            await interaction.response.send_message(f"❌ I can't post in {channel.mention}.", ephemeral=True)
+        except Exception as e:
+            await interaction.response.send_message(f"❌ Error setting market board: {str(e)}", ephemeral=True)
+    
+    @app_commands.command(name="removeboard", description="Stop updating the live market board (Admin only)")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def removeboard(self, interaction: discord.Interaction):
+        """Stop updating the market board (admin only)"""
+        try:
+            if await remove_market_board(str(interaction.guild_id)):
+                await interaction.response.send_message("✅ Market board removed.", ephemeral=True)
+            else:
+                await interaction.response.send_message("❌ This server has no market board.", ephemeral=True)
+        
+        except Exception as e:
+            await interaction.response.send_message(f"❌ Error removing market board: {str(e)}", ephemeral=True)
+
+# Setup function for cog
+async def setup(bot):
+    await bot.add_cog(Board(bot))
@@ -0,0 +1,65 @@
+import asyncio
+import time
+from discord.ext import commands
+from database.async_db import archive_closed_trades, archive_resolved_offers, incremental_vacuum
+
+# Closed trades and resolved offers stay in the live tables this long (seconds)
+ARCHIVE_RETENTION = 30 * 86400
+
+# Rows moved per write; each batch is its own short transaction
+ARCHIVE_BATCH_SIZE = 500
+
+# Seconds between compaction runs, and the pause between batches so
+# regular writes get the writer in between
+COMPACT_INTERVAL = 3600
+BATCH_PAUSE = 0.1
+
+class Maintenance(commands.Cog):
+    """Background compaction of closed trades and resolved offers"""
+    
+    def __init__(self, bot):
+        self.bot = bot
+        self._task = None
+    
+    async def cog_load(self):
+        self._task = asyncio.create_task(self._compact_loop())
+    
+    async def cog_unload(self):
+        if self._task:
+            self._task.cancel()
+    
+    async def _compact_loop(self):
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                await self.compact()
+            except Exception as e:
+                print(f'[ERROR] Compaction failed: {type(e).__name__}: {e}', flush=True)
+            await asyncio.sleep(COMPACT_INTERVAL)
+    
+    async def compact(self):
+        """Archive everything past the retention window, then shrink the file"""
+        cutoff = int(time.time()) - ARCHIVE_RETENTION
+        trades = offers = 0
+        
+        while True:
+            moved = await archive_closed_trades(cutoff, ARCHIVE_BATCH_SIZE)
+            trades += moved
+            if moved < ARCHIVE_BATCH_SIZE:
+                break
+            await asyncio.sleep(BATCH_PAUSE)
+        
+        while True:
+            moved = await archive_resolved_offers(cutoff, ARCHIVE_BATCH_SIZE)
+            offers += moved
+            if moved < ARCHIVE_BATCH_SIZE:
+                break
+            await asyncio.sleep(BATCH_PAUSE)
+        
+        pages = await incremental_vacuum()
+        if trades or offers or pages:
+            print(f'[OK] Archived {trades} trade(s) and {offers} offer(s), freed {pages} page(s)', flush=True)
+
+# Setup function for cog
+async def setup(bot):
+    await bot.add_cog(Maintenance(bot))
@@ -1,9 +1,40 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from database.db_manager import search_trades, get_all_trades, get_user_trades, get_trade_by_id, remove_trade
-from datetime import datetime
-from typing import Literal
+from database.async_db import (
+    search_trades_page, get_trades_page, get_user_trades_page, get_trade_by_id, remove_trade,
+    count_search_results, count_active_trades, count_user_trades, get_price_history
+)
+from utils.catalog import get_catalog
+from utils.item_index import item_autocomplete
+from utils.pagination import PAGE_SIZE, PageView, field_text, page_footer
+from utils.parsers import parse_listing
+from utils.prices import parse_price, format_price
+from utils.ratelimit import rate_limit
+from datetime import datetime, timezone
+import time
+from typing import Literal, Optional, Tuple
+
+# /pricehistory ranges: name -> (rollup period, seconds covered)
+HISTORY_RANGES = {
+    '24h': ('hour', 86400),
+    '7d': ('day', 7 * 86400),
+    '30d': ('day', 30 * 86400),
+    '90d': ('day', 90 * 86400)
+}
+
+def parse_price_range(min_price: Optional[str], max_price: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Parse optional min/max price options; raises ValueError naming the bad one"""
+    values = []
+    for label, text in (("minimum", min_price), ("maximum", max_price)):
+        if not text:
+            values.append(None)
+            continue
+        value = parse_price(text)
+        if value is None:
+            raise ValueError(f"Couldn't read the {label} price '{text}'. Try something like `500g` or `1.5mg`.")
+        values.append(value)
+    return values[0], values[1]
 
 class Market(commands.Cog):
     """Commands for searching and viewing the market"""
@@ -12,138 +43,196 @@ class Market(commands.Cog):
         self.bot = bot
     
     @app_commands.command(name="search", description="Search for items in the market")
-    @app_commands.describe(query="The item name to search for")
-    async def search(self, interaction: discord.Interaction, query: str):
+    @app_commands.describe(
+        query="The item name to search for",
+        sort="Order of results (default: best match)",
+        min_price="Only show prices of at least this much (e.g. 500g)",
+        max_price="Only show prices of at most this much (e.g. 1.5mg)"
+    )
+    @app_commands.autocomplete(query=item_autocomplete)
+    @app_commands.guild_only()
+    @rate_limit()
+    async def search(self, interaction: discord.Interaction, query: str,
+                     sort: Literal["relevance", "price_low", "price_high"] = "relevance",
+                     min_price: str = None, max_price: str = None):
         """Search for items in the market"""
         try:
-            results = search_trades(query)
-            
-            if not results:
-                await interaction.response.send_message(f"🔍 No results found for '{query}'", ephemeral=True)
+            try:
+                min_value, max_value = parse_price_range(min_price, max_price)
+            except ValueError as e:
+                await interaction.response.send_message(f"❌ {e}", ephemeral=True)
                 return
             
-            # Separate WTS and WTB
-            wts_items = [r for r in results if r[3] == 'WTS']
-            wtb_items = [r for r in results if r[3] == 'WTB']
-            
-            embed = discord.Embed(title=f"🔍 Search Results: {query}", color=discord.Color.gold())
-            
-            # Add WTS items
-            if wts_items:
-                wts_text = ""
-                for item in wts_items[:10]:  # Limit to 10 results
-                    trade_id, user_id, username, _, item_name, quantity, price, notes = item
-                    price_str = f" - {price}" if price else ""
-                    wts_text += f"`[{trade_id}]` {quantity}x {item_name}{price_str} (by {username})\n"
-                embed.add_field(name="🏪 For Sale", value=wts_text, inline=False)
-            
-            # Add WTB items
-            if wtb_items:
-                wtb_text = ""
-                for item in wtb_items[:10]:
-                    trade_id, user_id, username, _, item_name, quantity, offer, notes = item
-                    offer_str = f" - {offer}" if offer else ""
-                    wtb_text += f"`[{trade_id}]` {quantity}x {item_name}{offer_str} (by {username})\n"
-                embed.add_field(name="💰 Wanted", value=wtb_text, inline=False)
-            
-            total = len(results)
-            if total > 20:
-                embed.set_footer(text=f"Showing 20 of {total} results")
-            else:
-                embed.set_footer(text=f"{total} result(s) found")
+            guild_id = str(interaction.guild_id)
+            total = await count_search_results(guild_id, query, sort, min_value, max_value)
             
-            await interaction.response.send_message(embed=embed)
+            if not total:
+                await interaction.response.send_message(f"🔍 No results found for '{query}'", ephemeral=True)
+                return
             
+            def render(results, page, total):
+                # Separate WTS and WTB
+                wts_items = [r for r in results if r[3] == 'WTS']
+                wtb_items = [r for r in results if r[3] == 'WTB']
+                
+                embed = discord.Embed(title=f"🔍 Search Results: {query}", color=discord.Color.gold())
+                
+                # Add WTS items
+                if wts_items:
+                    wts_lines = []
+                    for item in wts_items:
+                        trade_id, user_id, username, _, item_name, quantity, price, notes, _ = item
+                        price_str = f" - {price}" if price else ""
+                        wts_lines.append(f"`[{trade_id}]` {quantity}x {item_name}{price_str} (by {username})")
+                    embed.add_field(name="🏪 For Sale", value=field_text(wts_lines), inline=False)
+                
+                # Add WTB items
+                if wtb_items:
+                    wtb_lines = []
+                    for item in wtb_items:
+                        trade_id, user_id, username, _, item_name, quantity, offer, notes, _ = item
+                        offer_str = f" - {offer}" if offer else ""
+                        wtb_lines.append(f"`[{trade_id}]` {quantity}x {item_name}{offer_str} (by {username})")
+                    embed.add_field(name="💰 Wanted", value=field_text(wtb_lines), inline=False)
+                
+                embed.set_footer(text=page_footer(page, total))
+                return embed
+            
+            async def fetch(cursor, forward):
+                return await search_trades_page(guild_id, query, cursor, forward, PAGE_SIZE, sort, min_value, max_value)
+            
+            view = PageView(interaction.user.id, fetch, render, total)
+            await view.send(interaction)
+        
         except Exception as e:
             await interaction.response.send_message(f"❌ Error searching: {str(e)}", ephemeral=True)
     
     @app_commands.command(name="market", description="View all active trades in the market")
-    @app_commands.describe(filter="Filter by trade type (optional)")
-    async def market(self, interaction: discord.Interaction, filter: Literal["WTS", "WTB"] = None):
+    @app_commands.describe(
+        filter="Filter by trade type (optional)",
+        sort="Order of trades (default: newest first)",
+        min_price="Only show prices of at least this much (e.g. 500g)",
+        max_price="Only show prices of at most this much (e.g. 1.5mg)"
+    )
+    @app_commands.guild_only()
+    @rate_limit()
+    async def market(self, interaction: discord.Interaction, filter: Literal["WTS", "WTB"] = None,
+                     sort: Literal["newest", "price_low", "price_high"] = "newest",
+                     min_price: str = None, max_price: str = None):
         """View all active trades in the market"""
         try:
-            results = get_all_trades(filter, limit=20)
-            
-            if not results:
-                await interaction.response.send_message("🏪 The market is empty!", ephemeral=True)
+            try:
+                min_value, max_value = parse_price_range(min_price, max_price)
+            except ValueError as e:
+                await interaction.response.send_message(f"❌ {e}", ephemeral=True)
                 return
             
-            # Separate WTS and WTB
-            wts_items = [r for r in results if r[2] == 'WTS']
-            wtb_items = [r for r in results if r[2] == 'WTB']
-            
-            embed = discord.Embed(title="🏪 Trading Market", color=discord.Color.purple())
-            
-            # Add WTS items
-            if wts_items and (not filter or filter == 'WTS'):
-                wts_text = ""
-                for item in wts_items:
-                    trade_id, username, _, item_name, quantity, price, _ = item
-                    price_str = f" - {price}" if price else ""
-                    wts_text += f"`[{trade_id}]` {quantity}x {item_name}{price_str} (by {username})\n"
-                embed.add_field(name="🏪 For Sale", value=wts_text or "None", inline=False)
+            guild_id = str(interaction.guild_id)
+            total = await count_active_trades(guild_id, filter, sort, min_value, max_value)
             
-            # Add WTB items
-            if wtb_items and (not filter or filter == 'WTB'):
-                wtb_text = ""
-                for item in wtb_items:
-                    trade_id, username, _, item_name, quantity, offer, _ = item
-                    offer_str = f" - {offer}" if offer else ""
-                    wtb_text += f"`[{trade_id}]` {quantity}x {item_name}{offer_str} (by {username})\n"
-                embed.add_field(name="💰 Wanted", value=wtb_text or "None", inline=False)
-            
-            embed.set_footer(text="Showing most recent 20 trades")
-            
-            await interaction.response.send_message(embed=embed)
+            if not total:
+                if min_value is not None or max_value is not None:
+                    await interaction.response.send_message("🏪 No trades in that price range.", ephemeral=True)
+                else:
+                    await interaction.response.send_message("🏪 The market is empty!", ephemeral=True)
+                return
             
+            def render(results, page, total):
+                # Separate WTS and WTB
+                wts_items = [r for r in results if r[2] == 'WTS']
+                wtb_items = [r for r in results if r[2] == 'WTB']
+                
+                embed = discord.Embed(title="🏪 Trading Market", color=discord.Color.purple())
+                
+                # Add WTS items
+                if wts_items:
+                    wts_lines = []
+                    for item in wts_items:
+                        trade_id, username, _, item_name, quantity, price, _ = item
+                        price_str = f" - {price}" if price else ""
+                        wts_lines.append(f"`[{trade_id}]` {quantity}x {item_name}{price_str} (by {username})")
+                    embed.add_field(name="🏪 For Sale", value=field_text(wts_lines), inline=False)
+                
+                # Add WTB items
+                if wtb_items:
+                    wtb_lines = []
+                    for item in wtb_items:
+                        trade_id, username, _, item_name, quantity, offer, _ = item
+                        offer_str = f" - {offer}" if offer else ""
+                        wtb_lines.append(f"`[{trade_id}]` {quantity}x {item_name}{offer_str} (by {username})")
+                    embed.add_field(name="💰 Wanted", value=field_text(wtb_lines), inline=False)
+                
+                embed.set_footer(text=page_footer(page, total))
+                return embed
+            
+            async def fetch(cursor, forward):
+                return await get_trades_page(guild_id, filter, cursor, forward, PAGE_SIZE, sort, min_value, max_value)
+            
+            view = PageView(interaction.user.id, fetch, render, total)
+            await view.send(interaction)
+        
         except Exception as e:
             await interaction.response.send_message(f"❌ Error loading market: {str(e)}", ephemeral=True)
     
     @app_commands.command(name="mylistings", description="View your active trades")
+    @app_commands.guild_only()
+    @rate_limit()
     async def mylistings(self, interaction: discord.Interaction):
         """View your own active trades"""
         try:
-            results = get_user_trades(str(interaction.user.id))
+            guild_id = str(interaction.guild_id)
+            user_id = str(interaction.user.id)
+            total = await count_user_trades(guild_id, user_id)
             
-            if not results:
+            if not total:
                 await interaction.response.send_message("📋 You don't have any active trades.", ephemeral=True)
                 return
             
-            embed = discord.Embed(title=f"📋 {interaction.user.name}'s Active Trades", color=discord.Color.blue())
-            
-            # Separate WTS and WTB
-            wts_items = [r for r in results if r[1] == 'WTS']
-            wtb_items = [r for r in results if r[1] == 'WTB']
-            
-            if wts_items:
-                wts_text = ""
-                for item in wts_items:
-                    trade_id, _, item_name, quantity, price, notes = item
-                    price_str = f" - {price}" if price else ""
-                    notes_str = f"\n  _{notes}_" if notes else ""
-                    wts_text += f"`[{trade_id}]` {quantity}x {item_name}{price_str}{notes_str}\n"
-                embed.add_field(name="🏪 Selling", value=wts_text, inline=False)
-            
-            if wtb_items:
-                wtb_text = ""
-                for item in wtb_items:
-                    trade_id, _, item_name, quantity, offer, notes = item
-                    offer_str = f" - {offer}" if offer else ""
-                    notes_str = f"\n  _{notes}_" if notes else ""
-                    wtb_text += f"`[{trade_id}]` {quantity}x {item_name}{offer_str}{notes_str}\n"
-                embed.add_field(name="💰 Buying", value=wtb_text, inline=False)
-            
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            
+            def render(results, page, total):
+                embed = discord.Embed(title=f"📋 {interaction.user.name}'s Active Trades", color=discord.Color.blue())
+                
+                # Separate WTS and WTB
+                wts_items = [r for r in results if r[1] == 'WTS']
+                wtb_items = [r for r in results if r[1] == 'WTB']
+                
+                if wts_items:
+                    wts_lines = []
+                    for item in wts_items:
+                        trade_id, _, item_name, quantity, price, notes, _ = item
+                        price_str = f" - {price}" if price else ""
+                        notes_str = f"\n  _{notes}_" if notes else ""
+                        wts_lines.append(f"`[{trade_id}]` {quantity}x {item_name}{price_str}{notes_str}")
+                    embed.add_field(name="🏪 Selling", value=field_text(wts_lines), inline=False)
+                
+                if wtb_items:
+                    wtb_lines = []
+                    for item in wtb_items:
+                        trade_id, _, item_name, quantity, offer, notes, _ = item
+                        offer_str = f" - {offer}" if offer else ""
+                        notes_str = f"\n  _{notes}_" if notes else ""
+                        wtb_lines.append(f"`[{trade_id}]` {quantity}x {item_name}{offer_str}{notes_str}")
+                    embed.add_field(name="💰 Buying", value=field_text(wtb_lines), inline=False)
+                
+                embed.set_footer(text=page_footer(page, total))
+                return embed
+            
+            async def fetch(cursor, forward):
+                return await get_user_trades_page(guild_id, user_id, cursor, forward, PAGE_SIZE)
+            
+            view = PageView(interaction.user.id, fetch, render, total)
+            await view.send(interaction, ephemeral=True)
+        
         except Exception as e:
             await interaction.response.send_message(f"❌ Error loading listings: {str(e)}", ephemeral=True)
     
     @app_commands.command(name="tradeinfo", description="Get detailed information about a specific trade")
     @app_commands.describe(trade_id="The ID of the trade")
+    @app_commands.guild_only()
+    @rate_limit()
     async def tradeinfo(self, interaction: discord.Interaction, trade_id: int):
         """Get detailed information about a specific trade"""
         try:
-            result = get_trade_by_id(trade_id)
+            result = await get_trade_by_id(trade_id, str(interaction.guild_id))
             
             if not result:
                 await interaction.response.send_message(f"❌ Trade ID `{trade_id}` not found.", ephemeral=True)
@@ -174,22 +263,74 @@ class Market(commands.Cog):
                 pass
             
             await interaction.response.send_message(embed=embed)
-            
+        
         except Exception as e:
             await interaction.response.send_message(f"❌ Error loading trade info: {str(e)}", ephemeral=True)
     
+    @app_commands.command(name="pricehistory", description="See what an item has sold for")
+    @app_commands.describe(item="The item to look up", range="How far back to look (default: 7 days)")
+    @app_commands.autocomplete(item=item_autocomplete)
+    @app_commands.guild_only()
+    @rate_limit()
+    async def pricehistory(self, interaction: discord.Interaction, item: str,
+                           range: Literal["24h", "7d", "30d", "90d"] = "7d"):
+        """Show an item's completed trade prices over time"""
+        try:
+            item_name, _, _, _ = parse_listing(item)
+            if not item_name:
+                await interaction.response.send_message("❌ Please provide an item name!", ephemeral=True)
+                return
+            
+            period, seconds = HISTORY_RANGES[range]
+            item_id = get_catalog().resolve(item_name)
+            buckets = await get_price_history(str(interaction.guild_id), item_id, item_name,
+                                              period, int(time.time()) - seconds)
+            
+            if not buckets:
+                await interaction.response.send_message(
+                    f"📈 No priced sales of '{item_name}' in the last {range}.", ephemeral=True
+                )
+                return
+            
+            embed = discord.Embed(title=f"📈 Price History: {item_name}", color=discord.Color.teal())
+            
+            # Summary across the whole range
+            embed.add_field(name="Trades", value=str(sum(b[1] for b in buckets)), inline=True)
+            embed.add_field(name="Volume", value=str(sum(b[2] for b in buckets)), inline=True)
+            embed.add_field(name="Last", value=format_price(buckets[-1][6]), inline=True)
+            embed.add_field(name="Low", value=format_price(min(b[3] for b in buckets)), inline=True)
+            embed.add_field(name="High", value=format_price(max(b[4] for b in buckets)), inline=True)
+            embed.add_field(name="Open", value=format_price(buckets[0][5]), inline=True)
+            
+            # One line per bucket, newest first
+            label_format = "%m-%d %H:00" if period == 'hour' else "%Y-%m-%d"
+            lines = []
+            for bucket_ts, count, volume, low, high, first, last in reversed(buckets):
+                label = datetime.fromtimestamp(bucket_ts, timezone.utc).strftime(label_format)
+                lines.append(f"`{label}` {count} sale(s) - {format_price(low)} to {format_price(high)}, last {format_price(last)}")
+            embed.add_field(name=f"By {period} (UTC)", value=field_text(lines), inline=False)
+            
+            embed.set_footer(text=f"Last {range} of completed trades")
+            await interaction.response.send_message(embed=embed)
+        
+        except Exception as e:
+            await interaction.response.send_message(f"❌ Error loading price history: {str(e)}", ephemeral=True)
+    
     @app_commands.command(name="remove", description="Remove one of your trades from the market")
     @app_commands.describe(trade_id="The ID of the trade to remove")
+    @app_commands.guild_only()
+    @rate_limit()
     async def remove(self, interaction: discord.Interaction, trade_id: int):
         """Remove one of your trades from the market"""
         try:
-            success, message = remove_trade(trade_id, str(interaction.user.id))
+            success, message = await remove_trade(trade_id, str(interaction.user.id), str(interaction.guild_id))
             
             if success:
+                self.bot.dispatch('trade_closed', trade_id)
                 await interaction.response.send_message(f"✅ Trade `{trade_id}` has been removed from the market.")
             else:
                 await interaction.response.send_message(f"❌ {message}", ephemeral=True)
-            
+        
         except Exception as e:
             await interaction.response.send_message(f"❌ Error removing trade: {str(e)}", ephemeral=True)
 
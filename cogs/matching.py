@@ -0,0 +1,82 @@
+from typing import List
+import discord
+from discord.ext import commands
+from database.async_db import get_active_orders, get_active_order, get_orders
+from utils.matching import Order, matching_engine
+from utils.notifications import notifier
+
+def match_embed(order: Order, other: Order, for_seller: bool) -> discord.Embed:
+    """DM telling one side of a match about the other"""
+    sell, buy = (order, other) if order.trade_type == 'WTS' else (other, order)
+    
+    if for_seller:
+        embed = discord.Embed(
+            title="🔔 Buyer found!",
+            description=f"**{buy.username}** wants {buy.quantity}x {buy.item_name} for {buy.price}, "
+                        f"which meets your asking price.",
+            color=discord.Color.green()
+        )
+        embed.add_field(name="Your Listing", value=f"`[{sell.trade_id}]` {sell.quantity}x {sell.item_name} - {sell.price}", inline=False)
+        embed.add_field(name="Their Buy Order", value=f"`[{buy.trade_id}]` by <@{buy.user_id}>", inline=False)
+    else:
+        embed = discord.Embed(
+            title="🔔 Seller found!",
+            description=f"**{sell.username}** is selling {sell.quantity}x {sell.item_name} for {sell.price}, "
+                        f"within your offer.",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="Your Buy Order", value=f"`[{buy.trade_id}]` {buy.quantity}x {buy.item_name} - {buy.price}", inline=False)
+        embed.add_field(name="Next Steps", value=f"Use `/accept trade_id:{sell.trade_id}` to buy it.", inline=False)
+    return embed
+
+class Matching(commands.Cog):
+    """Matches new WTS/WTB listings against the order book and tells both traders"""
+    
+    def __init__(self, bot):
+        self.bot = bot
+    
+    async def cog_load(self):
+        # Build the order book once; trade events keep it current
+        matching_engine.build(await get_active_orders())
+        print(f'[OK] Order book: {len(matching_engine)} priced order(s)', flush=True)
+    
+    @commands.Cog.listener()
+    async def on_trade_added(self, trade_id: int):
+        row = await get_active_order(trade_id)
+        if not row:
+            return  # Unpriced or already closed
+        self._match(Order(*row))
+    
+    @commands.Cog.listener()
+    async def on_trades_added(self, guild_id: str, trade_ids: List[int]):
+        for row in await get_orders(trade_ids):
+            order = Order(*row)
+            if order.price_value is not None:
+                self._match(order)
+    
+    def _match(self, order: Order):
+        """Add a new order to the book and tell both traders if it crosses one"""
+        other = matching_engine.add(order)
+        if other is None:
+            return
+        
+        seller, buyer = (order, other) if order.trade_type == 'WTS' else (other, order)
+        notifier.notify(int(seller.user_id), match_embed(order, other, for_seller=True), 'match_found')
+        notifier.notify(int(buyer.user_id), match_embed(order, other, for_seller=False), 'match_found')
+    
+    @commands.Cog.listener()
+    async def on_trade_closed(self, trade_id: int):
+        matching_engine.remove(trade_id)
+    
+    @commands.Cog.listener()
+    async def on_market_cleared(self, guild_id: str):
+        matching_engine.clear_guild(guild_id)
+    
+    @commands.Cog.listener()
+    async def on_market_imported(self):
+        # Imported listings aren't matched against each other, only added
+        matching_engine.build(await get_active_orders())
+
+# Setup function for cog
+async def setup(bot):
+    await bot.add_cog(Matching(bot))
@@ -1,101 +1,126 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from database.db_manager import (
+from utils.notifications import notifier
+from utils.ratelimit import rate_limit
+from database.async_db import (
     set_trade_name, get_trade_name, has_trade_name,
-    create_offer, get_pending_offer_for_trade, update_offer_status,
+    create_offer, get_offer, update_offer_status, accept_offer,
     complete_trade, get_trade_by_id
 )
 
-class OfferView(discord.ui.View):
-    """View with Accept/Decline buttons for offers"""
+class AcceptOfferButton(discord.ui.DynamicItem[discord.ui.Button], template=r'offer:accept:(?P<offer_id>[0-9]+)'):
+    """Accept button for an offer; the offer ID lives in the custom_id"""
     
-    def __init__(self, offer_id: int, trade_id: int, seller_id: str, buyer_id: str, 
-                 buyer_username: str, offer_amount: str):
-        super().__init__(timeout=None)  # No timeout
+    def __init__(self, offer_id: int, disabled: bool = False):
+        super().__init__(
+            discord.ui.Button(
+                label="Accept",
+                style=discord.ButtonStyle.success,
+                custom_id=f"offer:accept:{offer_id}",
+                disabled=disabled
+            )
+        )
         self.offer_id = offer_id
-        self.trade_id = trade_id
-        self.seller_id = seller_id
-        self.buyer_id = buyer_id
-        self.buyer_username = buyer_username
-        self.offer_amount = offer_amount
     
-    @discord.ui.button(label="Accept", style=discord.ButtonStyle.success, custom_id="accept_offer")
-    async def accept_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match['offer_id']))
+    
+    async def callback(self, interaction: discord.Interaction):
+        # Load the offer state from the database on every click
+        offer = await get_offer(self.offer_id)
+        if not offer:
+            await interaction.response.send_message("This offer no longer exists.", ephemeral=True)
+            return
+        
+        offer_id, trade_id, seller_id, buyer_id, buyer_username, offer_amount, status = offer
+        
         # Check if the person clicking is the seller
-        if str(interaction.user.id) != self.seller_id:
+        if str(interaction.user.id) != seller_id:
             await interaction.response.send_message(
                 "Only the seller can accept this offer!", 
                 ephemeral=True
             )
             return
         
-        # Update offer status
-        update_offer_status(self.offer_id, "accepted")
-        
-        # Complete the trade
-        success = complete_trade(
-            self.trade_id,
-            self.buyer_id,
-            self.buyer_username,
-            self.offer_amount,
-            "offer_accepted"
-        )
+        # Accept the offer and complete the trade in one step
+        success = await accept_offer(offer_id)
         
         if success:
-            # Get trade names
-            seller_tradename = get_trade_name(self.seller_id)
-            buyer_tradename = get_trade_name(self.buyer_id)
+            interaction.client.dispatch('trade_closed', trade_id)
             
-            # Disable buttons
-            for item in self.children:
-                item.disabled = True
+            # Get trade names
+            seller_tradename = await get_trade_name(seller_id)
+            buyer_tradename = await get_trade_name(buyer_id)
             
             # Update the message
             embed = discord.Embed(
                 title="Trade Accepted!",
-                description=f"<@{self.seller_id}> accepted the offer from <@{self.buyer_id}>",
+                description=f"<@{seller_id}> accepted the offer from <@{buyer_id}>",
                 color=discord.Color.green()
             )
-            embed.add_field(name="Final Price", value=self.offer_amount)
+            embed.add_field(name="Final Price", value=offer_amount)
             embed.add_field(name="Seller In-Game", value=seller_tradename, inline=True)
             embed.add_field(name="Buyer In-Game", value=buyer_tradename, inline=True)
             embed.add_field(
                 name="Next Steps", 
-                value=f"<@{self.buyer_id}> contact <@{self.seller_id}> in-game to complete the trade!",
+                value=f"<@{buyer_id}> contact <@{seller_id}> in-game to complete the trade!",
                 inline=False
             )
             
-            await interaction.response.edit_message(embed=embed, view=self)
+            # Disable buttons
+            await interaction.response.edit_message(embed=embed, view=offer_view(offer_id, disabled=True))
             
             # Send DM to buyer
-            try:
-                buyer = await interaction.client.fetch_user(int(self.buyer_id))
-                dm_embed = discord.Embed(
-                    title="Your offer was accepted!",
-                    description=f"Your offer of {self.offer_amount} was accepted!",
-                    color=discord.Color.green()
-                )
-                dm_embed.add_field(name="Seller In-Game Name", value=seller_tradename)
-                dm_embed.add_field(name="Your In-Game Name", value=buyer_tradename)
-                dm_embed.add_field(
-                    name="Next Steps",
-                    value=f"Contact **{seller_tradename}** in-game to complete the trade!",
-                    inline=False
-                )
-                await buyer.send(embed=dm_embed)
-            except:
-                pass  # DMs might be disabled
+            dm_embed = discord.Embed(
+                title="Your offer was accepted!",
+                description=f"Your offer of {offer_amount} was accepted!",
+                color=discord.Color.green()
+            )
+            dm_embed.add_field(name="Seller In-Game Name", value=seller_tradename)
+            dm_embed.add_field(name="Your In-Game Name", value=buyer_tradename)
+            dm_embed.add_field(
+                name="Next Steps",
+                value=f"Contact **{seller_tradename}** in-game to complete the trade!",
+                inline=False
+            )
+            notifier.notify(int(buyer_id), dm_embed, 'offer_accepted')
         else:
             await interaction.response.send_message(
-                "Error completing trade. Please contact an admin.",
+                "This offer was already resolved or the trade is no longer active.",
                 ephemeral=True
             )
+
+class DeclineOfferButton(discord.ui.DynamicItem[discord.ui.Button], template=r'offer:decline:(?P<offer_id>[0-9]+)'):
+    """Decline button for an offer; the offer ID lives in the custom_id"""
+    
+    def __init__(self, offer_id: int, disabled: bool = False):
+        super().__init__(
+            discord.ui.Button(
+                label="Decline",
+                style=discord.ButtonStyle.danger,
+                custom_id=f"offer:decline:{offer_id}",
+                disabled=disabled
+            )
+        )
+        self.offer_id = offer_id
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match['offer_id']))
     
-    @discord.ui.button(label="Decline", style=discord.ButtonStyle.danger, custom_id="decline_offer")
-    async def decline_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+    async def callback(self, interaction: discord.Interaction):
+        # Load the offer state from the database on every click
+        offer = await get_offer(self.offer_id)
+        if not offer:
+            await interaction.response.send_message("This offer no longer exists.", ephemeral=True)
+            return
+        
+        offer_id, trade_id, seller_id, buyer_id, buyer_username, offer_amount, status = offer
+        
         # Check if the person clicking is the seller
-        if str(interaction.user.id) != self.seller_id:
+        if str(interaction.user.id) != seller_id:
             await interaction.response.send_message(
                 "Only the seller can decline this offer!",
                 ephemeral=True
@@ -103,43 +128,53 @@ class OfferView(discord.ui.View):
             return
         
         # Update offer status
-        update_offer_status(self.offer_id, "declined")
-        
-        # Disable buttons
-        for item in self.children:
-            item.disabled = True
+        if not await update_offer_status(offer_id, "declined"):
+            await interaction.response.send_message(
+                "This offer was already resolved.",
+                ephemeral=True
+            )
+            return
         
         # Update the message
         embed = discord.Embed(
             title="Offer Declined",
-            description=f"<@{self.seller_id}> declined the offer from <@{self.buyer_id}>",
+            description=f"<@{seller_id}> declined the offer from <@{buyer_id}>",
             color=discord.Color.red()
         )
-        embed.add_field(name="Declined Offer", value=self.offer_amount)
+        embed.add_field(name="Declined Offer", value=offer_amount)
         embed.add_field(
             name="Status",
             value="The listing is still active. Others can now make offers.",
             inline=False
         )
         
-        await interaction.response.edit_message(embed=embed, view=self)
+        # Disable buttons
+        await interaction.response.edit_message(embed=embed, view=offer_view(offer_id, disabled=True))
         
         # Notify buyer via DM
-        try:
-            buyer = await interaction.client.fetch_user(int(self.buyer_id))
-            dm_embed = discord.Embed(
-                title="Your offer was declined",
-                description=f"Your offer of {self.offer_amount} was declined.",
-                color=discord.Color.red()
-            )
-            dm_embed.add_field(
-                name="Next Steps",
-                value="You can try making a different offer when no other offers are pending.",
-                inline=False
-            )
-            await buyer.send(embed=dm_embed)
-        except:
-            pass  # DMs might be disabled
+        dm_embed = discord.Embed(
+            title="Your offer was declined",
+            description=f"Your offer of {offer_amount} was declined.",
+            color=discord.Color.red()
+        )
+        dm_embed.add_field(
+            name="Next Steps",
+            value="You can try making a different offer when no other offers are pending.",
+            inline=False
+        )
+        notifier.notify(int(buyer_id), dm_embed, 'offer_declined')
+
+def offer_view(offer_id: int, disabled: bool = False) -> discord.ui.View:
+    """Accept/Decline buttons for an offer.
+    
+    The view only carries dynamic items, so discord.py keeps no per-message
+    state for it; clicks are routed by custom_id to the item classes
+    registered in Offers.cog_load, and keep working across restarts.
+    """
+    view = discord.ui.View(timeout=None)
+    view.add_item(AcceptOfferButton(offer_id, disabled))
+    view.add_item(DeclineOfferButton(offer_id, disabled))
+    return view
 
 class Offers(commands.Cog):
     """Commands for trade offers and trade names"""
@@ -147,14 +182,22 @@ class Offers(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
     
+    async def cog_load(self):
+        # Route offer button clicks by custom_id, including old messages
+        self.bot.add_dynamic_items(AcceptOfferButton, DeclineOfferButton)
+    
+    async def cog_unload(self):
+        self.bot.remove_dynamic_items(AcceptOfferButton, DeclineOfferButton)
+    
     @app_commands.command(name="settradename", description="Set your in-game trade name (one-time setup)")
     @app_commands.describe(name="Your in-game character/account name")
+    @rate_limit()
     async def settradename(self, interaction: discord.Interaction, name: str):
         """Set your trade name"""
         user_id = str(interaction.user.id)
         
         # Check if already set
-        if has_trade_name(user_id):
+        if await has_trade_name(user_id):
             await interaction.response.send_message(
                 f"You already have a trade name set. Contact an admin to change it.",
                 ephemeral=True
@@ -162,7 +205,7 @@ class Offers(commands.Cog):
             return
         
         # Set the trade name
-        success = set_trade_name(user_id, name)
+        success = await set_trade_name(user_id, name)
         
         if success:
             embed = discord.Embed(
@@ -190,7 +233,7 @@ class Offers(commands.Cog):
     @app_commands.default_permissions(administrator=True)
     async def changetradename(self, interaction: discord.Interaction, user: discord.User, name: str):
         """Change a user's trade name (admin only)"""
-        success = set_trade_name(str(user.id), name)
+        success = await set_trade_name(str(user.id), name)
         
         if success:
             await interaction.response.send_message(
@@ -204,20 +247,23 @@ class Offers(commands.Cog):
     
     @app_commands.command(name="accept", description="Accept a listing at the listed price")
     @app_commands.describe(trade_id="The ID of the trade to accept")
+    @app_commands.guild_only()
+    @rate_limit()
     async def accept(self, interaction: discord.Interaction, trade_id: int):
         """Accept a trade at the listed price"""
         buyer_id = str(interaction.user.id)
         
         # Check if buyer has trade name set
-        if not has_trade_name(buyer_id):
+        if not await has_trade_name(buyer_id):
             await interaction.response.send_message(
                 "You must set your trade name first! Use `/settradename`",
                 ephemeral=True
             )
             return
         
-        # Get the trade
-        trade = get_trade_by_id(trade_id)
+        # Get the trade (only from this server's market)
+        guild_id = str(interaction.guild_id)
+        trade = await get_trade_by_id(trade_id, guild_id)
         
         if not trade:
             await interaction.response.send_message(
@@ -260,27 +306,22 @@ class Offers(commands.Cog):
             )
             return
         
-        # Check if there's a pending offer
-        pending_offer = get_pending_offer_for_trade(trade_id)
-        if pending_offer:
-            await interaction.response.send_message(
-                "This trade has a pending offer. Wait for it to be resolved first.",
-                ephemeral=True
-            )
-            return
-        
-        # Complete the trade
-        success = complete_trade(
+        # Complete the trade (fails if it was closed meanwhile or has a pending offer)
+        success = await complete_trade(
             trade_id,
             buyer_id,
             interaction.user.name,
             price,
-            "direct_accept"
+            "direct_accept",
+            require_no_pending_offer=True,
+            guild_id=guild_id
         )
         
         if success:
-            seller_tradename = get_trade_name(seller_id)
-            buyer_tradename = get_trade_name(buyer_id)
+            self.bot.dispatch('trade_closed', trade_id)
+            
+            seller_tradename = await get_trade_name(seller_id)
+            buyer_tradename = await get_trade_name(buyer_id)
             
             embed = discord.Embed(
                 title="Trade Accepted!",
@@ -300,27 +341,23 @@ class Offers(commands.Cog):
             await interaction.response.send_message(embed=embed)
             
             # Send DM to seller
-            try:
-                seller = await self.bot.fetch_user(int(seller_id))
-                dm_embed = discord.Embed(
-                    title="Your listing was accepted!",
-                    description=f"{interaction.user.name} accepted your listing at {price}!",
-                    color=discord.Color.green()
-                )
-                dm_embed.add_field(name="Item", value=f"{quantity}x {item_name}")
-                dm_embed.add_field(name="Buyer In-Game Name", value=buyer_tradename)
-                dm_embed.add_field(name="Your In-Game Name", value=seller_tradename)
-                dm_embed.add_field(
-                    name="Next Steps",
-                    value=f"**{buyer_tradename}** will contact you in-game!",
-                    inline=False
-                )
-                await seller.send(embed=dm_embed)
-            except:
-                pass  # DMs might be disabled
+            dm_embed = discord.Embed(
+                title="Your listing was accepted!",
+                description=f"{interaction.user.name} accepted your listing at {price}!",
+                color=discord.Color.green()
+            )
+            dm_embed.add_field(name="Item", value=f"{quantity}x {item_name}")
+            dm_embed.add_field(name="Buyer In-Game Name", value=buyer_tradename)
+            dm_embed.add_field(name="Your In-Game Name", value=seller_tradename)
+            dm_embed.add_field(
+                name="Next Steps",
+                value=f"**{buyer_tradename}** will contact you in-game!",
+                inline=False
+            )
+            notifier.notify(int(seller_id), dm_embed, 'listing_accepted')
         else:
             await interaction.response.send_message(
-                "Error completing trade. Please try again.",
+                "This trade is no longer active or has a pending offer. Wait for it to be resolved first.",
                 ephemeral=True
             )
     
@@ -330,20 +367,23 @@ class Offers(commands.Cog):
         offer="Your offer amount (e.g., 90g, 1.5mg)",
         message="Optional message to the seller"
     )
+    @app_commands.guild_only()
+    @rate_limit()
     async def offer(self, interaction: discord.Interaction, trade_id: int, offer: str, message: str = None):
         """Make an offer on a trade"""
         buyer_id = str(interaction.user.id)
         
         # Check if buyer has trade name set
-        if not has_trade_name(buyer_id):
+        if not await has_trade_name(buyer_id):
             await interaction.response.send_message(
                 "You must set your trade name first! Use `/settradename`",
                 ephemeral=True
             )
             return
         
-        # Get the trade
-        trade = get_trade_by_id(trade_id)
+        # Get the trade (only from this server's market)
+        guild_id = str(interaction.guild_id)
+        trade = await get_trade_by_id(trade_id, guild_id)
         
         if not trade:
             await interaction.response.send_message(
@@ -378,24 +418,23 @@ class Offers(commands.Cog):
             )
             return
         
-        # Check if there's already a pending offer
-        pending_offer = get_pending_offer_for_trade(trade_id)
-        if pending_offer:
-            await interaction.response.send_message(
-                "This trade already has a pending offer. Wait for it to be resolved first.",
-                ephemeral=True
-            )
-            return
-        
-        # Create the offer
-        offer_id = create_offer(
+        # Create the offer (fails if another offer is pending or the trade closed meanwhile)
+        offer_id = await create_offer(
             trade_id,
             buyer_id,
             interaction.user.name,
             offer,
-            message
+            message,
+            guild_id
         )
         
+        if offer_id is None:
+            await interaction.response.send_message(
+                "This trade already has a pending offer. Wait for it to be resolved first.",
+                ephemeral=True
+            )
+            return
+        
         # Create embed for the offer
         embed = discord.Embed(
             title="New Trade Offer!",
@@ -415,38 +454,27 @@ class Offers(commands.Cog):
         )
         
         # Create the view with buttons
-        view = OfferView(
-            offer_id,
-            trade_id,
-            seller_id,
-            buyer_id,
-            interaction.user.name,
-            offer
-        )
+        view = offer_view(offer_id)
         
         await interaction.response.send_message(embed=embed, view=view)
         
         # Send DM to seller
-        try:
-            seller = await self.bot.fetch_user(int(seller_id))
-            dm_embed = discord.Embed(
-                title="You received a trade offer!",
-                description=f"{interaction.user.name} made an offer on your listing!",
-                color=discord.Color.blue()
-            )
-            dm_embed.add_field(name="Item", value=f"{quantity}x {item_name}")
-            dm_embed.add_field(name="Your Listed Price", value=price or "No price set")
-            dm_embed.add_field(name="Their Offer", value=offer)
-            if message:
-                dm_embed.add_field(name="Message", value=message, inline=False)
-            dm_embed.add_field(
-                name="Action Required",
-                value="Check the channel to accept or decline this offer!",
-                inline=False
-            )
-            await seller.send(embed=dm_embed)
-        except:
-            pass  # DMs might be disabled
+        dm_embed = discord.Embed(
+            title="You received a trade offer!",
+            description=f"{interaction.user.name} made an offer on your listing!",
+            color=discord.Color.blue()
+        )
+        dm_embed.add_field(name="Item", value=f"{quantity}x {item_name}")
+        dm_embed.add_field(name="Your Listed Price", value=price or "No price set")
+        dm_embed.add_field(name="Their Offer", value=offer)
+        if message:
+            dm_embed.add_field(name="Message", value=message, inline=False)
+        dm_embed.add_field(
+            name="Action Required",
+            value="Check the channel to accept or decline this offer!",
+            inline=False
+        )
+        notifier.notify(int(seller_id), dm_embed, 'offer_received')
 
 # Setup function for cog
 async def setup(bot):
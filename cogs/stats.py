@@ -0,0 +1,166 @@
+import os
+import time
+from collections import Counter
+import discord
+from discord import app_commands
+from discord.ext import commands
+from database import async_db
+from database.query_log import plan_warnings, query_log
+from utils.matching import matching_engine
+from utils.metrics import MetricsServer, metrics, record_command
+from utils.notifications import notifier
+from utils.pagination import field_text
+from utils.ratelimit import max_db_in_flight
+
+# Rows per table in /stats
+STATS_ROWS = 8
+
+# Statements shown by /slowqueries, and how much of each one's SQL
+SLOW_ROWS = 6
+SQL_PREVIEW = 160
+
+def _ms(seconds) -> str:
+    return f"{seconds * 1000:.1f}ms" if seconds is not None else "-"
+
+def _sql(sql: str) -> str:
+    return sql if len(sql) <= SQL_PREVIEW else sql[:SQL_PREVIEW - 3] + "..."
+
+def _uptime(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    return f"{days}d {hours}h {minutes}m" if days else f"{hours}h {minutes}m {seconds}s"
+
+class Stats(commands.Cog):
+    """Runtime metrics: the /metrics scrape endpoint and /stats"""
+    
+    def __init__(self, bot):
+        self.bot = bot
+        self.server = MetricsServer()
+    
+    async def cog_load(self):
+        self._register_gauges()
+        
+        # Local scrape endpoint, only when METRICS_PORT is set
+        port = os.getenv('METRICS_PORT')
+        if port:
+            host = os.getenv('METRICS_HOST', '127.0.0.1')
+            try:
+                await self.server.start(host, int(port))
+                print(f'[OK] Metrics at http://{host}:{port}/metrics', flush=True)
+            except (OSError, ValueError) as e:
+                print(f'[ERROR] Metrics endpoint not started: {type(e).__name__}: {e}', flush=True)
+    
+    async def cog_unload(self):
+        await self.server.stop()
+    
+    def _register_gauges(self):
+        cache = async_db.trade_name_cache_stats
+        metrics.gauge('trade_name_cache_hits', 'Trade name lookups served from the cache',
+                      lambda: cache()['hits'])
+        metrics.gauge('trade_name_cache_misses', 'Trade name lookups that went to the database',
+                      lambda: cache()['misses'])
+        metrics.gauge('trade_name_cache_hit_rate', 'Share of trade name lookups served from the cache',
+                      lambda: cache()['hit_rate'])
+        metrics.gauge('trade_name_cache_size', 'Trade names in the cache', lambda: cache()['size'])
+        metrics.gauge('db_in_flight', 'Storage calls awaiting a result', async_db.in_flight, label='kind')
+        metrics.gauge('db_write_queue_depth', 'Writes waiting for the writer thread', async_db.write_queue_depth)
+        metrics.gauge('notification_queue_depth', 'DMs waiting to be sent', notifier.queue_depth)
+        metrics.gauge('notifications', 'DM delivery outcomes since start',
+                      lambda: dict(notifier.outcomes), label='outcome')
+        metrics.gauge('order_book_orders', 'Priced orders in the matching engine', lambda: len(matching_engine))
+        metrics.gauge('guilds', 'Servers the bot is in', lambda: len(self.bot.guilds))
+        metrics.gauge('gateway_latency_seconds', 'Heartbeat latency (average over shards)', lambda: self.bot.latency)
+    
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        record_command(interaction)
+    
+    @app_commands.command(name="stats", description="Show command latency and bot health (bot owner only)")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def stats(self, interaction: discord.Interaction):
+        """Summarize the metrics collected since start"""
+        # The numbers cover every server the bot is in, so only its owner may see them
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("❌ Only the bot's owner can view bot stats.", ephemeral=True)
+            return
+        embed = discord.Embed(title="📊 Bot Stats", color=discord.Color.blurple())
+        
+        # Busiest commands first
+        rejected = Counter()
+        busy = 0
+        for (name, reason), count in list(metrics.command_rejections.items()):
+            rejected[name] += count
+            busy += count if reason == 'busy' else 0
+        commands_lines = []
+        ranked = sorted(metrics.commands.items(), key=lambda item: item[1].count, reverse=True)
+        for name, histogram in ranked[:STATS_ROWS]:
+            errors = metrics.command_errors.get(name, 0)
+            error_str = f", {errors} failed" if errors else ""
+            rejected_str = f", {rejected[name]} turned away" if rejected[name] else ""
+            commands_lines.append(f"`/{name}` {histogram.count}× p50 {_ms(histogram.quantile(0.5))} "
+                                  f"p95 {_ms(histogram.quantile(0.95))}{error_str}{rejected_str}")
+        embed.add_field(name="Commands", value=field_text(commands_lines) or "No commands yet", inline=False)
+        
+        # Storage functions that took the most time overall
+        storage_lines = []
+        ranked = sorted(metrics.storage.items(), key=lambda item: item[1].sum, reverse=True)
+        for name, histogram in ranked[:STATS_ROWS]:
+            storage_lines.append(f"`{name}` {histogram.count}× p95 {_ms(histogram.quantile(0.95))} "
+                                 f"total {histogram.sum:.1f}s")
+        embed.add_field(name="Storage", value=field_text(storage_lines) or "No calls yet", inline=False)
+        
+        cache = async_db.trade_name_cache_stats()
+        in_flight = async_db.in_flight()
+        runtime_lines = [
+            f"Uptime: {_uptime(time.time() - metrics.started)}",
+            f"Trade name cache: {cache['hit_rate']:.1%} hits ({cache['size']} cached)",
+            f"Storage in flight: {in_flight['read']} read(s), {in_flight['write']} write(s) "
+            f"({async_db.write_queue_depth()} queued, busy above {max_db_in_flight()})",
+            f"Commands turned away: {sum(rejected.values())} ({busy} while busy)",
+            f"DMs queued: {notifier.queue_depth()}",
+            f"Order book: {len(matching_engine)} order(s)"
+        ]
+        embed.add_field(name="Runtime", value=field_text(runtime_lines), inline=False)
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @app_commands.command(name="slowqueries", description="Show the costliest SQL statements and their plans (bot owner only)")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def slowqueries(self, interaction: discord.Interaction):
+        """Per-statement totals since start, plus the most recent slow statements"""
+        # Statements and their parameters come from every server, so only the owner may see them
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("❌ Only the bot's owner can view SQL statements.", ephemeral=True)
+            return
+        embed = discord.Embed(
+            title="🐢 SQL Statements",
+            description=f"Statements over {query_log.threshold * 1000:.0f}ms are logged as slow. "
+                        f"⚠️ marks plans with a full table scan or a temporary sort.",
+            color=discord.Color.orange()
+        )
+        
+        # Most total time first
+        for rank, (sql, stats, plan) in enumerate(query_log.top(SLOW_ROWS), start=1):
+            warnings = plan_warnings(plan)
+            lines = [
+                f"{stats.calls}× total {stats.total:.2f}s, avg {_ms(stats.total / stats.calls)}, "
+                f"max {_ms(stats.max)}, {stats.rows} row(s), {stats.slow} slow",
+                f"```sql\n{_sql(sql)}\n```"
+            ]
+            lines.extend(f"⚠️ `{step}`" for step in warnings)
+            embed.add_field(name=f"#{rank}{' ⚠️' if warnings else ''}", value=field_text(lines), inline=False)
+        
+        recent = list(query_log.recent)[-SLOW_ROWS:]
+        recent_lines = [f"<t:{int(slow.ts)}:R> {_ms(slow.seconds)}, {slow.rows} row(s), "
+                        f"params `{slow.params}`: `{_sql(slow.sql)[:80]}`"
+                        for slow in reversed(recent)]
+        embed.add_field(name="Recent slow statements", value=field_text(recent_lines) or "None yet", inline=False)
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# Setup function for cog
+async def setup(bot):
+    await bot.add_cog(Stats(bot))
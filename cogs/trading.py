@@ -1,8 +1,39 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from database.db_manager import add_trade
-from utils.parsers import parse_listing
+from typing import List, Optional
+from database.async_db import add_trade, add_trades, get_active_item_names, get_orders, get_trade_by_id
+from utils.catalog import get_catalog
+from utils.item_index import item_index, item_autocomplete
+from utils.pagination import field_text
+from utils.parsers import parse_bulk_listings, parse_listing
+from utils.ratelimit import rate_limit, spend
+
+# Most listings one /bulksell or /bulkbuy can post, and the largest file it reads
+MAX_BULK_LISTINGS = 50
+MAX_BULK_FILE_BYTES = 64 * 1024
+
+# Bulk posts are rate limited when submitted, one token per this many
+# listings (so a full post uses up a user's whole burst)
+BULK_LISTINGS_PER_TOKEN = 10
+
+class BulkListingModal(discord.ui.Modal):
+    """Text box for pasting listings, one per line"""
+    
+    listings = discord.ui.TextInput(
+        label="Listings (item | price | notes, one per line)",
+        style=discord.TextStyle.paragraph,
+        placeholder="2x gloves of Feroxi | 1.5mg | perfect stats\nshield of valor | 500g",
+        max_length=4000
+    )
+    
+    def __init__(self, cog: 'Trading', trade_type: str):
+        super().__init__(title="Bulk Sell" if trade_type == 'WTS' else "Bulk Buy")
+        self.cog = cog
+        self.trade_type = trade_type
+    
+    async def on_submit(self, interaction: discord.Interaction):
+        await self.cog.post_bulk(interaction, self.trade_type, self.listings.value)
 
 class Trading(commands.Cog):
     """Commands for listing items to sell or buy"""
@@ -10,12 +41,45 @@ class Trading(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
     
+    async def cog_load(self):
+        # Build the autocomplete index once; trade events keep it current
+        item_index.build(get_catalog().names(), await get_active_item_names())
+    
+    @commands.Cog.listener()
+    async def on_trade_added(self, trade_id: int):
+        trade = await get_trade_by_id(trade_id)
+        if trade:
+            item_index.add(trade[3])
+    
+    @commands.Cog.listener()
+    async def on_trades_added(self, guild_id: str, trade_ids: List[int]):
+        for row in await get_orders(trade_ids):
+            item_index.add(row[6])
+    
+    @commands.Cog.listener()
+    async def on_trade_closed(self, trade_id: int):
+        trade = await get_trade_by_id(trade_id)
+        if trade:
+            item_index.discard(trade[3])
+    
+    @commands.Cog.listener()
+    async def on_market_cleared(self, guild_id: str):
+        # Other guilds' listings still count, so recount from the database
+        item_index.build(get_catalog().names(), await get_active_item_names())
+    
+    @commands.Cog.listener()
+    async def on_market_imported(self):
+        item_index.build(get_catalog().names(), await get_active_item_names())
+    
     @app_commands.command(name="sell", description="List an item for sale")
     @app_commands.describe(
         item="The item you want to sell (e.g., 2x gloves of Feroxi)",
         price="The price you're asking (optional)",
         notes="Additional notes about the item (optional)"
     )
+    @app_commands.autocomplete(item=item_autocomplete)
+    @app_commands.guild_only()
+    @rate_limit()
     async def sell(self, interaction: discord.Interaction, item: str, price: str = None, notes: str = None):
         """List an item for sale"""
         try:
@@ -26,17 +90,24 @@ class Trading(commands.Cog):
                 await interaction.response.send_message("❌ Please provide an item name!", ephemeral=True)
                 return
             
+            # Map the name to a catalog item (None if it isn't in the catalog)
+            item_id = get_catalog().resolve(item_name)
+            
             # Add to database
-            trade_id = add_trade(
+            trade_id = await add_trade(
+                str(interaction.guild_id),
                 str(interaction.user.id),
                 interaction.user.name,
                 'WTS',
                 item_name,
                 quantity,
                 price,
-                notes
+                notes,
+                item_id
             )
             
+            self.bot.dispatch('trade_added', trade_id)
+            
             # Create embed
             embed = discord.Embed(title="✅ Trade Listed", color=discord.Color.green())
             embed.add_field(name="Seller", value=interaction.user.mention, inline=False)
@@ -49,7 +120,7 @@ class Trading(commands.Cog):
             embed.set_footer(text=f"Listed by {interaction.user.name}")
             
             await interaction.response.send_message(embed=embed)
-            
+        
         except Exception as e:
             await interaction.response.send_message(f"❌ Error creating listing: {str(e)}", ephemeral=True)
     
@@ -59,6 +130,9 @@ class Trading(commands.Cog):
         offer="Your offer price (optional)",
         notes="Additional notes (optional)"
     )
+    @app_commands.autocomplete(item=item_autocomplete)
+    @app_commands.guild_only()
+    @rate_limit()
     async def buy(self, interaction: discord.Interaction, item: str, offer: str = None, notes: str = None):
         """Post a buy order"""
         try:
@@ -69,17 +143,24 @@ class Trading(commands.Cog):
                 await interaction.response.send_message("❌ Please provide an item name!", ephemeral=True)
                 return
             
+            # Map the name to a catalog item (None if it isn't in the catalog)
+            item_id = get_catalog().resolve(item_name)
+            
             # Add to database
-            trade_id = add_trade(
+            trade_id = await add_trade(
+                str(interaction.guild_id),
                 str(interaction.user.id),
                 interaction.user.name,
                 'WTB',
                 item_name,
                 quantity,
                 offer,
-                notes
+                notes,
+                item_id
             )
             
+            self.bot.dispatch('trade_added', trade_id)
+            
             # Create embed
             embed = discord.Embed(title="✅ Buy Order Posted", color=discord.Color.blue())
             embed.add_field(name="Buyer", value=interaction.user.mention, inline=False)
@@ -92,9 +173,105 @@ class Trading(commands.Cog):
             embed.set_footer(text=f"Posted by {interaction.user.name}")
             
             await interaction.response.send_message(embed=embed)
-            
+        
         except Exception as e:
             await interaction.response.send_message(f"❌ Error creating buy order: {str(e)}", ephemeral=True)
+    
+    @app_commands.command(name="bulksell", description="List many items for sale at once")
+    @app_commands.describe(file="A .txt file (item | price | notes per line) or .csv file (item,price,notes); leave out to paste lines")
+    @app_commands.guild_only()
+    async def bulksell(self, interaction: discord.Interaction, file: Optional[discord.Attachment] = None):
+        """List several items for sale in one go"""
+        await self._bulk(interaction, 'WTS', file)
+    
+    @app_commands.command(name="bulkbuy", description="Post many buy orders at once")
+    @app_commands.describe(file="A .txt file (item | offer | notes per line) or .csv file (item,offer,notes); leave out to paste lines")
+    @app_commands.guild_only()
+    async def bulkbuy(self, interaction: discord.Interaction, file: Optional[discord.Attachment] = None):
+        """Post several buy orders in one go"""
+        await self._bulk(interaction, 'WTB', file)
+    
+    async def _bulk(self, interaction: discord.Interaction, trade_type: str, file: Optional[discord.Attachment]):
+        # Slash command options can't hold several lines, so ask for them in a form
+        if file is None:
+            await interaction.response.send_modal(BulkListingModal(self, trade_type))
+            return
+        
+        if file.size > MAX_BULK_FILE_BYTES:
+            await interaction.response.send_message(
+                f"❌ That file is too large (max {MAX_BULK_FILE_BYTES // 1024} KB).", ephemeral=True)
+            return
+        try:
+            text = (await file.read()).decode('utf-8-sig')
+        except (discord.HTTPException, UnicodeDecodeError):
+            await interaction.response.send_message("❌ Couldn't read that file; upload it as UTF-8 text.", ephemeral=True)
+            return
+        
+        csv_format = file.filename.lower().endswith('.csv') or (file.content_type or '').startswith('text/csv')
+        await self.post_bulk(interaction, trade_type, text, csv_format)
+    
+    async def post_bulk(self, interaction: discord.Interaction, trade_type: str, text: str, csv_format: bool = False):
+        """Parse listings (one per line), add the valid ones in one transaction
+        and reply with a summary of what was posted and what was rejected"""
+        try:
+            listings, rejected = parse_bulk_listings(text, csv_format)
+            if len(listings) > MAX_BULK_LISTINGS:
+                lines = text.splitlines()
+                for number, *_ in listings[MAX_BULK_LISTINGS:]:
+                    rejected.append((number, lines[number - 1], f"over the limit of {MAX_BULK_LISTINGS} listings"))
+            listings = listings[:MAX_BULK_LISTINGS]
+            
+            # Charged here rather than by @rate_limit(), so opening the form
+            # is free and the cost grows with the number of listings
+            command = 'bulksell' if trade_type == 'WTS' else 'bulkbuy'
+            if not await spend(interaction, command, max(1, -(-len(listings) // BULK_LISTINGS_PER_TOKEN))):
+                return
+            
+            trade_ids = []
+            if listings:
+                catalog = get_catalog()
+                trade_ids = await add_trades(
+                    str(interaction.guild_id),
+                    str(interaction.user.id),
+                    interaction.user.name,
+                    trade_type,
+                    [(item_name, quantity, price, notes, catalog.resolve(item_name))
+                     for _, item_name, quantity, price, notes in listings]
+                )
+                
+                # One event for the whole batch, so listeners read it back in one go
+                self.bot.dispatch('trades_added', str(interaction.guild_id), trade_ids)
+            
+            # Create summary embed
+            selling = trade_type == 'WTS'
+            if trade_ids:
+                title = f"✅ {len(trade_ids)} Trade(s) Listed" if selling else f"✅ {len(trade_ids)} Buy Order(s) Posted"
+                color = discord.Color.green() if selling else discord.Color.blue()
+            else:
+                title = "❌ Nothing Listed" if selling else "❌ No Buy Orders Posted"
+                color = discord.Color.red()
+            embed = discord.Embed(title=title, color=color)
+            embed.add_field(name="Seller" if selling else "Buyer", value=interaction.user.mention, inline=False)
+            
+            if trade_ids:
+                lines = []
+                for trade_id, (_, item_name, quantity, price, _) in zip(trade_ids, listings):
+                    price_str = f" - {price}" if price else ""
+                    lines.append(f"`[{trade_id}]` {quantity}x {item_name}{price_str}")
+                embed.add_field(name="Listed" if selling else "Posted", value=field_text(lines), inline=False)
+            
+            if rejected:
+                lines = [f"Line {number}: {reason} (`{line.strip()[:60]}`)" for number, line, reason in rejected]
+                embed.add_field(name=f"⚠️ Rejected ({len(rejected)})", value=field_text(lines), inline=False)
+            elif not trade_ids:
+                embed.description = "No listings found. Put one item per line: `item | price | notes`"
+            
+            embed.set_footer(text=f"{'Listed' if selling else 'Posted'} by {interaction.user.name}")
+            
+            await interaction.response.send_message(embed=embed, ephemeral=not trade_ids)
+        
+        except Exception as e:
+            await interaction.response.send_message(f"❌ Error creating listings: {str(e)}", ephemeral=True)
 
 # Setup function for cog
 async def setup(bot):
@@ -0,0 +1,298 @@
+"""
+Awaitable wrappers around the storage backend (database.storage).
+
+With SQLite, writes are serialized through one writer thread that owns a
+long-lived WAL connection and reads are spread over a small pool of
+read-only connections. Nothing here touches SQLite on the event loop, so a
+slow query can't stall interactions or the gateway heartbeat. Backends that
+don't block (the in-memory one) are called directly on the event loop.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import queue
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from database import db_manager
+from database.storage import SQLiteStorage, Storage
+from utils.metrics import metrics
+
+# Number of read-only connections (one per reader thread)
+READ_POOL_SIZE = 4
+
+# Group commit: at most this many writes share a transaction, and the writer
+# waits at most this long (seconds) after the first write for more to arrive
+BATCH_MAX_SIZE = 64
+BATCH_WINDOW = 0.005
+
+# Retries for "database is locked/busy" errors that outlast the busy timeout
+RETRY_ATTEMPTS = 5
+RETRY_BACKOFF = 0.05  # seconds, doubled on every attempt
+
+_storage: Optional[Storage] = None
+_writer: Optional['_WriterThread'] = None
+_readers: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_reader_connections: List[sqlite3.Connection] = []
+_reader_lock = threading.Lock()
+
+# Calls awaiting a result right now (queued or running)
+_in_flight = {'read': 0, 'write': 0}
+
+def _with_retry(func, *args, **kwargs):
+    """Run a db_manager function, retrying while the database is busy"""
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return func(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            message = str(e).lower()
+            if ('locked' not in message and 'busy' not in message) or attempt == RETRY_ATTEMPTS - 1:
+                raise
+            time.sleep(RETRY_BACKOFF * (2 ** attempt))
+
+class _WriterThread(threading.Thread):
+    """Owns the single read-write connection and runs queued writes in order.
+    
+    Writes that arrive close together are group-committed: up to
+    BATCH_MAX_SIZE jobs collected within BATCH_WINDOW share one transaction
+    (and one fsync). Each job runs in its own savepoint, so a failing job
+    only rolls back itself, and no caller sees its result before the batch
+    has committed.
+    """
+
+    def __init__(self):
+        super().__init__(name='db-writer', daemon=True)
+        self.jobs = queue.Queue()
+
+    def submit(self, func, args, kwargs) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        self.jobs.put((func, args, kwargs, future))
+        return future
+
+    def stop(self):
+        self.jobs.put(None)
+        self.join()
+
+    def run(self):
+        conn = db_manager.get_connection()
+        db_manager.bind_connection(conn)
+        try:
+            running = True
+            while running:
+                job = self.jobs.get()
+                if job is None:
+                    break
+                
+                # Collect whatever else arrives within the batch window
+                batch = [job]
+                deadline = time.monotonic() + BATCH_WINDOW
+                while len(batch) < BATCH_MAX_SIZE:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        job = self.jobs.get(timeout=remaining) if remaining > 0 else self.jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        # Shutting down: commit what we have, then stop
+                        running = False
+                        break
+                    batch.append(job)
+                
+                self._commit_batch(batch)
+        finally:
+            db_manager.bind_connection(None)
+            conn.close()
+
+    def _commit_batch(self, batch):
+        jobs = [job for job in batch if job[3].set_running_or_notify_cancel()]
+        if not jobs:
+            return
+
+        try:
+            outcomes = _with_retry(self._run_jobs, jobs)
+        except BaseException as e:
+            # The batch transaction itself failed, so none of it was written
+            for _, _, _, future in jobs:
+                future.set_exception(e)
+            return
+
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    @staticmethod
+    def _run_jobs(jobs):
+        outcomes = []
+        with db_manager.transaction(immediate=True):
+            for func, args, kwargs, future in jobs:
+                try:
+                    with db_manager.transaction():
+                        result = func(*args, **kwargs)
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+        return outcomes
+
+def _open_reader():
+    """Thread initializer: bind a read-only connection to this reader thread"""
+    conn = db_manager.get_connection(readonly=True)
+    db_manager.bind_connection(conn)
+    with _reader_lock:
+        _reader_connections.append(conn)
+
+def start(storage: Optional[Storage] = None):
+    """Use a storage backend (SQLite by default) and, if it blocks, start the
+    writer thread and reader pool (call after storage.init())"""
+    global _storage, _writer, _readers
+    if _writer is not None:
+        return
+
+    _storage = storage or SQLiteStorage()
+    if not _storage.threaded:
+        return
+
+    _writer = _WriterThread()
+    _writer.start()
+    _readers = concurrent.futures.ThreadPoolExecutor(
+        max_workers=READ_POOL_SIZE,
+        thread_name_prefix='db-reader',
+        initializer=_open_reader
+    )
+
+def close():
+    """Finish queued writes, then stop the writer and close every connection"""
+    global _storage, _writer, _readers
+    _storage = None
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+    if _readers is not None:
+        _readers.shutdown(wait=True)
+        _readers = None
+    with _reader_lock:
+        for conn in _reader_connections:
+            conn.close()
+        _reader_connections.clear()
+
+def _storage_or_default() -> Storage:
+    global _storage
+    if _storage is None:
+        # Not started (scripts): plain SQLite calls on worker threads
+        _storage = SQLiteStorage()
+    return _storage
+
+async def run_write(func, *args, **kwargs):
+    """Run a blocking storage function on the writer thread"""
+    if not _storage_or_default().threaded:
+        return func(*args, **kwargs)
+    if _writer is None:
+        return await asyncio.to_thread(_with_retry, func, *args, **kwargs)
+    return await asyncio.wrap_future(_writer.submit(func, args, kwargs))
+
+async def run_read(func, *args, **kwargs):
+    """Run a blocking storage function on a read-only pooled connection"""
+    if not _storage_or_default().threaded:
+        return func(*args, **kwargs)
+    if _readers is None:
+        return await asyncio.to_thread(_with_retry, func, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    call = functools.partial(_with_retry, func, *args, **kwargs)
+    return await loop.run_in_executor(_readers, call)
+
+def current_storage() -> Storage:
+    """The backend storage calls go to"""
+    return _storage_or_default()
+
+def trade_name_cache_stats() -> dict:
+    """Hit/miss counters and size of the storage's trade name cache"""
+    return _storage_or_default().get_trade_name_cache_stats()
+
+def in_flight() -> dict:
+    """Reads and writes awaiting a result right now"""
+    return dict(_in_flight)
+
+def write_queue_depth() -> int:
+    """Writes waiting for the writer thread"""
+    return _writer.jobs.qsize() if _writer is not None else 0
+
+def _write_op(name: str):
+    """Awaitable write calling the current backend's method of this name"""
+    @functools.wraps(getattr(Storage, name))
+    async def wrapper(*args, **kwargs):
+        func = metrics.timed_storage(name, getattr(_storage_or_default(), name))
+        _in_flight['write'] += 1
+        try:
+            return await run_write(func, *args, **kwargs)
+        finally:
+            _in_flight['write'] -= 1
+    return wrapper
+
+def _read_op(name: str):
+    """Awaitable read calling the current backend's method of this name"""
+    @functools.wraps(getattr(Storage, name))
+    async def wrapper(*args, **kwargs):
+        func = metrics.timed_storage(name, getattr(_storage_or_default(), name))
+        _in_flight['read'] += 1
+        try:
+            return await run_read(func, *args, **kwargs)
+        finally:
+            _in_flight['read'] -= 1
+    return wrapper
+
+# Trades
+add_trade = _write_op('add_trade')
+add_trades = _write_op('add_trades')
+get_active_item_names = _read_op('get_active_item_names')
+get_trade_by_id = _read_op('get_trade_by_id')
+get_trade_guild = _read_op('get_trade_guild')
+get_active_orders = _read_op('get_active_orders')
+get_active_order = _read_op('get_active_order')
+get_orders = _read_op('get_orders')
+get_trades_page = _read_op('get_trades_page')
+get_user_trades_page = _read_op('get_user_trades_page')
+search_trades_page = _read_op('search_trades_page')
+count_active_trades = _read_op('count_active_trades')
+count_user_trades = _read_op('count_user_trades')
+count_search_results = _read_op('count_search_results')
+remove_trade = _write_op('remove_trade')
+clear_all_trades = _write_op('clear_all_trades')
+
+# Trade names
+set_trade_name = _write_op('set_trade_name')
+_load_trade_name = _read_op('load_trade_name')
+
+async def get_trade_name(user_id: str) -> Optional[str]:
+    """Get a user's trade name, skipping the reader pool on a cache hit"""
+    storage = _storage_or_default()
+    found, name = storage.get_cached_trade_name(user_id)
+    if found:
+        return name
+    return await _load_trade_name(user_id)
+
+async def has_trade_name(user_id: str) -> bool:
+    """Check if a user has set their trade name"""
+    return await get_trade_name(user_id) is not None
+
+# Market boards
+set_market_board = _write_op('set_market_board')
+get_market_boards = _read_op('get_market_boards')
+remove_market_board = _write_op('remove_market_board')
+
+# Offers
+create_offer = _write_op('create_offer')
+get_offer = _read_op('get_offer')
+update_offer_status = _write_op('update_offer_status')
+complete_trade = _write_op('complete_trade')
+accept_offer = _write_op('accept_offer')
+
+# Price history
+get_price_history = _read_op('get_price_history')
+
+# Archive
+archive_closed_trades = _write_op('archive_closed_trades')
+archive_resolved_offers = _write_op('archive_resolved_offers')
+incremental_vacuum = _write_op('incremental_vacuum')
@@ -0,0 +1,198 @@
+"""
+Streaming export and import of the market tables.
+
+Each table goes to its own file, `<table>.jsonl` (one JSON object per row)
+or `<table>.csv` (a header row, then one row per line; empty fields are
+NULL), optionally gzipped (`.gz`). Rows are streamed in chunks of
+CHUNK_SIZE both ways, so memory use stays flat however big the table is:
+exports read them with fetchmany() from one read transaction, and imports
+insert each chunk with one executemany. Rows whose key is already stored
+are skipped, so an interrupted import can simply be run again.
+
+From the command line (stop the bot first when importing, or its caches go
+stale):
+
+    python -m database.backup export --output backups/ --format csv --gzip
+    python -m database.backup import backups/*.csv.gz
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+from itertools import chain
+from typing import BinaryIO, Callable, Iterator, List, Optional, TextIO, Tuple
+
+from database import db_manager
+from database.db_manager import BACKUP_TABLES
+from database.storage import SQLiteStorage
+
+# Rows per fetchmany() / executemany()
+CHUNK_SIZE = 500
+
+FORMATS = ('jsonl', 'csv')
+
+# Tables with a guild_id column (the ones a per-server export can include)
+GUILD_TABLES = ('trades', 'trades_archive', 'offers', 'offers_archive', 'completed_trades')
+
+def backup_filename(table: str, fmt: str, compress: bool) -> str:
+    return f"{table}.{fmt}{'.gz' if compress else ''}"
+
+def parse_backup_filename(filename: str) -> Tuple[str, str, bool]:
+    """(table, format, gzipped) from a name like 'trades.csv.gz'"""
+    name = os.path.basename(filename)
+    compress = name.endswith('.gz')
+    if compress:
+        name = name[:-3]
+    table, _, fmt = name.rpartition('.')
+    if table not in BACKUP_TABLES or fmt not in FORMATS:
+        raise ValueError(f"Can't tell the table and format from '{filename}' "
+                         f"(expected e.g. trades.jsonl or trades.csv.gz)")
+    return table, fmt, compress
+
+def _text(binary: BinaryIO, mode: str, compress: bool) -> TextIO:
+    if compress:
+        binary = gzip.GzipFile(fileobj=binary, mode=mode)
+    return io.TextIOWrapper(binary, encoding='utf-8', newline='')
+
+def export_table(table: str, out: BinaryIO, fmt: str = 'jsonl', compress: bool = False,
+                 guild_id: Optional[str] = None) -> int:
+    """Write a table (or one guild's rows of it) to a binary file; returns rows written.
+
+    A seekable file is overwritten from the start, so when a busy database
+    makes the caller retry, the retry replaces the partial export rather than
+    appending to it.
+    """
+    columns = db_manager.table_columns(table)
+    if out.seekable():
+        out.seek(0)
+        out.truncate()
+    text = _text(out, 'wb', compress)
+    writer = csv.writer(text) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(columns)
+
+    count = 0
+    try:
+        for rows in db_manager.export_rows(table, guild_id, CHUNK_SIZE):
+            if writer:
+                writer.writerows(rows)
+            else:
+                text.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows)
+            count += len(rows)
+    finally:
+        # Finish the gzip stream without closing the caller's file
+        binary = text.detach()
+        if compress:
+            binary.close()
+    return count
+
+def read_chunks(source: BinaryIO, fmt: str, compress: bool = False
+                ) -> Iterator[Tuple[List[str], List[Tuple]]]:
+    """Yield (columns, rows) chunks of up to CHUNK_SIZE rows from an export file"""
+    text = _text(source, 'rb', compress)
+    try:
+        if fmt == 'csv':
+            reader = csv.reader(text)
+            columns = next(reader, None)
+            rows = (tuple(value if value != '' else None for value in row) for row in reader)
+        else:
+            records = _jsonl_rows(text)
+            first = next(records, None)
+            columns = list(first) if first is not None else None
+            rows = (tuple(record.get(column) for column in columns) for record in chain([first], records))
+
+        if not columns:
+            return
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == CHUNK_SIZE:
+                yield columns, chunk
+                chunk = []
+        if chunk:
+            yield columns, chunk
+    finally:
+        # Leave the caller's file open
+        text.detach()
+
+def _jsonl_rows(text: TextIO) -> Iterator[dict]:
+    for number, line in enumerate(text, start=1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Line {number} isn't valid JSON: {e}") from None
+
+def import_table(table: str, source: BinaryIO, fmt: str = 'jsonl', compress: bool = False,
+                 progress: Optional[Callable[[int, int], None]] = None) -> Tuple[int, int]:
+    """Insert an export file's rows chunk by chunk; returns (rows read, rows
+    inserted), and calls progress(read, inserted) after every chunk"""
+    read = inserted = 0
+    for columns, rows in read_chunks(source, fmt, compress):
+        inserted += db_manager.import_rows(table, columns, rows)
+        read += len(rows)
+        if progress:
+            progress(read, inserted)
+    return read, inserted
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='python -m database.backup',
+                                     description='Export or import the market tables')
+    parser.add_argument('--db', default=os.getenv('DB_PATH') or 'trades.db', help='SQLite file (default: DB_PATH or trades.db)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='Write tables to <output>/<table>.<format>[.gz]')
+    export.add_argument('--tables', default=','.join(BACKUP_TABLES),
+                        help=f"Comma-separated tables (default: all of {', '.join(BACKUP_TABLES)})")
+    export.add_argument('--format', choices=FORMATS, default='jsonl')
+    export.add_argument('--gzip', action='store_true', help='Compress the files')
+    export.add_argument('--guild', help="Only this server's rows (trade names are skipped)")
+    export.add_argument('--output', default='.', help='Directory for the files (default: current)')
+
+    load = commands.add_parser('import', help='Insert rows from export files (table and format from the names)')
+    load.add_argument('files', nargs='+')
+
+    args = parser.parse_args(argv)
+
+    SQLiteStorage(args.db).init()
+
+    if args.command == 'export':
+        tables = [table.strip() for table in args.tables.split(',') if table.strip()]
+        for table in tables:
+            if table not in BACKUP_TABLES:
+                parser.error(f"unknown table '{table}'")
+        if args.guild:
+            tables = [table for table in tables if table in GUILD_TABLES]
+        os.makedirs(args.output, exist_ok=True)
+        for table in tables:
+            path = os.path.join(args.output, backup_filename(table, args.format, args.gzip))
+            with open(path, 'wb') as f:
+                count = export_table(table, f, args.format, args.gzip, args.guild)
+            print(f'[OK] {table}: {count} row(s) -> {path}', flush=True)
+        return
+
+    for path in args.files:
+        try:
+            table, fmt, compress = parse_backup_filename(path)
+        except ValueError as e:
+            print(f'[ERROR] {e}', flush=True)
+            sys.exit(1)
+
+        def progress(read: int, inserted: int):
+            if read % (CHUNK_SIZE * 20) == 0:
+                print(f'  {table}: {read} row(s) read, {inserted} inserted...', flush=True)
+
+        try:
+            with open(path, 'rb') as f:
+                read, inserted = import_table(table, f, fmt, compress, progress)
+        except (OSError, ValueError, EOFError) as e:
+            print(f'[ERROR] {path}: {type(e).__name__}: {e}', flush=True)
+            sys.exit(1)
+        print(f'[OK] {table}: {read} row(s) read, {inserted} inserted, '
+              f'{read - inserted} already present', flush=True)
+
+if __name__ == '__main__':
+    main()
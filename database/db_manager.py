@@ -1,316 +1,953 @@
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
+
+from database.migrations import MIGRATIONS
+from database.query_log import TimedConnection
+from database.rollups import PERIODS, record_sale, rollup_key
+from utils.prices import parse_price
 
 DB_PATH = 'trades.db'
 
-def get_connection():
-    """Get database connection"""
-    return sqlite3.connect(DB_PATH)
+# How long a connection waits on a locked database before giving up (seconds)
+BUSY_TIMEOUT = 5.0
 
-def init_database():
-    """Initialize the database with required tables"""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    # Trades table
-    c.execute('''CREATE TABLE IF NOT EXISTS trades
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id TEXT NOT NULL,
-                  username TEXT NOT NULL,
-                  trade_type TEXT NOT NULL,
-                  item_name TEXT NOT NULL,
-                  quantity INTEGER DEFAULT 1,
-                  price TEXT,
-                  notes TEXT,
-                  timestamp TEXT NOT NULL,
-                  active INTEGER DEFAULT 1)''')
-    
-    # Trade names table
-    c.execute('''CREATE TABLE IF NOT EXISTS trade_names
-                 (user_id TEXT PRIMARY KEY,
-                  trade_name TEXT NOT NULL,
-                  set_at TEXT NOT NULL)''')
-    
-    # Offers table
-    c.execute('''CREATE TABLE IF NOT EXISTS offers
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  trade_id INTEGER NOT NULL,
-                  buyer_id TEXT NOT NULL,
-                  buyer_username TEXT NOT NULL,
-                  offer_amount TEXT NOT NULL,
-                  message TEXT,
-                  status TEXT DEFAULT 'pending',
-                  timestamp TEXT NOT NULL,
-                  FOREIGN KEY (trade_id) REFERENCES trades (id))''')
-    
-    # Completed trades table
-    c.execute('''CREATE TABLE IF NOT EXISTS completed_trades
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  original_trade_id INTEGER,
-                  seller_id TEXT NOT NULL,
-                  seller_username TEXT NOT NULL,
-                  seller_tradename TEXT NOT NULL,
-                  buyer_id TEXT NOT NULL,
-                  buyer_username TEXT NOT NULL,
-                  buyer_tradename TEXT NOT NULL,
-                  item_name TEXT NOT NULL,
-                  quantity INTEGER,
-                  final_price TEXT,
-                  completion_type TEXT,
-                  completed_at TEXT NOT NULL)''')
-    
-    conn.commit()
-    conn.close()
-
-def add_trade(user_id: str, username: str, trade_type: str, item_name: str, 
-              quantity: int, price: Optional[str], notes: Optional[str]) -> int:
-    """Add a new trade to the database"""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    c.execute('''INSERT INTO trades (user_id, username, trade_type, item_name, quantity, price, notes, timestamp)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-              (user_id, username, trade_type, item_name, quantity, price, notes, datetime.now().isoformat()))
-    
-    trade_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    
-    return trade_id
+# Connections owned by the async layer are bound to their worker thread here
+_local = threading.local()
 
-def search_trades(query: str) -> List[Tuple]:
-    """Search for trades by item name"""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    c.execute('''SELECT id, user_id, username, trade_type, item_name, quantity, price, notes
-                 FROM trades 
-                 WHERE active = 1 AND item_name LIKE ?
-                 ORDER BY timestamp DESC''',
-              (f'%{query}%',))
-    
-    results = c.fetchall()
-    conn.close()
-    
-    return results
+def get_connection(readonly: bool = False):
+    """Get database connection (statements on it are timed; see database.query_log)"""
+    if readonly:
+        conn = sqlite3.connect(f'file:{DB_PATH}?mode=ro', uri=True,
+                               timeout=BUSY_TIMEOUT, isolation_level=None,
+                               check_same_thread=False, factory=TimedConnection)
+    else:
+        conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT, isolation_level=None,
+                               check_same_thread=False, factory=TimedConnection)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}')
+    return conn
 
-def get_all_trades(trade_type: Optional[str] = None, limit: int = 20) -> List[Tuple]:
-    """Get all active trades, optionally filtered by type"""
-    conn = get_connection()
-    c = conn.cursor()
+def bind_connection(conn: Optional[sqlite3.Connection]):
+    """Bind a long-lived connection to the current thread (None to unbind)"""
+    _local.conn = conn
+    _local.depth = 0
+    _local.after_commit = []
+
+def after_commit(callback):
+    """Run callback once the current outermost transaction commits.
     
-    if trade_type and trade_type.upper() in ['WTS', 'WTB']:
-        c.execute('''SELECT id, username, trade_type, item_name, quantity, price, timestamp
-                     FROM trades 
-                     WHERE active = 1 AND trade_type = ?
-                     ORDER BY timestamp DESC
-                     LIMIT ?''',
-                  (trade_type.upper(), limit))
+    Callbacks registered inside a savepoint that rolls back are dropped, so
+    in-memory state updated this way never runs ahead of the database.
+    """
+    _local.after_commit.append(callback)
+
+@contextmanager
+def transaction(immediate: bool = False):
+    """Yield a cursor inside a transaction, committing on success.
+    
+    Uses the connection bound to this thread if there is one, otherwise a
+    short-lived connection. Nested calls become savepoints. With immediate=True
+    the outermost transaction takes the write lock up front.
+    """
+    conn = getattr(_local, 'conn', None)
+    owned = conn is None
+    if owned:
+        conn = get_connection()
+        bind_connection(conn)
+    
+    depth = _local.depth
+    pending = len(_local.after_commit)
+    savepoint = f'sp_{depth}'
+    if depth:
+        conn.execute(f'SAVEPOINT {savepoint}')
     else:
-        c.execute('''SELECT id, username, trade_type, item_name, quantity, price, timestamp
-                     FROM trades 
-                     WHERE active = 1
-                     ORDER BY timestamp DESC
-                     LIMIT ?''',
-                  (limit,))
-    
-    results = c.fetchall()
-    conn.close()
-    
-    return results
+        conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+    _local.depth = depth + 1
+    try:
+        yield conn.cursor()
+    except BaseException:
+        del _local.after_commit[pending:]
+        if depth:
+            conn.execute(f'ROLLBACK TO {savepoint}')
+            conn.execute(f'RELEASE {savepoint}')
+        else:
+            conn.execute('ROLLBACK')
+        raise
+    else:
+        if depth:
+            conn.execute(f'RELEASE {savepoint}')
+        else:
+            conn.execute('COMMIT')
+            callbacks, _local.after_commit = _local.after_commit, []
+            for callback in callbacks:
+                callback()
+    finally:
+        _local.depth = depth
+        if owned:
+            bind_connection(None)
+            conn.close()
 
-def get_user_trades(user_id: str) -> List[Tuple]:
-    """Get all active trades for a specific user"""
+def _enable_incremental_vacuum():
+    """Switch the file to incremental auto-vacuum (a one-off VACUUM on older databases)"""
     conn = get_connection()
-    c = conn.cursor()
-    
-    c.execute('''SELECT id, trade_type, item_name, quantity, price, notes
-                 FROM trades 
-                 WHERE active = 1 AND user_id = ?
-                 ORDER BY timestamp DESC''',
-              (user_id,))
-    
-    results = c.fetchall()
-    conn.close()
-    
-    return results
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            print('[OK] Enabled incremental auto-vacuum', flush=True)
+    finally:
+        conn.close()
 
-def get_trade_by_id(trade_id: int) -> Optional[Tuple]:
-    """Get a specific trade by ID"""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    c.execute('''SELECT user_id, username, trade_type, item_name, quantity, price, notes, timestamp, active
-                 FROM trades 
-                 WHERE id = ?''',
-              (trade_id,))
-    
-    result = c.fetchone()
-    conn.close()
-    
-    return result
+def init_database():
+    """Initialize the database with required tables"""
+    _enable_incremental_vacuum()
+    
+    with transaction() as c:
+        # Trades table
+        c.execute('''CREATE TABLE IF NOT EXISTS trades
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      user_id TEXT NOT NULL,
+                      username TEXT NOT NULL,
+                      trade_type TEXT NOT NULL,
+                      item_name TEXT NOT NULL,
+                      quantity INTEGER DEFAULT 1,
+                      price TEXT,
+                      notes TEXT,
+                      timestamp TEXT NOT NULL,
+                      active INTEGER DEFAULT 1)''')
+        
+        # Trade names table
+        c.execute('''CREATE TABLE IF NOT EXISTS trade_names
+                     (user_id TEXT PRIMARY KEY,
+                      trade_name TEXT NOT NULL,
+                      set_at TEXT NOT NULL)''')
+        
+        # Offers table
+        c.execute('''CREATE TABLE IF NOT EXISTS offers
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      trade_id INTEGER NOT NULL,
+                      buyer_id TEXT NOT NULL,
+                      buyer_username TEXT NOT NULL,
+                      offer_amount TEXT NOT NULL,
+                      message TEXT,
+                      status TEXT DEFAULT 'pending',
+                      timestamp TEXT NOT NULL,
+                      FOREIGN KEY (trade_id) REFERENCES trades (id))''')
+        
+        # Completed trades table
+        c.execute('''CREATE TABLE IF NOT EXISTS completed_trades
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      original_trade_id INTEGER,
+                      seller_id TEXT NOT NULL,
+                      seller_username TEXT NOT NULL,
+                      seller_tradename TEXT NOT NULL,
+                      buyer_id TEXT NOT NULL,
+                      buyer_username TEXT NOT NULL,
+                      buyer_tradename TEXT NOT NULL,
+                      item_name TEXT NOT NULL,
+                      quantity INTEGER,
+                      final_price TEXT,
+                      completion_type TEXT,
+                      completed_at TEXT NOT NULL)''')
+    
+    migrate()
 
-def remove_trade(trade_id: int, user_id: str) -> Tuple[bool, str]:
-    """Remove a trade (mark as inactive)"""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    # Check if trade exists and belongs to user
-    c.execute('SELECT user_id, active FROM trades WHERE id = ?', (trade_id,))
-    result = c.fetchone()
+def migrate():
+    """Apply any schema migrations newer than the recorded schema version"""
+    with transaction() as c:
+        c.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                     (version INTEGER PRIMARY KEY,
+                      description TEXT NOT NULL,
+                      applied_at TEXT NOT NULL)''')
+        c.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+        current = c.fetchone()[0]
+    
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        
+        with transaction() as c:
+            step(c)
+            c.execute('INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                      (version, description, datetime.now().isoformat()))
+        print(f'[OK] Applied migration {version}: {description}', flush=True)
+
+def add_trade(guild_id: str, user_id: str, username: str, trade_type: str, item_name: str, 
+              quantity: int, price: Optional[str], notes: Optional[str],
+              item_id: Optional[int] = None) -> int:
+    """Add a new trade to a guild's market"""
+    now = datetime.now()
+    with transaction() as c:
+        c.execute('''INSERT INTO trades (user_id, username, trade_type, item_name, quantity, price, notes,
+                                         timestamp, created_ts, item_id, price_value, guild_id)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                  (user_id, username, trade_type, item_name, quantity, price, notes,
+                   now.isoformat(), int(now.timestamp()), item_id, parse_price(price), guild_id))
+        
+        return c.lastrowid
+
+def add_trades(guild_id: str, user_id: str, username: str, trade_type: str,
+               listings: List[Tuple[str, int, Optional[str], Optional[str], Optional[int]]]) -> List[int]:
+    """Add several trades, given as (item_name, quantity, price, notes, item_id),
+    to a guild's market in one transaction; returns their IDs in order"""
+    if not listings:
+        return []
+    
+    now = datetime.now()
+    rows = [(user_id, username, trade_type, item_name, quantity, price, notes,
+             now.isoformat(), int(now.timestamp()), item_id, parse_price(price), guild_id)
+            for item_name, quantity, price, notes, item_id in listings]
+    with transaction() as c:
+        c.executemany('''INSERT INTO trades (user_id, username, trade_type, item_name, quantity, price, notes,
+                                             timestamp, created_ts, item_id, price_value, guild_id)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      rows)
+        
+        # AUTOINCREMENT IDs are consecutive for rows inserted together
+        # (nothing else writes inside our transaction)
+        c.execute('SELECT last_insert_rowid()')
+        last_id = c.fetchone()[0]
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+
+def _fts_query(text: str, guild_id: str) -> Optional[str]:
+    """Turn free text into an FTS5 query within one guild: every word must
+    match the item name or notes as a prefix"""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    terms = ' '.join(f'"{word}"*' for word in words)
+    return f'guild_id:"{guild_id}" AND {{item_name notes}}:({terms})'
+
+def get_active_item_names() -> List[Tuple[str, int]]:
+    """Get each distinct item name among active trades with its listing count"""
+    with transaction() as c:
+        c.execute('''SELECT item_name, COUNT(*)
+                     FROM trades
+                     WHERE active = 1
+                     GROUP BY item_name''')
+        
+        return c.fetchall()
+
+def get_trade_by_id(trade_id: int, guild_id: Optional[str] = None) -> Optional[Tuple]:
+    """Get a specific trade by ID, only from guild_id's market if given
+    (compacted trades are read from the archive)"""
+    condition, params = 'id = ?', (trade_id,)
+    if guild_id is not None:
+        condition, params = 'id = ? AND guild_id = ?', (trade_id, guild_id)
+    
+    with transaction() as c:
+        for table in ('trades', 'trades_archive'):
+            c.execute(f'''SELECT user_id, username, trade_type, item_name, quantity, price, notes, timestamp, active
+                          FROM {table}
+                          WHERE {condition}''',
+                      params)
+            result = c.fetchone()
+            if result:
+                return result
+        
+        return None
+
+def get_trade_guild(trade_id: int) -> Optional[str]:
+    """Get the guild a trade was listed in (compacted trades are read from the archive)"""
+    with transaction() as c:
+        for table in ('trades', 'trades_archive'):
+            c.execute(f'SELECT guild_id FROM {table} WHERE id = ?', (trade_id,))
+            result = c.fetchone()
+            if result:
+                return result[0]
+        
+        return None
+
+# Order book feed: the matching engine keeps active priced trades in memory
+_ORDER_COLUMNS = ('id, guild_id, user_id, username, trade_type, item_id, item_name, quantity, price, '
+                  'price_value, created_ts')
+
+def get_active_orders() -> List[Tuple]:
+    """Get every active trade with a numeric price, oldest first"""
+    with transaction() as c:
+        c.execute(f'''SELECT {_ORDER_COLUMNS}
+                      FROM trades
+                      WHERE active = 1 AND price_value IS NOT NULL
+                      ORDER BY created_ts, id''')
+        
+        return c.fetchall()
+
+def get_active_order(trade_id: int) -> Optional[Tuple]:
+    """Get one active trade in order book form (None if closed or unpriced)"""
+    with transaction() as c:
+        c.execute(f'''SELECT {_ORDER_COLUMNS}
+                      FROM trades
+                      WHERE id = ? AND active = 1 AND price_value IS NOT NULL''',
+                  (trade_id,))
+        
+        return c.fetchone()
+
+def get_orders(trade_ids: List[int]) -> List[Tuple]:
+    """Get several active trades in order book form, priced or not (price_value
+    is None for unpriced ones), in trade_ids order"""
+    if not trade_ids:
+        return []
+    with transaction() as c:
+        c.execute(f'''SELECT {_ORDER_COLUMNS}
+                      FROM trades
+                      WHERE id IN ({_placeholders(trade_ids)}) AND active = 1''',
+                  list(trade_ids))
+        rows = {row[0]: row for row in c.fetchall()}
+    
+    return [rows[trade_id] for trade_id in trade_ids if trade_id in rows]
+
+# Pagination Functions
+# Pages are keyset-paginated: a cursor is (sort key, id) of a row on the
+# current page, and every page query reads at most limit + 1 rows through an
+# index, no matter how deep the page is. Each row ends with its sort key, so
+# the cursor for a row is (row[-1], row[0]).
+
+def _keyset_page(c, columns: str, source: str, where: str, params: tuple,
+                 sort: str, descending: bool, cursor: Optional[Tuple], forward: bool,
+                 limit: int) -> Tuple[List[Tuple], bool]:
+    """Run one keyset-paginated query; returns (rows, whether more rows exist)"""
+    # Walking backwards means flipping the comparison and order, then
+    # reversing the rows back into display order
+    ascending = descending != forward
+    if cursor is not None:
+        where += f' AND ({sort}, id) {">" if ascending else "<"} (?, ?)'
+        params += tuple(cursor)
+    order = 'ASC' if ascending else 'DESC'
+    
+    c.execute(f'''SELECT {columns}, {sort}
+                  FROM {source}
+                  WHERE {where}
+                  ORDER BY {sort} {order}, id {order}
+                  LIMIT ?''',
+              params + (limit + 1,))
+    rows = c.fetchall()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+    return rows, has_more
+
+# Sort orders for listing pages: name -> (sort column, descending)
+TRADE_SORTS = {
+    'newest': ('created_ts', True),
+    'price_low': ('price_value', False),
+    'price_high': ('price_value', True)
+}
+
+def _price_filter(where: str, params: tuple, sort_column: str,
+                  min_value: Optional[int], max_value: Optional[int], prefix: str = '') -> Tuple[str, tuple]:
+    """Add price range conditions (and drop unpriced trades when sorting by price)"""
+    if sort_column == 'price_value' or min_value is not None or max_value is not None:
+        where += f' AND {prefix}price_value IS NOT NULL'
+    if min_value is not None:
+        where += f' AND {prefix}price_value >= ?'
+        params += (min_value,)
+    if max_value is not None:
+        where += f' AND {prefix}price_value <= ?'
+        params += (max_value,)
+    return where, params
+
+def _trades_filter(guild_id: str, trade_type: Optional[str], sort: str,
+                   min_value: Optional[int], max_value: Optional[int]) -> Tuple[str, tuple]:
+    where, params = 'guild_id = ? AND active = 1', (guild_id,)
+    if trade_type and trade_type.upper() in ['WTS', 'WTB']:
+        where, params = 'guild_id = ? AND active = 1 AND trade_type = ?', (guild_id, trade_type.upper())
+    return _price_filter(where, params, TRADE_SORTS[sort][0], min_value, max_value)
+
+def get_trades_page(guild_id: str, trade_type: Optional[str] = None, cursor: Optional[Tuple] = None,
+                    forward: bool = True, limit: int = 10, sort: str = 'newest',
+                    min_value: Optional[int] = None, max_value: Optional[int] = None) -> Tuple[List[Tuple], bool]:
+    """Get one page of a guild's active trades (newest first, or by price), optionally within a price range"""
+    where, params = _trades_filter(guild_id, trade_type, sort, min_value, max_value)
+    sort_column, descending = TRADE_SORTS[sort]
+    
+    with transaction() as c:
+        return _keyset_page(c, 'id, username, trade_type, item_name, quantity, price', 'trades',
+                            where, params, sort_column, descending, cursor, forward, limit)
+
+def get_user_trades_page(guild_id: str, user_id: str, cursor: Optional[Tuple] = None,
+                         forward: bool = True, limit: int = 10) -> Tuple[List[Tuple], bool]:
+    """Get one page of a user's active trades in a guild, newest first"""
+    with transaction() as c:
+        return _keyset_page(c, 'id, trade_type, item_name, quantity, price, notes', 'trades',
+                            'guild_id = ? AND active = 1 AND user_id = ?', (guild_id, user_id),
+                            'created_ts', True, cursor, forward, limit)
+
+# Sort orders for search pages: name -> (sort column, descending)
+SEARCH_SORTS = {
+    'relevance': ('score', False),
+    'price_low': ('price_value', False),
+    'price_high': ('price_value', True)
+}
+
+# Search sorts paged by position instead of keyset. A bm25 score depends on
+# the whole index (document count, average length), so it changes with every
+# listing added or removed and can't serve as a cursor. These pages are best
+# effort: each row ends with its position in the ranking, and Prev/Next move
+# by LIMIT/OFFSET from there, so a change between clicks can shift a row
+# across a page boundary.
+POSITION_SORTS = ('relevance',)
+
+def position_window(cursor: Optional[Tuple], forward: bool, limit: int) -> Tuple[int, int]:
+    """(first position, rows to read) for a position-paged page; the cursor
+    is (position, id) of a row on the current page"""
+    if cursor is None:
+        return 0, limit
+    if forward:
+        return cursor[0] + 1, limit
+    start = max(0, cursor[0] - limit)
+    return start, cursor[0] - start
+
+def _search_source(min_value: Optional[int], max_value: Optional[int], sort: str) -> Tuple[str, tuple]:
+    """Ranked active matches as a subquery (item name hits weigh more than notes hits)"""
+    where, params = _price_filter('trades_fts MATCH ? AND t.active = 1', (), SEARCH_SORTS[sort][0],
+                                  min_value, max_value, prefix='t.')
+    source = f'''(SELECT t.id, t.user_id, t.username, t.trade_type, t.item_name, t.quantity, t.price, t.notes,
+                         t.price_value, bm25(trades_fts, 10.0, 1.0, 0.0) AS score
+                  FROM trades_fts
+                  JOIN trades t ON t.id = trades_fts.rowid
+                  WHERE {where})'''
+    return source, params
+
+def search_trades_page(guild_id: str, query: str, cursor: Optional[Tuple] = None,
+                       forward: bool = True, limit: int = 10, sort: str = 'relevance',
+                       min_value: Optional[int] = None, max_value: Optional[int] = None) -> Tuple[List[Tuple], bool]:
+    """Get one page of a guild's search results (best matches first, or by price)"""
+    match = _fts_query(query, guild_id)
+    if not match:
+        return [], False
+    
+    source, params = _search_source(min_value, max_value, sort)
+    sort_column, descending = SEARCH_SORTS[sort]
+    columns = 'id, user_id, username, trade_type, item_name, quantity, price, notes'
+    with transaction() as c:
+        if sort not in POSITION_SORTS:
+            return _keyset_page(c, columns, source, '1 = 1', (match,) + params,
+                                sort_column, descending, cursor, forward, limit)
+        
+        start, count = position_window(cursor, forward, limit)
+        order = 'DESC' if descending else 'ASC'
+        c.execute(f'''SELECT {columns}
+                      FROM {source}
+                      ORDER BY {sort_column} {order}, id {order}
+                      LIMIT ? OFFSET ?''',
+                  (match,) + params + (count + 1, start))
+        rows = c.fetchall()
+    
+    has_more = len(rows) > count if forward else start > 0
+    return [row + (start + i,) for i, row in enumerate(rows[:count])], has_more
+
+def count_active_trades(guild_id: str, trade_type: Optional[str] = None, sort: str = 'newest',
+                        min_value: Optional[int] = None, max_value: Optional[int] = None) -> int:
+    """Count a guild's active trades matching the same filters as get_trades_page"""
+    where, params = _trades_filter(guild_id, trade_type, sort, min_value, max_value)
+    with transaction() as c:
+        c.execute(f'SELECT COUNT(*) FROM trades WHERE {where}', params)
+        return c.fetchone()[0]
+
+def count_user_trades(guild_id: str, user_id: str) -> int:
+    """Count a user's active trades in a guild"""
+    with transaction() as c:
+        c.execute('SELECT COUNT(*) FROM trades WHERE guild_id = ? AND active = 1 AND user_id = ?',
+                  (guild_id, user_id))
+        return c.fetchone()[0]
+
+def count_search_results(guild_id: str, query: str, sort: str = 'relevance',
+                         min_value: Optional[int] = None, max_value: Optional[int] = None) -> int:
+    """Count a guild's active trades matching a search"""
+    match = _fts_query(query, guild_id)
+    if not match:
+        return 0
+    
+    where, params = _price_filter('trades_fts MATCH ? AND t.active = 1', (), SEARCH_SORTS[sort][0],
+                                  min_value, max_value, prefix='t.')
+    with transaction() as c:
+        c.execute(f'''SELECT COUNT(*)
+                      FROM trades_fts
+                      JOIN trades t ON t.id = trades_fts.rowid
+                      WHERE {where}''',
+                  (match,) + params)
+        return c.fetchone()[0]
+
+def remove_trade(trade_id: int, user_id: str, guild_id: str) -> Tuple[bool, str]:
+    """Remove a trade from guild_id's market (mark as inactive)"""
+    with transaction(immediate=True) as c:
+        # Close it only if it is still active and belongs to the user
+        c.execute('''UPDATE trades SET active = 0, closed_ts = ?
+                     WHERE id = ? AND user_id = ? AND guild_id = ? AND active = 1''',
+                  (int(time.time()), trade_id, user_id, guild_id))
+        if c.rowcount == 1:
+            return True, "Trade removed successfully"
+        
+        # Nothing changed: work out why (another guild's trade is "not found")
+        c.execute('SELECT user_id, active FROM trades WHERE id = ? AND guild_id = ?', (trade_id, guild_id))
+        result = c.fetchone()
     
     if not result:
-        conn.close()
         return False, "Trade not found"
     
     owner_id, active = result
     
     if owner_id != user_id:
-        conn.close()
         return False, "You can only remove your own trades"
     
-    if not active:
-        conn.close()
-        return False, "Trade is already closed"
-    
-    # Mark as inactive
-    c.execute('UPDATE trades SET active = 0 WHERE id = ?', (trade_id,))
-    conn.commit()
-    conn.close()
-    
-    return True, "Trade removed successfully"
+    return False, "Trade is already closed"
 
-def clear_all_trades() -> int:
-    """Clear all active trades (admin function)"""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    c.execute('UPDATE trades SET active = 0 WHERE active = 1')
-    rows_affected = c.rowcount
-    
-    conn.commit()
-    conn.close()
-    
-    return rows_affected
+def clear_all_trades(guild_id: str) -> int:
+    """Clear all of a guild's active trades (admin function)"""
+    with transaction() as c:
+        c.execute('UPDATE trades SET active = 0, closed_ts = ? WHERE guild_id = ? AND active = 1',
+                  (int(time.time()), guild_id))
+        return c.rowcount
 
 # Trade Name Functions
+# Trade names are read on every offer and accept but almost never change, so
+# they are served from a bounded in-memory cache that is preloaded at startup
+# and updated write-through by set_trade_name.
+
+TRADE_NAME_CACHE_SIZE = 50000
+
+_MISSING = object()
+
+class TradeNameCache:
+    """Thread-safe LRU of user_id -> trade name (None means "has no name")"""
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._names = OrderedDict()
+        self._lock = threading.Lock()
+        # True while every stored trade name is in the cache, which makes a
+        # miss a definite "no trade name" without asking the database
+        self.complete = False
+    
+    def get(self, user_id: str):
+        """Cached name (or None), or _MISSING if the database must be asked"""
+        with self._lock:
+            name = self._names.get(user_id, _MISSING)
+            if name is _MISSING and self.complete:
+                name = None
+            if name is _MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if user_id in self._names:
+                    self._names.move_to_end(user_id)
+            return name
+    
+    def put(self, user_id: str, name: Optional[str]):
+        with self._lock:
+            self._put(user_id, name)
+    
+    def put_if_absent(self, user_id: str, name: Optional[str]):
+        """Cache a name read from the database, unless a write has cached a
+        (possibly newer) one since"""
+        with self._lock:
+            if user_id not in self._names:
+                self._put(user_id, name)
+    
+    def _put(self, user_id: str, name: Optional[str]):
+        self._names[user_id] = name
+        self._names.move_to_end(user_id)
+        while len(self._names) > self.capacity:
+            self._names.popitem(last=False)
+            self.complete = False
+    
+    def load(self, rows: List[Tuple[str, str]], complete: bool):
+        with self._lock:
+            self._names = OrderedDict(rows)
+            self.complete = complete
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._names),
+                'capacity': self.capacity
+            }
+
+trade_name_cache = TradeNameCache(TRADE_NAME_CACHE_SIZE)
+
+def preload_trade_names() -> int:
+    """Fill the trade name cache from the database; returns names loaded"""
+    with transaction() as c:
+        c.execute('SELECT user_id, trade_name FROM trade_names ORDER BY set_at DESC LIMIT ?',
+                  (TRADE_NAME_CACHE_SIZE + 1,))
+        rows = c.fetchall()
+    
+    complete = len(rows) <= TRADE_NAME_CACHE_SIZE
+    rows = rows[:TRADE_NAME_CACHE_SIZE]
+    # Most recently set names end up most recently used
+    trade_name_cache.load(reversed(rows), complete)
+    return len(rows)
+
+def get_trade_name_cache_stats() -> dict:
+    """Hit/miss counters and size of the trade name cache"""
+    return trade_name_cache.stats()
+
 def set_trade_name(user_id: str, trade_name: str) -> bool:
     """Set a user's trade name"""
-    conn = get_connection()
-    c = conn.cursor()
-    
     try:
-        c.execute('''INSERT OR REPLACE INTO trade_names (user_id, trade_name, set_at)
-                     VALUES (?, ?, ?)''',
-                  (user_id, trade_name, datetime.now().isoformat()))
-        conn.commit()
-        conn.close()
+        with transaction() as c:
+            c.execute('''INSERT OR REPLACE INTO trade_names (user_id, trade_name, set_at)
+                         VALUES (?, ?, ?)''',
+                      (user_id, trade_name, datetime.now().isoformat()))
+            after_commit(lambda: trade_name_cache.put(user_id, trade_name))
         return True
     except Exception as e:
-        conn.close()
         return False
 
+def get_cached_trade_name(user_id: str) -> Tuple[bool, Optional[str]]:
+    """Look a trade name up in the cache only; returns (found, name)"""
+    name = trade_name_cache.get(user_id)
+    if name is _MISSING:
+        return False, None
+    return True, name
+
+def load_trade_name(user_id: str) -> Optional[str]:
+    """Read a user's trade name from the database and cache it"""
+    with transaction() as c:
+        c.execute('SELECT trade_name FROM trade_names WHERE user_id = ?', (user_id,))
+        result = c.fetchone()
+        name = result[0] if result else None
+        # A set_trade_name committed after this read must win
+        after_commit(lambda: trade_name_cache.put_if_absent(user_id, name))
+    
+    return name
+
 def get_trade_name(user_id: str) -> Optional[str]:
     """Get a user's trade name"""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    c.execute('SELECT trade_name FROM trade_names WHERE user_id = ?', (user_id,))
-    result = c.fetchone()
-    conn.close()
-    
-    return result[0] if result else None
+    found, name = get_cached_trade_name(user_id)
+    if found:
+        return name
+    return load_trade_name(user_id)
 
 def has_trade_name(user_id: str) -> bool:
     """Check if a user has set their trade name"""
     return get_trade_name(user_id) is not None
 
+# Market Board Functions
+def set_market_board(guild_id: str, channel_id: str, message_id: str):
+    """Set (or replace) a guild's market board message"""
+    with transaction() as c:
+        c.execute('''INSERT OR REPLACE INTO market_boards (guild_id, channel_id, message_id, set_at)
+                     VALUES (?, ?, ?, ?)''',
+                  (guild_id, channel_id, message_id, datetime.now().isoformat()))
+
+def get_market_boards() -> List[Tuple]:
+    """Get every market board as (guild_id, channel_id, message_id)"""
+    with transaction() as c:
+        c.execute('SELECT guild_id, channel_id, message_id FROM market_boards')
+        return c.fetchall()
+
+def remove_market_board(guild_id: str) -> bool:
+    """Remove a guild's market board; False if it had none"""
+    with transaction() as c:
+        c.execute('DELETE FROM market_boards WHERE guild_id = ?', (guild_id,))
+        return c.rowcount == 1
+
 # Offer Functions
+# State changes are single conditional statements (or one IMMEDIATE
+# transaction), so two people clicking at once can't both succeed: the
+# loser's UPDATE matches no rows, and the partial unique index on offers
+# allows only one pending offer per trade.
+
 def create_offer(trade_id: int, buyer_id: str, buyer_username: str, 
-                offer_amount: str, message: Optional[str]) -> int:
-    """Create a new offer on a trade"""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    c.execute('''INSERT INTO offers (trade_id, buyer_id, buyer_username, offer_amount, message, timestamp)
-                 VALUES (?, ?, ?, ?, ?, ?)''',
-              (trade_id, buyer_id, buyer_username, offer_amount, message, datetime.now().isoformat()))
-    
-    offer_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    
-    return offer_id
+                offer_amount: str, message: Optional[str], guild_id: Optional[str] = None) -> Optional[int]:
+    """Create a new offer on an active WTS trade (in guild_id's market, if given).
+    
+    Returns the offer ID, or None if the trade is not open for offers
+    (closed, not WTS, in another guild, or already has a pending offer).
+    """
+    now = datetime.now()
+    condition, params = "id = ? AND active = 1 AND trade_type = 'WTS'", (trade_id,)
+    if guild_id is not None:
+        condition, params = condition + ' AND guild_id = ?', (trade_id, guild_id)
+    try:
+        with transaction(immediate=True) as c:
+            c.execute(f'''INSERT INTO offers (trade_id, buyer_id, buyer_username, offer_amount, message,
+                                              timestamp, created_ts, offer_value, guild_id)
+                          SELECT id, ?, ?, ?, ?, ?, ?, ?, guild_id
+                          FROM trades
+                          WHERE {condition}''',
+                      (buyer_id, buyer_username, offer_amount, message,
+                       now.isoformat(), int(now.timestamp()), parse_price(offer_amount)) + params)
+            
+            return c.lastrowid if c.rowcount == 1 else None
+    except sqlite3.IntegrityError:
+        # Another offer is already pending on this trade
+        return None
 
-def get_pending_offer_for_trade(trade_id: int) -> Optional[Tuple]:
-    """Get the pending offer for a trade (if any)"""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    c.execute('''SELECT id, buyer_id, buyer_username, offer_amount, message, timestamp
-                 FROM offers
-                 WHERE trade_id = ? AND status = 'pending'
-                 LIMIT 1''',
-              (trade_id,))
-    
-    result = c.fetchone()
-    conn.close()
-    
-    return result
+def get_offer(offer_id: int) -> Optional[Tuple]:
+    """Get an offer with its trade's seller:
+    (id, trade_id, seller_id, buyer_id, buyer_username, offer_amount, status)"""
+    with transaction() as c:
+        c.execute('''SELECT o.id, o.trade_id, t.user_id, o.buyer_id, o.buyer_username, o.offer_amount, o.status
+                     FROM offers o
+                     JOIN trades t ON t.id = o.trade_id
+                     WHERE o.id = ?''',
+                  (offer_id,))
+        
+        return c.fetchone()
 
 def update_offer_status(offer_id: int, status: str) -> bool:
-    """Update an offer's status (accepted/declined)"""
-    conn = get_connection()
-    c = conn.cursor()
-    
+    """Resolve a pending offer (accepted/declined); False if it was already resolved"""
     try:
-        c.execute('UPDATE offers SET status = ? WHERE id = ?', (status, offer_id))
-        conn.commit()
-        conn.close()
-        return True
+        with transaction(immediate=True) as c:
+            c.execute("UPDATE offers SET status = ?, resolved_ts = ? WHERE id = ? AND status = 'pending'",
+                      (status, int(time.time()), offer_id))
+            return c.rowcount == 1
     except Exception as e:
-        conn.close()
         return False
 
 def complete_trade(trade_id: int, buyer_id: str, buyer_username: str, 
-                  final_price: str, completion_type: str) -> bool:
-    """Mark a trade as completed and save to history"""
-    conn = get_connection()
-    c = conn.cursor()
-    
+                  final_price: str, completion_type: str,
+                  require_no_pending_offer: bool = False, guild_id: Optional[str] = None) -> bool:
+    """Mark a trade as completed and save to history.
+    
+    Fails (returns False) if the trade is missing, already closed or - when
+    guild_id is given - in another guild's market, or (with
+    require_no_pending_offer) if an offer on it is still pending.
+    """
+    now = datetime.now()
     try:
-        # Get the original trade details
-        c.execute('''SELECT user_id, username, item_name, quantity
-                     FROM trades WHERE id = ?''', (trade_id,))
-        trade = c.fetchone()
+        with transaction(immediate=True) as c:
+            # Close the trade only if nobody else got there first
+            condition, params = 'id = ? AND active = 1', (trade_id,)
+            if guild_id is not None:
+                condition, params = condition + ' AND guild_id = ?', (trade_id, guild_id)
+            if require_no_pending_offer:
+                condition += " AND NOT EXISTS (SELECT 1 FROM offers WHERE trade_id = trades.id AND status = 'pending')"
+            c.execute(f'UPDATE trades SET active = 0, closed_ts = ? WHERE {condition}',
+                      (int(now.timestamp()),) + params)
+            
+            if c.rowcount != 1:
+                return False
+            
+            # Copy it into completed trades along with both trade names
+            c.execute('''INSERT INTO completed_trades 
+                         (original_trade_id, seller_id, seller_username, seller_tradename,
+                          buyer_id, buyer_username, buyer_tradename, item_name, quantity,
+                          final_price, completion_type, completed_at, completed_ts, item_id,
+                          final_price_value, guild_id)
+                         SELECT t.id, t.user_id, t.username,
+                                COALESCE((SELECT trade_name FROM trade_names WHERE user_id = t.user_id), 'Unknown'),
+                                ?, ?,
+                                COALESCE((SELECT trade_name FROM trade_names WHERE user_id = ?), 'Unknown'),
+                                t.item_name, t.quantity, ?, ?, ?, ?, t.item_id, ?, t.guild_id
+                         FROM trades t WHERE t.id = ?''',
+                      (buyer_id, buyer_username, buyer_id, final_price, completion_type,
+                       now.isoformat(), int(now.timestamp()), parse_price(final_price), trade_id))
+            
+            # Fold the sale into the item's price history
+            c.execute('''SELECT guild_id, item_id, item_name, quantity, final_price_value, completed_ts
+                         FROM completed_trades WHERE id = ?''', (c.lastrowid,))
+            record_sale(c, *c.fetchone())
         
-        if not trade:
-            conn.close()
-            return False
+        return True
+    except Exception as e:
+        return False
+
+class _Abort(Exception):
+    """Raised inside a transaction to roll it back without reporting an error"""
+
+def accept_offer(offer_id: int) -> bool:
+    """Accept a pending offer and complete its trade in one transaction"""
+    try:
+        with transaction(immediate=True) as c:
+            c.execute('''SELECT trade_id, buyer_id, buyer_username, offer_amount
+                         FROM offers
+                         WHERE id = ? AND status = 'pending' ''', (offer_id,))
+            offer = c.fetchone()
+            if not offer:
+                return False
+            
+            trade_id, buyer_id, buyer_username, offer_amount = offer
+            c.execute("UPDATE offers SET status = 'accepted', resolved_ts = ? WHERE id = ?",
+                      (int(time.time()), offer_id))
+            if not complete_trade(trade_id, buyer_id, buyer_username, offer_amount, "offer_accepted"):
+                # Undo the status change too
+                raise _Abort()
         
-        seller_id, seller_username, item_name, quantity = trade
+        return True
+    except _Abort:
+        return False
+
+# Price History Functions
+def get_price_history(guild_id: str, item_id: Optional[int], item_name: str,
+                      period: str, since_ts: int) -> List[Tuple]:
+    """Get an item's price buckets in a guild since a time, oldest first.
+    
+    Reads price_rollups only. Rows are (bucket_ts, trade_count, volume,
+    min_price, max_price, first_price, last_price).
+    """
+    if period not in PERIODS:
+        raise ValueError(f'Unknown period: {period}')
+    
+    with transaction() as c:
+        c.execute('''SELECT bucket_ts, trade_count, volume, min_price, max_price, first_price, last_price
+                     FROM price_rollups
+                     WHERE guild_id = ? AND item_key = ? AND period = ? AND bucket_ts >= ?
+                     ORDER BY bucket_ts''',
+                  (guild_id, rollup_key(item_id, item_name), period, since_ts - since_ts % PERIODS[period]))
         
-        # Get trade names
-        seller_tradename = get_trade_name(seller_id) or "Unknown"
-        buyer_tradename = get_trade_name(buyer_id) or "Unknown"
+        return c.fetchall()
+
+# Archive Functions
+# Closed trades and resolved offers are moved out of the live tables in
+# small batches, so the tables (and indexes) every command touches stay
+# proportional to the active market. IDs are AUTOINCREMENT, so an archived
+# ID is never reused.
+
+def _placeholders(values: List) -> str:
+    return ', '.join('?' * len(values))
+
+def archive_closed_trades(cutoff_ts: int, batch_size: int = 500) -> int:
+    """Move up to batch_size trades closed before cutoff_ts (and all their offers) to the archive"""
+    with transaction(immediate=True) as c:
+        c.execute('''SELECT id FROM trades
+                     WHERE active = 0 AND closed_ts < ?
+                     ORDER BY closed_ts
+                     LIMIT ?''',
+                  (cutoff_ts, batch_size))
+        ids = [row[0] for row in c.fetchall()]
+        if not ids:
+            return 0
         
-        # Insert into completed trades
-        c.execute('''INSERT INTO completed_trades 
-                     (original_trade_id, seller_id, seller_username, seller_tradename,
-                      buyer_id, buyer_username, buyer_tradename, item_name, quantity,
-                      final_price, completion_type, completed_at)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (trade_id, seller_id, seller_username, seller_tradename,
-                   buyer_id, buyer_username, buyer_tradename, item_name, quantity,
-                   final_price, completion_type, datetime.now().isoformat()))
+        marks = _placeholders(ids)
+        c.execute(f'INSERT INTO offers_archive SELECT * FROM offers WHERE trade_id IN ({marks})', ids)
+        c.execute(f'DELETE FROM offers WHERE trade_id IN ({marks})', ids)
+        c.execute(f'INSERT INTO trades_archive SELECT * FROM trades WHERE id IN ({marks})', ids)
+        c.execute(f'DELETE FROM trades WHERE id IN ({marks})', ids)
+        return len(ids)
+
+def archive_resolved_offers(cutoff_ts: int, batch_size: int = 500) -> int:
+    """Move up to batch_size offers resolved before cutoff_ts to the archive"""
+    with transaction(immediate=True) as c:
+        c.execute('''SELECT id FROM offers
+                     WHERE status != 'pending' AND resolved_ts < ?
+                     ORDER BY resolved_ts
+                     LIMIT ?''',
+                  (cutoff_ts, batch_size))
+        ids = [row[0] for row in c.fetchall()]
+        if not ids:
+            return 0
         
-        # Mark original trade as inactive
-        c.execute('UPDATE trades SET active = 0 WHERE id = ?', (trade_id,))
+        marks = _placeholders(ids)
+        c.execute(f'INSERT INTO offers_archive SELECT * FROM offers WHERE id IN ({marks})', ids)
+        c.execute(f'DELETE FROM offers WHERE id IN ({marks})', ids)
+        return len(ids)
+
+def incremental_vacuum(max_pages: int = 1000) -> int:
+    """Return up to max_pages free pages to the OS; returns how many were freed"""
+    with transaction() as c:
+        c.execute('PRAGMA freelist_count')
+        pages = min(c.fetchone()[0], max_pages)
+        # sqlite3 steps a row-less PRAGMA only once per execute, and each
+        # step frees one page. Closing the cursor resets the statement so
+        # the transaction can commit.
+        vacuum = c.connection.cursor()
+        try:
+            for _ in range(pages):
+                vacuum.execute('PRAGMA incremental_vacuum(1)')
+        finally:
+            vacuum.close()
+        return pages
+
+# Export / Import Functions
+# Backups (database.backup) stream whole tables: rows are read with
+# fetchmany() inside one read transaction (a consistent snapshot), and
+# written back in chunks of one executemany each, so memory use doesn't grow
+# with the table.
+
+# Tables that can be exported, with the key used to skip rows already present
+BACKUP_TABLES = {
+    'trades': 'id',
+    'trades_archive': 'id',
+    'offers': 'id',
+    'offers_archive': 'id',
+    'trade_names': 'user_id',
+    'completed_trades': 'id'
+}
+
+# A row is in the live table or its archive, never both
+_ARCHIVE_PAIRS = {
+    'trades': 'trades_archive',
+    'trades_archive': 'trades',
+    'offers': 'offers_archive',
+    'offers_archive': 'offers'
+}
+
+def _backup_table(table: str) -> str:
+    if table not in BACKUP_TABLES:
+        raise ValueError(f"Unknown table '{table}' (expected one of: {', '.join(BACKUP_TABLES)})")
+    return table
+
+def table_columns(table: str) -> List[str]:
+    """Column names of a backup table, in table order"""
+    with transaction() as c:
+        c.execute(f'PRAGMA table_info({_backup_table(table)})')
+        return [row[1] for row in c.fetchall()]
+
+def export_rows(table: str, guild_id: Optional[str] = None, chunk_size: int = 500) -> Iterator[List[Tuple]]:
+    """Yield a table's rows (all columns, in table_columns() order) in chunks
+    of up to chunk_size, optionally only one guild's (not for trade_names)"""
+    where, params = ('WHERE guild_id = ?', (guild_id,)) if guild_id is not None else ('', ())
+    with transaction() as c:
+        c.execute(f'SELECT * FROM {_backup_table(table)} {where} ORDER BY rowid', params)
+        while True:
+            rows = c.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+def import_rows(table: str, columns: List[str], rows: List[Tuple]) -> int:
+    """Insert exported rows (values in columns order) in one transaction,
+    skipping rows whose key is already stored; returns rows inserted.
+    
+    Imported completed trades are folded into the price history.
+    """
+    key = BACKUP_TABLES[_backup_table(table)]
+    unknown = set(columns) - set(table_columns(table))
+    if unknown:
+        raise ValueError(f"Unknown column(s) for {table}: {', '.join(sorted(unknown))}")
+    if key not in columns:
+        raise ValueError(f"Rows for {table} need a '{key}' column")
+    
+    position = columns.index(key)
+    with transaction() as c:
+        keys = [row[position] for row in rows]
+        stored = set()
+        for other in (table, _ARCHIVE_PAIRS.get(table)):
+            if other and keys:
+                c.execute(f'SELECT {key} FROM {other} WHERE {key} IN ({_placeholders(keys)})', keys)
+                stored.update(str(row[0]) for row in c.fetchall())
+        rows = [row for row in rows if str(row[position]) not in stored]
+        if not rows:
+            return 0
         
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
+        # OR IGNORE: also skip rows a unique index rejects (a second pending offer)
+        c.executemany(f'''INSERT OR IGNORE INTO {table} ({", ".join(columns)})
+                          VALUES ({_placeholders(columns)})''',
+                      rows)
+        inserted = c.rowcount
+        
+        if table == 'completed_trades':
+            for row in rows:
+                sale = dict(zip(columns, row))
+                if sale.get('completed_ts') is not None:
+                    record_sale(c, sale.get('guild_id'), sale.get('item_id'), sale['item_name'],
+                                sale.get('quantity'), sale.get('final_price_value'), int(sale['completed_ts']))
+        return inserted
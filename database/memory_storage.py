@@ -0,0 +1,564 @@
+"""
+In-memory storage backend.
+
+Same behaviour and return shapes as the SQLite backend, with no I/O:
+
+- rows live in dicts keyed by id (NamedTuples, replaced on update)
+- every page/sort order is a sorted list of (sort key, id) maintained with
+  bisect, per guild and per guild + trade type / user, so keyset pages and
+  counts cost O(log n + page) like the SQLite indexes
+- search uses a per-guild inverted index with a sorted token list for
+  prefix lookups, ranked so item name hits beat notes hits
+
+Nothing is persisted. Not thread-safe: call it from one thread (async_db
+runs it directly on the event loop).
+"""
+import re
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from datetime import datetime
+from itertools import count
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from database.db_manager import POSITION_SORTS, SEARCH_SORTS, TRADE_SORTS, position_window
+from database.rollups import PERIODS, rollup_key
+from utils.prices import parse_price
+
+class _Trade(NamedTuple):
+    id: int
+    guild_id: Optional[str]
+    user_id: str
+    username: str
+    trade_type: str
+    item_name: str
+    quantity: int
+    price: Optional[str]
+    notes: Optional[str]
+    timestamp: str
+    created_ts: int
+    item_id: Optional[int]
+    price_value: Optional[int]
+    active: int = 1
+    closed_ts: Optional[int] = None
+
+class _Offer(NamedTuple):
+    id: int
+    guild_id: Optional[str]
+    trade_id: int
+    buyer_id: str
+    buyer_username: str
+    offer_amount: str
+    message: Optional[str]
+    timestamp: str
+    created_ts: int
+    offer_value: Optional[int]
+    status: str = 'pending'
+    resolved_ts: Optional[int] = None
+
+class _Completed(NamedTuple):
+    id: int
+    guild_id: Optional[str]
+    original_trade_id: int
+    seller_id: str
+    seller_username: str
+    seller_tradename: str
+    buyer_id: str
+    buyer_username: str
+    buyer_tradename: str
+    item_id: Optional[int]
+    item_name: str
+    quantity: int
+    final_price: str
+    final_price_value: Optional[int]
+    completion_type: str
+    completed_at: str
+    completed_ts: int
+
+def _tokens(text: Optional[str]) -> List[str]:
+    # Words as the FTS5 unicode61 tokenizer splits them
+    return re.findall(r'[^\W_]+', text.lower()) if text else []
+
+def _remove_key(keys: List[Tuple], key: Tuple):
+    index = bisect_left(keys, key)
+    if index < len(keys) and keys[index] == key:
+        del keys[index]
+
+def _walk(keys: List[Tuple], cursor: Optional[Tuple], descending: bool, forward: bool, limit: int,
+          keep: Optional[Callable[[int], bool]] = None) -> Tuple[List[Tuple], bool]:
+    """Keyset page over a sorted list of (sort key, id); returns ((sort key, id) rows, has_more)"""
+    # Same cursor rules as db_manager._keyset_page
+    ascending = descending != forward
+    if ascending:
+        index = bisect_right(keys, tuple(cursor)) if cursor is not None else 0
+        step = 1
+    else:
+        index = (bisect_left(keys, tuple(cursor)) if cursor is not None else len(keys)) - 1
+        step = -1
+
+    found = []
+    while 0 <= index < len(keys) and len(found) <= limit:
+        key = keys[index]
+        if keep is None or keep(key[1]):
+            found.append(key)
+        index += step
+
+    has_more = len(found) > limit
+    found = found[:limit]
+    if not forward:
+        found.reverse()
+    return found, has_more
+
+class _SearchIndex:
+    """Inverted index of one guild's active trades (item name and notes words)"""
+
+    def __init__(self):
+        self.tokens: List[str] = []               # sorted
+        self.names: Dict[str, Set[int]] = {}      # token -> trade ids with it in the item name
+        self.notes: Dict[str, Set[int]] = {}      # token -> trade ids with it in the notes
+
+    def _postings(self, postings: Dict[str, Set[int]], token: str) -> Set[int]:
+        ids = postings.get(token)
+        if ids is None:
+            if token not in self.names and token not in self.notes:
+                insort(self.tokens, token)
+            ids = postings[token] = set()
+        return ids
+
+    def add(self, trade: _Trade):
+        for token in set(_tokens(trade.item_name)):
+            self._postings(self.names, token).add(trade.id)
+        for token in set(_tokens(trade.notes)):
+            self._postings(self.notes, token).add(trade.id)
+
+    def discard(self, trade: _Trade):
+        for postings, text in ((self.names, trade.item_name), (self.notes, trade.notes)):
+            for token in set(_tokens(text)):
+                ids = postings.get(token)
+                if ids is None:
+                    continue
+                ids.discard(trade.id)
+                if not ids:
+                    del postings[token]
+                    if token not in self.names and token not in self.notes:
+                        _remove_key(self.tokens, token)
+
+    def _prefixed(self, prefix: str) -> List[str]:
+        index = bisect_left(self.tokens, prefix)
+        found = []
+        while index < len(self.tokens) and self.tokens[index].startswith(prefix):
+            found.append(self.tokens[index])
+            index += 1
+        return found
+
+    def search(self, query: str) -> Dict[int, float]:
+        """Trade ids where every query word prefixes a word, with a score (lower is better)"""
+        words = _tokens(query)
+        if not words:
+            return {}
+
+        scores: Optional[Dict[int, float]] = None
+        for word in words:
+            hits: Dict[int, float] = {}
+            for token in self._prefixed(word):
+                for trade_id in self.names.get(token, ()):
+                    hits[trade_id] = min(hits.get(trade_id, 0.0), -10.0)
+                for trade_id in self.notes.get(token, ()):
+                    hits.setdefault(trade_id, -1.0)
+            if scores is None:
+                scores = hits
+            else:
+                scores = {trade_id: scores[trade_id] + score
+                          for trade_id, score in hits.items() if trade_id in scores}
+            if not scores:
+                return {}
+        return scores
+
+class MemoryStorage:
+    """Storage backend holding everything in process memory"""
+
+    threaded = False
+
+    def __init__(self):
+        self.trades: Dict[int, _Trade] = {}
+        self.offers: Dict[int, _Offer] = {}
+        self.trades_archive: Dict[int, _Trade] = {}
+        self.offers_archive: Dict[int, _Offer] = {}
+        self.completed: List[_Completed] = []
+        self.trade_names: Dict[str, str] = {}
+        self.trade_name_lookups = 0
+        self.boards: Dict[str, Tuple[str, str]] = {}
+        # (guild_id, rollup key, period) -> bucket_ts -> bucket
+        self.rollups: Dict[Tuple, Dict[int, List[int]]] = {}
+
+        self._trade_ids = count(1)
+        self._offer_ids = count(1)
+
+        # Sorted (sort key, id) lists of active trades, keyed by
+        # (order, guild_id, trade_type or user_id or None)
+        self._keys: Dict[Tuple, List[Tuple]] = {}
+        self._search: Dict[Optional[str], _SearchIndex] = {}
+        self._item_names = Counter()
+        self._pending: Dict[int, int] = {}          # trade id -> pending offer id
+        self._trade_offers: Dict[int, Set[int]] = {}  # trade id -> offer ids
+        self._closed: List[Tuple[int, int]] = []    # (closed_ts, trade id)
+        self._resolved: List[Tuple[int, int]] = []  # (resolved_ts, offer id)
+
+    def init(self) -> int:
+        return len(self.trade_names)
+
+    # Active trade indexes
+    def _index_keys(self, trade: _Trade) -> List[Tuple[Tuple, Tuple]]:
+        guild = trade.guild_id
+        keys = [
+            (('created_ts', guild, None), (trade.created_ts, trade.id)),
+            (('created_ts', guild, trade.trade_type), (trade.created_ts, trade.id)),
+            (('user', guild, trade.user_id), (trade.created_ts, trade.id))
+        ]
+        if trade.price_value is not None:
+            keys.append((('price_value', guild, None), (trade.price_value, trade.id)))
+            keys.append((('price_value', guild, trade.trade_type), (trade.price_value, trade.id)))
+        return keys
+
+    def _index(self, trade: _Trade):
+        for name, key in self._index_keys(trade):
+            insort(self._keys.setdefault(name, []), key)
+        self._search.setdefault(trade.guild_id, _SearchIndex()).add(trade)
+        self._item_names[trade.item_name] += 1
+
+    def _unindex(self, trade: _Trade):
+        for name, key in self._index_keys(trade):
+            _remove_key(self._keys.get(name, []), key)
+        self._search[trade.guild_id].discard(trade)
+        self._item_names[trade.item_name] -= 1
+        if not self._item_names[trade.item_name]:
+            del self._item_names[trade.item_name]
+
+    def _close(self, trade: _Trade, closed_ts: int):
+        self._unindex(trade)
+        self.trades[trade.id] = trade._replace(active=0, closed_ts=closed_ts)
+        insort(self._closed, (closed_ts, trade.id))
+
+    # Trades
+    def add_trade(self, guild_id: str, user_id: str, username: str, trade_type: str, item_name: str,
+                  quantity: int, price: Optional[str], notes: Optional[str],
+                  item_id: Optional[int] = None) -> int:
+        now = datetime.now()
+        trade = _Trade(next(self._trade_ids), guild_id, user_id, username, trade_type, item_name,
+                       quantity, price, notes, now.isoformat(), int(now.timestamp()), item_id,
+                       parse_price(price))
+        self.trades[trade.id] = trade
+        self._index(trade)
+        return trade.id
+
+    def add_trades(self, guild_id: str, user_id: str, username: str, trade_type: str,
+                   listings: List[Tuple[str, int, Optional[str], Optional[str], Optional[int]]]) -> List[int]:
+        return [self.add_trade(guild_id, user_id, username, trade_type, item_name, quantity, price, notes, item_id)
+                for item_name, quantity, price, notes, item_id in listings]
+
+    def _ranked(self, guild_id: str, query: str) -> Dict[int, float]:
+        index = self._search.get(guild_id)
+        return index.search(query) if index else {}
+
+    def get_active_item_names(self) -> List[Tuple[str, int]]:
+        return list(self._item_names.items())
+
+    def get_trade_by_id(self, trade_id: int, guild_id: Optional[str] = None) -> Optional[Tuple]:
+        trade = self.trades.get(trade_id) or self.trades_archive.get(trade_id)
+        if trade is None or (guild_id is not None and trade.guild_id != guild_id):
+            return None
+        return (trade.user_id, trade.username, trade.trade_type, trade.item_name, trade.quantity,
+                trade.price, trade.notes, trade.timestamp, trade.active)
+
+    def get_trade_guild(self, trade_id: int) -> Optional[str]:
+        trade = self.trades.get(trade_id) or self.trades_archive.get(trade_id)
+        return trade.guild_id if trade is not None else None
+
+    @staticmethod
+    def _order_row(t: _Trade) -> Tuple:
+        return (t.id, t.guild_id, t.user_id, t.username, t.trade_type, t.item_id, t.item_name,
+                t.quantity, t.price, t.price_value, t.created_ts)
+
+    def get_active_orders(self) -> List[Tuple]:
+        orders = [t for t in self.trades.values() if t.active and t.price_value is not None]
+        orders.sort(key=lambda t: (t.created_ts, t.id))
+        return [self._order_row(t) for t in orders]
+
+    def get_active_order(self, trade_id: int) -> Optional[Tuple]:
+        t = self.trades.get(trade_id)
+        if t is None or not t.active or t.price_value is None:
+            return None
+        return self._order_row(t)
+
+    def get_orders(self, trade_ids: List[int]) -> List[Tuple]:
+        trades = (self.trades.get(trade_id) for trade_id in trade_ids)
+        return [self._order_row(t) for t in trades if t is not None and t.active]
+
+    def _trade_keys(self, guild_id: str, trade_type: Optional[str], sort: str,
+                    min_value: Optional[int], max_value: Optional[int]) -> Tuple[List[Tuple], Optional[Callable]]:
+        """Sorted keys for a listing query, plus a row filter if the keys can't express it"""
+        if not (trade_type and trade_type.upper() in ['WTS', 'WTB']):
+            trade_type = None
+        trade_type = trade_type and trade_type.upper()
+        sort_column = TRADE_SORTS[sort][0]
+
+        if sort_column == 'price_value' or min_value is not None or max_value is not None:
+            keys = self._keys.get(('price_value', guild_id, trade_type), [])
+            lo = bisect_left(keys, (min_value,)) if min_value is not None else 0
+            hi = bisect_left(keys, (max_value + 1,)) if max_value is not None else len(keys)
+            if sort_column == 'price_value':
+                return keys[lo:hi], None
+            in_range = {trade_id for _, trade_id in keys[lo:hi]}
+            return self._keys.get(('created_ts', guild_id, trade_type), []), in_range.__contains__
+
+        return self._keys.get(('created_ts', guild_id, trade_type), []), None
+
+    def get_trades_page(self, guild_id: str, trade_type: Optional[str] = None, cursor: Optional[Tuple] = None,
+                        forward: bool = True, limit: int = 10, sort: str = 'newest',
+                        min_value: Optional[int] = None,
+                        max_value: Optional[int] = None) -> Tuple[List[Tuple], bool]:
+        keys, keep = self._trade_keys(guild_id, trade_type, sort, min_value, max_value)
+        found, has_more = _walk(keys, cursor, TRADE_SORTS[sort][1], forward, limit, keep)
+        rows = []
+        for sort_value, trade_id in found:
+            t = self.trades[trade_id]
+            rows.append((t.id, t.username, t.trade_type, t.item_name, t.quantity, t.price, sort_value))
+        return rows, has_more
+
+    def get_user_trades_page(self, guild_id: str, user_id: str, cursor: Optional[Tuple] = None,
+                             forward: bool = True, limit: int = 10) -> Tuple[List[Tuple], bool]:
+        keys = self._keys.get(('user', guild_id, user_id), [])
+        found, has_more = _walk(keys, cursor, True, forward, limit)
+        rows = []
+        for created_ts, trade_id in found:
+            t = self.trades[trade_id]
+            rows.append((t.id, t.trade_type, t.item_name, t.quantity, t.price, t.notes, created_ts))
+        return rows, has_more
+
+    @staticmethod
+    def _search_row(t: _Trade) -> Tuple:
+        return (t.id, t.user_id, t.username, t.trade_type, t.item_name, t.quantity, t.price, t.notes)
+
+    def _search_keys(self, guild_id: str, query: str, sort: str,
+                     min_value: Optional[int], max_value: Optional[int]) -> List[Tuple]:
+        scores = self._ranked(guild_id, query)
+        by_price = SEARCH_SORTS[sort][0] == 'price_value'
+        keys = []
+        for trade_id, score in scores.items():
+            value = self.trades[trade_id].price_value
+            if (by_price or min_value is not None or max_value is not None) and value is None:
+                continue
+            if (min_value is not None and value < min_value) or (max_value is not None and value > max_value):
+                continue
+            keys.append((value if by_price else score, trade_id))
+        keys.sort()
+        return keys
+
+    def search_trades_page(self, guild_id: str, query: str, cursor: Optional[Tuple] = None,
+                           forward: bool = True, limit: int = 10, sort: str = 'relevance',
+                           min_value: Optional[int] = None,
+                           max_value: Optional[int] = None) -> Tuple[List[Tuple], bool]:
+        keys = self._search_keys(guild_id, query, sort, min_value, max_value)
+        if sort in POSITION_SORTS:
+            # Paged by position, like db_manager.search_trades_page
+            start, count = position_window(cursor, forward, limit)
+            found = keys[start:start + count]
+            has_more = start + count < len(keys) if forward else start > 0
+            return [self._search_row(self.trades[trade_id]) + (start + i,)
+                    for i, (_, trade_id) in enumerate(found)], has_more
+        found, has_more = _walk(keys, cursor, SEARCH_SORTS[sort][1], forward, limit)
+        return [self._search_row(self.trades[trade_id]) + (sort_value,)
+                for sort_value, trade_id in found], has_more
+
+    def count_active_trades(self, guild_id: str, trade_type: Optional[str] = None, sort: str = 'newest',
+                            min_value: Optional[int] = None, max_value: Optional[int] = None) -> int:
+        keys, keep = self._trade_keys(guild_id, trade_type, sort, min_value, max_value)
+        if keep is None:
+            return len(keys)
+        return sum(1 for _, trade_id in keys if keep(trade_id))
+
+    def count_user_trades(self, guild_id: str, user_id: str) -> int:
+        return len(self._keys.get(('user', guild_id, user_id), []))
+
+    def count_search_results(self, guild_id: str, query: str, sort: str = 'relevance',
+                             min_value: Optional[int] = None, max_value: Optional[int] = None) -> int:
+        return len(self._search_keys(guild_id, query, sort, min_value, max_value))
+
+    def remove_trade(self, trade_id: int, user_id: str, guild_id: str) -> Tuple[bool, str]:
+        trade = self.trades.get(trade_id)
+        if trade is None or trade.guild_id != guild_id:
+            return False, "Trade not found"
+        if trade.user_id != user_id:
+            return False, "You can only remove your own trades"
+        if not trade.active:
+            return False, "Trade is already closed"
+        self._close(trade, int(time.time()))
+        return True, "Trade removed successfully"
+
+    def clear_all_trades(self, guild_id: str) -> int:
+        now = int(time.time())
+        keys = list(self._keys.get(('created_ts', guild_id, None), []))
+        for _, trade_id in keys:
+            self._close(self.trades[trade_id], now)
+        return len(keys)
+
+    # Trade names
+    def set_trade_name(self, user_id: str, trade_name: str) -> bool:
+        self.trade_names[user_id] = trade_name
+        return True
+
+    def get_cached_trade_name(self, user_id: str) -> Tuple[bool, Optional[str]]:
+        self.trade_name_lookups += 1
+        return True, self.trade_names.get(user_id)
+
+    def load_trade_name(self, user_id: str) -> Optional[str]:
+        return self.trade_names.get(user_id)
+
+    def get_trade_name_cache_stats(self) -> dict:
+        # Every name is in memory, so every lookup is a hit
+        return {
+            'hits': self.trade_name_lookups,
+            'misses': 0,
+            'hit_rate': 1.0 if self.trade_name_lookups else 0.0,
+            'size': len(self.trade_names),
+            'capacity': None
+        }
+
+    # Market boards
+    def set_market_board(self, guild_id: str, channel_id: str, message_id: str):
+        self.boards[guild_id] = (channel_id, message_id)
+
+    def get_market_boards(self) -> List[Tuple]:
+        return [(guild_id, channel_id, message_id) for guild_id, (channel_id, message_id) in self.boards.items()]
+
+    def remove_market_board(self, guild_id: str) -> bool:
+        return self.boards.pop(guild_id, None) is not None
+
+    # Offers and completed trades
+    def create_offer(self, trade_id: int, buyer_id: str, buyer_username: str,
+                     offer_amount: str, message: Optional[str], guild_id: Optional[str] = None) -> Optional[int]:
+        trade = self.trades.get(trade_id)
+        if (trade is None or not trade.active or trade.trade_type != 'WTS'
+                or (guild_id is not None and trade.guild_id != guild_id) or trade_id in self._pending):
+            return None
+
+        now = datetime.now()
+        offer = _Offer(next(self._offer_ids), trade.guild_id, trade_id, buyer_id, buyer_username,
+                       offer_amount, message, now.isoformat(), int(now.timestamp()), parse_price(offer_amount))
+        self.offers[offer.id] = offer
+        self._pending[trade_id] = offer.id
+        self._trade_offers.setdefault(trade_id, set()).add(offer.id)
+        return offer.id
+
+    def get_offer(self, offer_id: int) -> Optional[Tuple]:
+        o = self.offers.get(offer_id)
+        trade = self.trades.get(o.trade_id) if o else None
+        if trade is None:
+            return None
+        return (o.id, o.trade_id, trade.user_id, o.buyer_id, o.buyer_username, o.offer_amount, o.status)
+
+    def _resolve(self, offer: _Offer, status: str):
+        resolved_ts = int(time.time())
+        self.offers[offer.id] = offer._replace(status=status, resolved_ts=resolved_ts)
+        del self._pending[offer.trade_id]
+        insort(self._resolved, (resolved_ts, offer.id))
+
+    def update_offer_status(self, offer_id: int, status: str) -> bool:
+        offer = self.offers.get(offer_id)
+        if offer is None or offer.status != 'pending':
+            return False
+        self._resolve(offer, status)
+        return True
+
+    def complete_trade(self, trade_id: int, buyer_id: str, buyer_username: str,
+                       final_price: str, completion_type: str,
+                       require_no_pending_offer: bool = False, guild_id: Optional[str] = None) -> bool:
+        trade = self.trades.get(trade_id)
+        if (trade is None or not trade.active
+                or (guild_id is not None and trade.guild_id != guild_id)
+                or (require_no_pending_offer and trade_id in self._pending)):
+            return False
+
+        now = datetime.now()
+        completed_ts = int(now.timestamp())
+        self._close(trade, completed_ts)
+
+        sale = _Completed(len(self.completed) + 1, trade.guild_id, trade.id,
+                          trade.user_id, trade.username, self.trade_names.get(trade.user_id, 'Unknown'),
+                          buyer_id, buyer_username, self.trade_names.get(buyer_id, 'Unknown'),
+                          trade.item_id, trade.item_name, trade.quantity,
+                          final_price, parse_price(final_price), completion_type, now.isoformat(), completed_ts)
+        self.completed.append(sale)
+        self._record_sale(sale)
+        return True
+
+    def accept_offer(self, offer_id: int) -> bool:
+        offer = self.offers.get(offer_id)
+        if offer is None or offer.status != 'pending':
+            return False
+        trade = self.trades.get(offer.trade_id)
+        if trade is None or not trade.active:
+            return False
+
+        self._resolve(offer, 'accepted')
+        return self.complete_trade(offer.trade_id, offer.buyer_id, offer.buyer_username,
+                                   offer.offer_amount, "offer_accepted")
+
+    def _record_sale(self, sale: _Completed):
+        """Fold a sale into its hourly and daily buckets (see database.rollups)"""
+        price, ts = sale.final_price_value, sale.completed_ts
+        if price is None:
+            return
+
+        key = rollup_key(sale.item_id, sale.item_name)
+        for period, width in PERIODS.items():
+            buckets = self.rollups.setdefault((sale.guild_id or '', key, period), {})
+            bucket = buckets.get(ts - ts % width)
+            if bucket is None:
+                buckets[ts - ts % width] = [1, sale.quantity or 1, price, price, price, ts, price, ts]
+                continue
+            bucket[0] += 1
+            bucket[1] += sale.quantity or 1
+            bucket[2] = min(bucket[2], price)
+            bucket[3] = max(bucket[3], price)
+            if ts < bucket[5]:
+                bucket[4], bucket[5] = price, ts
+            if ts >= bucket[7]:
+                bucket[6], bucket[7] = price, ts
+
+    def get_price_history(self, guild_id: str, item_id: Optional[int], item_name: str,
+                          period: str, since_ts: int) -> List[Tuple]:
+        if period not in PERIODS:
+            raise ValueError(f'Unknown period: {period}')
+
+        buckets = self.rollups.get((guild_id, rollup_key(item_id, item_name), period), {})
+        since = since_ts - since_ts % PERIODS[period]
+        return [(bucket_ts, b[0], b[1], b[2], b[3], b[4], b[6])
+                for bucket_ts, b in sorted(buckets.items()) if bucket_ts >= since]
+
+    # Archive
+    def archive_closed_trades(self, cutoff_ts: int, batch_size: int = 500) -> int:
+        moved = self._closed[:bisect_left(self._closed, (cutoff_ts,))][:batch_size]
+        del self._closed[:len(moved)]
+        for _, trade_id in moved:
+            self.trades_archive[trade_id] = self.trades.pop(trade_id)
+            for offer_id in self._trade_offers.pop(trade_id, ()):
+                offer = self.offers.pop(offer_id, None)
+                if offer is None:
+                    continue
+                self.offers_archive[offer_id] = offer
+                self._pending.pop(trade_id, None)
+                if offer.resolved_ts is not None:
+                    _remove_key(self._resolved, (offer.resolved_ts, offer_id))
+        return len(moved)
+
+    def archive_resolved_offers(self, cutoff_ts: int, batch_size: int = 500) -> int:
+        moved = self._resolved[:bisect_left(self._resolved, (cutoff_ts,))][:batch_size]
+        del self._resolved[:len(moved)]
+        for _, offer_id in moved:
+            offer = self.offers_archive[offer_id] = self.offers.pop(offer_id)
+            self._trade_offers.get(offer.trade_id, set()).discard(offer_id)
+        return len(moved)
+
+    def incremental_vacuum(self, max_pages: int = 1000) -> int:
+        return 0  # Nothing to give back
@@ -0,0 +1,323 @@
+"""
+Ordered schema migrations.
+
+Each step is (version, description, function). The function receives a cursor
+inside its own transaction; db_manager.migrate() applies every step newer than
+the version recorded in schema_version. Never edit a released step - add a new
+one instead.
+"""
+import os
+from datetime import datetime
+from typing import Optional
+
+from database.rollups import PERIODS, rollup_key
+from utils.catalog import get_catalog
+from utils.prices import parse_price
+
+def _iso_to_epoch(value: Optional[str]) -> Optional[int]:
+    """SQL helper: ISO-8601 text (naive local time) -> integer epoch seconds"""
+    if not value:
+        return None
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        return None
+
+def _001_epoch_timestamps_and_indexes(c):
+    """Integer epoch columns next to the ISO text, plus indexes for hot queries"""
+    c.connection.create_function('iso_to_epoch', 1, _iso_to_epoch, deterministic=True)
+
+    c.execute('ALTER TABLE trades ADD COLUMN created_ts INTEGER')
+    c.execute('ALTER TABLE offers ADD COLUMN created_ts INTEGER')
+    c.execute('ALTER TABLE completed_trades ADD COLUMN completed_ts INTEGER')
+
+    c.execute('UPDATE trades SET created_ts = iso_to_epoch(timestamp)')
+    c.execute('UPDATE offers SET created_ts = iso_to_epoch(timestamp)')
+    c.execute('UPDATE completed_trades SET completed_ts = iso_to_epoch(completed_at)')
+
+    # /market: active trades, optionally by type, newest first
+    c.execute('''CREATE INDEX idx_trades_active_ts
+                 ON trades (created_ts, id) WHERE active = 1''')
+    c.execute('''CREATE INDEX idx_trades_active_type_ts
+                 ON trades (trade_type, created_ts, id) WHERE active = 1''')
+
+    # /mylistings: a user's active trades, newest first
+    c.execute('''CREATE INDEX idx_trades_active_user_ts
+                 ON trades (user_id, created_ts, id) WHERE active = 1''')
+
+    # Pending offer lookup per trade
+    c.execute('''CREATE INDEX idx_offers_trade_status
+                 ON offers (trade_id, status)''')
+
+    # Trade history range scans
+    c.execute('''CREATE INDEX idx_completed_trades_ts
+                 ON completed_trades (completed_ts)''')
+
+def _002_trades_fts(c):
+    """FTS5 index over item names and notes of active trades, kept in sync by triggers"""
+    c.execute('''CREATE VIRTUAL TABLE trades_fts USING fts5
+                 (item_name, notes, content='trades', content_rowid='id', prefix='2 3')''')
+
+    # Only active trades are indexed, so the index tracks the live market
+    # rather than the whole listing history
+    c.execute('''CREATE TRIGGER trades_fts_insert AFTER INSERT ON trades
+                 WHEN new.active = 1 BEGIN
+                     INSERT INTO trades_fts (rowid, item_name, notes)
+                     VALUES (new.id, new.item_name, new.notes);
+                 END''')
+    c.execute('''CREATE TRIGGER trades_fts_delete AFTER DELETE ON trades
+                 WHEN old.active = 1 BEGIN
+                     INSERT INTO trades_fts (trades_fts, rowid, item_name, notes)
+                     VALUES ('delete', old.id, old.item_name, old.notes);
+                 END''')
+    c.execute('''CREATE TRIGGER trades_fts_update AFTER UPDATE OF active, item_name, notes ON trades
+                 BEGIN
+                     INSERT INTO trades_fts (trades_fts, rowid, item_name, notes)
+                     SELECT 'delete', old.id, old.item_name, old.notes WHERE old.active = 1;
+                     INSERT INTO trades_fts (rowid, item_name, notes)
+                     SELECT new.id, new.item_name, new.notes WHERE new.active = 1;
+                 END''')
+
+    c.execute('''INSERT INTO trades_fts (rowid, item_name, notes)
+                 SELECT id, item_name, notes FROM trades WHERE active = 1''')
+
+def _003_catalog_item_ids(c):
+    """Catalog item id next to the free-text item name"""
+    c.connection.create_function('resolve_item_id', 1, get_catalog().resolve, deterministic=True)
+
+    c.execute('ALTER TABLE trades ADD COLUMN item_id INTEGER')
+    c.execute('ALTER TABLE completed_trades ADD COLUMN item_id INTEGER')
+
+    c.execute('UPDATE trades SET item_id = resolve_item_id(item_name)')
+    c.execute('UPDATE completed_trades SET item_id = resolve_item_id(item_name)')
+
+    c.execute('''CREATE INDEX idx_trades_active_item
+                 ON trades (item_id, trade_type) WHERE active = 1 AND item_id IS NOT NULL''')
+    c.execute('''CREATE INDEX idx_completed_trades_item_ts
+                 ON completed_trades (item_id, completed_ts) WHERE item_id IS NOT NULL''')
+
+def _004_one_pending_offer_per_trade(c):
+    """Enforce at most one pending offer per trade"""
+    # Older duplicates slipped through the check-then-insert race; keep the
+    # first pending offer on each trade and decline the rest
+    c.execute('''UPDATE offers SET status = 'declined'
+                 WHERE status = 'pending'
+                   AND id NOT IN (SELECT MIN(id) FROM offers
+                                  WHERE status = 'pending' GROUP BY trade_id)''')
+    c.execute("""CREATE UNIQUE INDEX ux_offers_one_pending
+                 ON offers (trade_id) WHERE status = 'pending'""")
+
+def _005_market_boards(c):
+    """Channel messages the bot keeps updated with the live market"""
+    c.execute('''CREATE TABLE market_boards
+                 (guild_id TEXT PRIMARY KEY,
+                  channel_id TEXT NOT NULL,
+                  message_id TEXT NOT NULL,
+                  set_at TEXT NOT NULL)''')
+
+def _006_price_values(c):
+    """Integer base-unit prices next to the free-text prices"""
+    c.connection.create_function('parse_price', 1, parse_price, deterministic=True)
+
+    c.execute('ALTER TABLE trades ADD COLUMN price_value INTEGER')
+    c.execute('ALTER TABLE offers ADD COLUMN offer_value INTEGER')
+    c.execute('ALTER TABLE completed_trades ADD COLUMN final_price_value INTEGER')
+
+    c.execute('UPDATE trades SET price_value = parse_price(price)')
+    c.execute('UPDATE offers SET offer_value = parse_price(offer_amount)')
+    c.execute('UPDATE completed_trades SET final_price_value = parse_price(final_price)')
+
+    # Sort-by-price and price range filters on /market
+    c.execute('''CREATE INDEX idx_trades_active_price
+                 ON trades (price_value, id) WHERE active = 1 AND price_value IS NOT NULL''')
+    c.execute('''CREATE INDEX idx_trades_active_type_price
+                 ON trades (trade_type, price_value, id) WHERE active = 1 AND price_value IS NOT NULL''')
+
+def _007_price_rollups(c):
+    """Hourly and daily price buckets per item, backfilled from completed trades"""
+    c.execute('''CREATE TABLE price_rollups
+                 (item_key TEXT NOT NULL,
+                  period TEXT NOT NULL,
+                  bucket_ts INTEGER NOT NULL,
+                  item_name TEXT NOT NULL,
+                  trade_count INTEGER NOT NULL,
+                  volume INTEGER NOT NULL,
+                  min_price INTEGER NOT NULL,
+                  max_price INTEGER NOT NULL,
+                  first_price INTEGER NOT NULL,
+                  first_ts INTEGER NOT NULL,
+                  last_price INTEGER NOT NULL,
+                  last_ts INTEGER NOT NULL,
+                  PRIMARY KEY (item_key, period, bucket_ts)) WITHOUT ROWID''')
+
+    rows = c.execute('''SELECT item_id, item_name, quantity, final_price_value, completed_ts
+                          FROM completed_trades
+                          WHERE final_price_value IS NOT NULL AND completed_ts IS NOT NULL
+                          ORDER BY completed_ts, id''').fetchall()
+
+    # The rollup UPSERT as of this step (database.rollups has since moved on)
+    for item_id, item_name, quantity, price_value, ts in rows:
+        for period, width in PERIODS.items():
+            c.execute('''INSERT INTO price_rollups
+                         (item_key, period, bucket_ts, item_name, trade_count, volume,
+                          min_price, max_price, first_price, first_ts, last_price, last_ts)
+                         VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+                         ON CONFLICT (item_key, period, bucket_ts) DO UPDATE SET
+                             trade_count = trade_count + 1,
+                             volume = volume + excluded.volume,
+                             min_price = MIN(min_price, excluded.min_price),
+                             max_price = MAX(max_price, excluded.max_price),
+                             last_price = excluded.last_price,
+                             last_ts = excluded.last_ts''',
+                      (rollup_key(item_id, item_name), period, ts - ts % width, item_name, quantity or 1,
+                       price_value, price_value, price_value, ts, price_value, ts))
+
+def _create_archive(c, table: str):
+    """Create <table>_archive with the same columns, in the same order, as table"""
+    columns = []
+    for _, name, col_type, notnull, default, pk in c.execute(f'PRAGMA table_info({table})').fetchall():
+        if pk:
+            columns.append(f'{name} INTEGER PRIMARY KEY')
+            continue
+        column = f'{name} {col_type}'
+        if notnull:
+            column += ' NOT NULL'
+        if default is not None:
+            column += f' DEFAULT {default}'
+        columns.append(column)
+    c.execute(f'CREATE TABLE {table}_archive ({", ".join(columns)})')
+
+def _008_archive_tables(c):
+    """Close/resolve times plus archive tables for compacted history.
+    
+    Archive tables mirror the live column order (rows move with SELECT *),
+    so later steps that add a column to trades or offers must add it to
+    the archive too.
+    """
+    c.execute('ALTER TABLE trades ADD COLUMN closed_ts INTEGER')
+    c.execute('ALTER TABLE offers ADD COLUMN resolved_ts INTEGER')
+
+    # Best guess for rows closed before these columns existed
+    c.execute('''UPDATE trades SET closed_ts = COALESCE(
+                     (SELECT MAX(completed_ts) FROM completed_trades WHERE original_trade_id = trades.id),
+                     created_ts)
+                 WHERE active = 0''')
+    c.execute("UPDATE offers SET resolved_ts = created_ts WHERE status != 'pending'")
+
+    _create_archive(c, 'trades')
+    _create_archive(c, 'offers')
+
+    # Compaction scans oldest closed rows first
+    c.execute('''CREATE INDEX idx_trades_closed_ts
+                 ON trades (closed_ts) WHERE active = 0''')
+    c.execute("""CREATE INDEX idx_offers_resolved_ts
+                 ON offers (resolved_ts) WHERE status != 'pending'""")
+
+def _009_guild_scoping(c):
+    """Per-guild markets: guild_id on every table, with guild-leading indexes.
+    
+    Rows from before guilds were tracked are assigned to LEGACY_GUILD_ID
+    (the server the bot used to run in) when it is set; otherwise they
+    stay unscoped and no guild's market shows them.
+    """
+    legacy_guild = os.getenv('LEGACY_GUILD_ID') or None
+
+    for table in ('trades', 'trades_archive', 'offers', 'offers_archive', 'completed_trades'):
+        c.execute(f'ALTER TABLE {table} ADD COLUMN guild_id TEXT')
+        c.execute(f'UPDATE {table} SET guild_id = ?', (legacy_guild,))
+
+    # Guild-leading replacements for the global active-trade indexes
+    for index in ('idx_trades_active_ts', 'idx_trades_active_type_ts', 'idx_trades_active_user_ts',
+                  'idx_trades_active_item', 'idx_trades_active_price', 'idx_trades_active_type_price',
+                  'idx_completed_trades_ts', 'idx_completed_trades_item_ts'):
+        c.execute(f'DROP INDEX {index}')
+
+    c.execute('''CREATE INDEX idx_trades_guild_active_ts
+                 ON trades (guild_id, created_ts, id) WHERE active = 1''')
+    c.execute('''CREATE INDEX idx_trades_guild_active_type_ts
+                 ON trades (guild_id, trade_type, created_ts, id) WHERE active = 1''')
+    c.execute('''CREATE INDEX idx_trades_guild_active_user_ts
+                 ON trades (guild_id, user_id, created_ts, id) WHERE active = 1''')
+    c.execute('''CREATE INDEX idx_trades_guild_active_item
+                 ON trades (guild_id, item_id, trade_type) WHERE active = 1 AND item_id IS NOT NULL''')
+    c.execute('''CREATE INDEX idx_trades_guild_active_price
+                 ON trades (guild_id, price_value, id) WHERE active = 1 AND price_value IS NOT NULL''')
+    c.execute('''CREATE INDEX idx_trades_guild_active_type_price
+                 ON trades (guild_id, trade_type, price_value, id) WHERE active = 1 AND price_value IS NOT NULL''')
+    c.execute('''CREATE INDEX idx_offers_guild_buyer
+                 ON offers (guild_id, buyer_id, status)''')
+    c.execute('''CREATE INDEX idx_completed_trades_guild_ts
+                 ON completed_trades (guild_id, completed_ts)''')
+    c.execute('''CREATE INDEX idx_completed_trades_guild_item_ts
+                 ON completed_trades (guild_id, item_id, completed_ts) WHERE item_id IS NOT NULL''')
+
+    # Rebuild the search index with the guild as a column, so a search
+    # intersects with that guild's postings instead of filtering every match
+    for trigger in ('trades_fts_insert', 'trades_fts_delete', 'trades_fts_update'):
+        c.execute(f'DROP TRIGGER {trigger}')
+    c.execute('DROP TABLE trades_fts')
+    c.execute('''CREATE VIRTUAL TABLE trades_fts USING fts5
+                 (item_name, notes, guild_id, content='trades', content_rowid='id', prefix='2 3')''')
+    c.execute('''CREATE TRIGGER trades_fts_insert AFTER INSERT ON trades
+                 WHEN new.active = 1 BEGIN
+                     INSERT INTO trades_fts (rowid, item_name, notes, guild_id)
+                     VALUES (new.id, new.item_name, new.notes, new.guild_id);
+                 END''')
+    c.execute('''CREATE TRIGGER trades_fts_delete AFTER DELETE ON trades
+                 WHEN old.active = 1 BEGIN
+                     INSERT INTO trades_fts (trades_fts, rowid, item_name, notes, guild_id)
+                     VALUES ('delete', old.id, old.item_name, old.notes, old.guild_id);
+                 END''')
+    c.execute('''CREATE TRIGGER trades_fts_update AFTER UPDATE OF active, item_name, notes, guild_id ON trades
+                 BEGIN
+                     INSERT INTO trades_fts (trades_fts, rowid, item_name, notes, guild_id)
+                     SELECT 'delete', old.id, old.item_name, old.notes, old.guild_id WHERE old.active = 1;
+                     INSERT INTO trades_fts (rowid, item_name, notes, guild_id)
+                     SELECT new.id, new.item_name, new.notes, new.guild_id WHERE new.active = 1;
+                 END''')
+    c.execute('''INSERT INTO trades_fts (rowid, item_name, notes, guild_id)
+                 SELECT id, item_name, notes, guild_id FROM trades WHERE active = 1''')
+
+    # Price history per guild ('' for unscoped rows, since key columns can't be NULL)
+    c.execute('ALTER TABLE price_rollups RENAME TO price_rollups_old')
+    c.execute('''CREATE TABLE price_rollups
+                 (guild_id TEXT NOT NULL,
+                  item_key TEXT NOT NULL,
+                  period TEXT NOT NULL,
+                  bucket_ts INTEGER NOT NULL,
+                  item_name TEXT NOT NULL,
+                  trade_count INTEGER NOT NULL,
+                  volume INTEGER NOT NULL,
+                  min_price INTEGER NOT NULL,
+                  max_price INTEGER NOT NULL,
+                  first_price INTEGER NOT NULL,
+                  first_ts INTEGER NOT NULL,
+                  last_price INTEGER NOT NULL,
+                  last_ts INTEGER NOT NULL,
+                  PRIMARY KEY (guild_id, item_key, period, bucket_ts)) WITHOUT ROWID''')
+    c.execute('''INSERT INTO price_rollups
+                 SELECT ?, item_key, period, bucket_ts, item_name, trade_count, volume,
+                        min_price, max_price, first_price, first_ts, last_price, last_ts
+                 FROM price_rollups_old''',
+              (legacy_guild or '',))
+    c.execute('DROP TABLE price_rollups_old')
+
+def _010_currency_name_prices(c):
+    """Re-read prices the parser couldn't before it knew currency names ("500 gold")"""
+    c.connection.create_function('parse_price', 1, parse_price, deterministic=True)
+    c.execute('UPDATE trades SET price_value = parse_price(price) WHERE price_value IS NULL AND price IS NOT NULL')
+    c.execute('''UPDATE offers SET offer_value = parse_price(offer_amount)
+                 WHERE offer_value IS NULL AND offer_amount IS NOT NULL''')
+
+MIGRATIONS = [
+    (1, 'epoch timestamps and indexes', _001_epoch_timestamps_and_indexes),
+    (2, 'full-text search over active trades', _002_trades_fts),
+    (3, 'catalog item ids', _003_catalog_item_ids),
+    (4, 'one pending offer per trade', _004_one_pending_offer_per_trade),
+    (5, 'market boards', _005_market_boards),
+    (6, 'numeric prices', _006_price_values),
+    (7, 'price history rollups', _007_price_rollups),
+    (8, 'archive tables', _008_archive_tables),
+    (9, 'per-guild markets', _009_guild_scoping),
+    (10, 'currency names in prices', _010_currency_name_prices),
+]
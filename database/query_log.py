@@ -0,0 +1,233 @@
+"""
+Statement timing and the slow-query log.
+
+Connections from db_manager.get_connection() use TimedConnection, whose
+cursors time every statement from execute() until its rows have been
+fetched. Totals are kept per statement (SQL with whitespace and placeholder
+lists normalized), and anything slower than SLOW_QUERY_MS is logged with
+the shape of its parameters, its row count and its EXPLAIN QUERY PLAN, with
+full table scans and temporary sort b-trees flagged.
+
+Plans are captured on the slow path only: each time a statement is slow
+its plan is read again, replacing the one kept from before (so a new index
+shows up), and statements that are never slow are never explained.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+# Statements slower than this (milliseconds) go to the slow-query log,
+# unless SLOW_QUERY_MS says otherwise
+DEFAULT_SLOW_QUERY_MS = 100.0
+
+# Slow statements kept for /slowqueries
+RECENT_SLOW = 50
+
+# Statement kinds EXPLAIN QUERY PLAN is run for
+_PLANNED = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+def slow_query_ms() -> float:
+    """The SLOW_QUERY_MS threshold, read when used (so a .env loaded after
+    import still applies)"""
+    try:
+        return float(os.getenv('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS))
+    except ValueError:
+        return DEFAULT_SLOW_QUERY_MS
+
+class StatementStats:
+    """Running totals for one normalized statement"""
+    __slots__ = ('calls', 'total', 'max', 'rows', 'slow')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+
+class SlowQuery(NamedTuple):
+    ts: float
+    seconds: float
+    sql: str
+    params: str
+    rows: int
+    plan: Tuple[str, ...]
+
+@lru_cache(maxsize=1024)
+def normalize(sql: str) -> str:
+    """One line of SQL with placeholder lists collapsed, e.g. 'id IN (?, ?, ?)' -> 'id IN (?...)'"""
+    sql = ' '.join(sql.split())
+    return re.sub(r'\?(?:\s*,\s*\?)+', '?...', sql)
+
+def params_shape(params) -> str:
+    """Parameter types without their values, e.g. '(str, int, None)'"""
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in params.items()) + '}'
+    names = [type(value).__name__ if value is not None else 'None' for value in params or ()]
+    if len(names) > 8:
+        names = names[:8] + [f'... {len(names)} total']
+    return '(' + ', '.join(names) + ')'
+
+def plan_warnings(plan: Tuple[str, ...]) -> List[str]:
+    """Plan steps that read a whole table or sort in a temporary b-tree"""
+    return [step for step in plan
+            if (step.startswith('SCAN ') and 'VIRTUAL TABLE' not in step) or 'TEMP B-TREE' in step]
+
+class QueryLog:
+    """Per-statement stats, captured plans and the recent slow statements"""
+
+    def __init__(self, threshold_ms: Optional[float] = None):
+        self.threshold_ms = threshold_ms  # None: slow_query_ms()
+        self.stats: Dict[str, StatementStats] = {}
+        self.plans: Dict[str, Tuple[str, ...]] = {}
+        self.recent: Deque[SlowQuery] = deque(maxlen=RECENT_SLOW)
+        self._lock = threading.Lock()
+
+    @property
+    def threshold(self) -> float:
+        """Slow-query threshold in seconds"""
+        return (self.threshold_ms if self.threshold_ms is not None else slow_query_ms()) / 1000
+
+    @staticmethod
+    def explain(conn: sqlite3.Connection, sql: str, params) -> Optional[Tuple[str, ...]]:
+        """EXPLAIN QUERY PLAN a statement (None for statements without a plan, like COMMIT)"""
+        if not normalize(sql).lstrip('( ').upper().startswith(_PLANNED):
+            return None
+
+        cursor = sqlite3.Cursor(conn)  # Untimed
+        try:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return tuple(row[3] for row in cursor.fetchall())
+        except sqlite3.Error as e:
+            return (f'(no plan: {e})',)
+        finally:
+            cursor.close()
+
+    def record(self, sql: str, params, seconds: float, rows: int,
+               conn: Optional[sqlite3.Connection] = None):
+        """Add one run of a statement; a slow one is logged, and explained on conn"""
+        key = normalize(sql)
+        slow = seconds >= self.threshold
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = StatementStats()
+            stats.calls += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            stats.rows += rows
+            if not slow:
+                return
+            stats.slow += 1
+
+        plan = self.explain(conn, sql, params) if conn is not None else None
+        with self._lock:
+            if plan is not None:
+                self.plans[key] = plan  # Replaces a plan from before a schema change
+            else:
+                plan = self.plans.get(key, ())
+            self.recent.append(SlowQuery(time.time(), seconds, key, params_shape(params), rows, plan))
+
+        print(f'[SLOW] {seconds * 1000:.1f}ms, {rows} row(s), params {params_shape(params)}: {key}', flush=True)
+        warnings = plan_warnings(plan)
+        for step in plan:
+            print(f'  {"!! " if step in warnings else ""}{step}', flush=True)
+
+    def top(self, limit: int = 10) -> List[Tuple[str, StatementStats, Tuple[str, ...]]]:
+        """Statements with the most total time: (sql, stats, plan)"""
+        with self._lock:
+            ranked = sorted(self.stats.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+            return [(sql, stats, self.plans.get(sql, ())) for sql, stats in ranked]
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self.recent.clear()
+
+# Shared by every connection
+query_log = QueryLog()
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement to query_log once its rows are read"""
+
+    _pending: Optional[list] = None  # [sql, params, seconds so far, rows so far]
+
+    def execute(self, sql: str, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._pending = [sql, parameters, time.perf_counter() - start, 0]
+        if self.description is None:
+            # No result rows to wait for
+            self._pending[3] = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql: str, seq_of_parameters):
+        self._finish()
+        seq_of_parameters = list(seq_of_parameters)
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        query_log.record(sql, seq_of_parameters[0] if seq_of_parameters else (),
+                         time.perf_counter() - start, max(self.rowcount, 0), self.connection)
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, 0 if row is None else 1, done=row is None)
+        return row
+
+    def fetchmany(self, size: Optional[int] = None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(start, len(rows), done=len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows), done=True)
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Single-row reads usually stop after one fetchone()
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+    def _fetched(self, start: float, rows: int, done: bool):
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - start
+            self._pending[3] += rows
+            if done:
+                self._finish()
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            query_log.record(*pending, self.connection)
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors, including the ones behind execute() (so
+    BEGIN/COMMIT are timed too), are TimedCursors"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
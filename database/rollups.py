@@ -0,0 +1,47 @@
+"""
+Per-item price history rollups.
+
+Every completed trade with a numeric price is folded into one hourly and one
+daily bucket of price_rollups (count, min, max, first, last, volume) for its
+guild by a single UPSERT per bucket, so reading an item's history costs one
+row per bucket no matter how many trades it covers.
+"""
+from typing import Dict, Optional
+
+from utils.parsers import normalize_item_name
+
+# Bucket widths in seconds (buckets are aligned to UTC)
+PERIODS: Dict[str, int] = {
+    'hour': 3600,
+    'day': 86400
+}
+
+def rollup_key(item_id: Optional[int], item_name: str) -> str:
+    """Rollup key: '#<catalog id>' when known, the normalized name otherwise"""
+    return f'#{item_id}' if item_id is not None else normalize_item_name(item_name)
+
+def record_sale(c, guild_id: Optional[str], item_id: Optional[int], item_name: str,
+                quantity: int, price_value: Optional[int], ts: int):
+    """Fold one completed trade into its guild's hourly and daily buckets"""
+    if price_value is None:
+        return
+
+    key = rollup_key(item_id, item_name)
+    for period, width in PERIODS.items():
+        c.execute('''INSERT INTO price_rollups
+                     (guild_id, item_key, period, bucket_ts, item_name, trade_count, volume,
+                      min_price, max_price, first_price, first_ts, last_price, last_ts)
+                     VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+                     ON CONFLICT (guild_id, item_key, period, bucket_ts) DO UPDATE SET
+                         trade_count = trade_count + 1,
+                         volume = volume + excluded.volume,
+                         min_price = MIN(min_price, excluded.min_price),
+                         max_price = MAX(max_price, excluded.max_price),
+                         first_price = CASE WHEN excluded.first_ts < first_ts
+                                            THEN excluded.first_price ELSE first_price END,
+                         first_ts = MIN(first_ts, excluded.first_ts),
+                         last_price = CASE WHEN excluded.last_ts >= last_ts
+                                           THEN excluded.last_price ELSE last_price END,
+                         last_ts = MAX(last_ts, excluded.last_ts)''',
+                  (guild_id or '', key, period, ts - ts % width, item_name, quantity or 1,
+                   price_value, price_value, price_value, ts, price_value, ts))
@@ -0,0 +1,158 @@
+"""
+Storage backends.
+
+`Storage` is the repository interface the bot talks to through
+database.async_db: trades, offers, trade names, completed trades (price
+history), market boards and archiving. `SQLiteStorage` is the production
+backend (database.db_manager); `MemoryStorage` (database.memory_storage)
+keeps everything in process memory for benchmarks and tests, and is the
+reference for the behaviour any other backend must match.
+
+The backend is chosen by the STORAGE_BACKEND environment variable
+('sqlite' or 'memory') and the SQLite file by DB_PATH.
+"""
+import os
+from typing import List, Optional, Protocol, Tuple
+
+from database import db_manager
+from database.memory_storage import MemoryStorage
+
+class Storage(Protocol):
+    """Everything the cogs need from a storage backend.
+
+    Methods block and return plain tuples in the column orders documented
+    in database.db_manager. Search relevance must rank item name hits above
+    notes hits; the scores themselves (and so the order among similar
+    matches) are up to the backend. `threaded` says whether calls may block on I/O
+    (async_db then runs them on worker threads) or are cheap enough to run
+    on the event loop.
+    """
+
+    threaded: bool
+
+    def init(self) -> int:
+        """Create or migrate storage; returns the number of trade names preloaded"""
+
+    # Trades
+    def add_trade(self, guild_id: str, user_id: str, username: str, trade_type: str, item_name: str,
+                  quantity: int, price: Optional[str], notes: Optional[str],
+                  item_id: Optional[int] = None) -> int: ...
+    def add_trades(self, guild_id: str, user_id: str, username: str, trade_type: str,
+                   listings: List[Tuple[str, int, Optional[str], Optional[str], Optional[int]]]) -> List[int]: ...
+    def get_active_item_names(self) -> List[Tuple[str, int]]: ...
+    def get_trade_by_id(self, trade_id: int, guild_id: Optional[str] = None) -> Optional[Tuple]: ...
+    def get_trade_guild(self, trade_id: int) -> Optional[str]: ...
+    def get_active_orders(self) -> List[Tuple]: ...
+    def get_active_order(self, trade_id: int) -> Optional[Tuple]: ...
+    def get_orders(self, trade_ids: List[int]) -> List[Tuple]: ...
+    def get_trades_page(self, guild_id: str, trade_type: Optional[str] = None, cursor: Optional[Tuple] = None,
+                        forward: bool = True, limit: int = 10, sort: str = 'newest',
+                        min_value: Optional[int] = None,
+                        max_value: Optional[int] = None) -> Tuple[List[Tuple], bool]: ...
+    def get_user_trades_page(self, guild_id: str, user_id: str, cursor: Optional[Tuple] = None,
+                             forward: bool = True, limit: int = 10) -> Tuple[List[Tuple], bool]: ...
+    def search_trades_page(self, guild_id: str, query: str, cursor: Optional[Tuple] = None,
+                           forward: bool = True, limit: int = 10, sort: str = 'relevance',
+                           min_value: Optional[int] = None,
+                           max_value: Optional[int] = None) -> Tuple[List[Tuple], bool]: ...
+    def count_active_trades(self, guild_id: str, trade_type: Optional[str] = None, sort: str = 'newest',
+                            min_value: Optional[int] = None, max_value: Optional[int] = None) -> int: ...
+    def count_user_trades(self, guild_id: str, user_id: str) -> int: ...
+    def count_search_results(self, guild_id: str, query: str, sort: str = 'relevance',
+                             min_value: Optional[int] = None, max_value: Optional[int] = None) -> int: ...
+    def remove_trade(self, trade_id: int, user_id: str, guild_id: str) -> Tuple[bool, str]: ...
+    def clear_all_trades(self, guild_id: str) -> int: ...
+
+    # Trade names
+    def set_trade_name(self, user_id: str, trade_name: str) -> bool: ...
+    def get_cached_trade_name(self, user_id: str) -> Tuple[bool, Optional[str]]: ...
+    def load_trade_name(self, user_id: str) -> Optional[str]: ...
+    def get_trade_name_cache_stats(self) -> dict:
+        """hits, misses, hit_rate, size and capacity of the trade name cache"""
+
+    # Market boards
+    def set_market_board(self, guild_id: str, channel_id: str, message_id: str): ...
+    def get_market_boards(self) -> List[Tuple]: ...
+    def remove_market_board(self, guild_id: str) -> bool: ...
+
+    # Offers and completed trades
+    def create_offer(self, trade_id: int, buyer_id: str, buyer_username: str,
+                     offer_amount: str, message: Optional[str], guild_id: Optional[str] = None) -> Optional[int]: ...
+    def get_offer(self, offer_id: int) -> Optional[Tuple]: ...
+    def update_offer_status(self, offer_id: int, status: str) -> bool: ...
+    def complete_trade(self, trade_id: int, buyer_id: str, buyer_username: str,
+                       final_price: str, completion_type: str,
+                       require_no_pending_offer: bool = False, guild_id: Optional[str] = None) -> bool: ...
+    def accept_offer(self, offer_id: int) -> bool: ...
+    def get_price_history(self, guild_id: str, item_id: Optional[int], item_name: str,
+                          period: str, since_ts: int) -> List[Tuple]: ...
+
+    # Archive
+    def archive_closed_trades(self, cutoff_ts: int, batch_size: int = 500) -> int: ...
+    def archive_resolved_offers(self, cutoff_ts: int, batch_size: int = 500) -> int: ...
+    def incremental_vacuum(self, max_pages: int = 1000) -> int: ...
+
+class SQLiteStorage:
+    """The SQLite database in database.db_manager"""
+
+    threaded = True
+
+    def __init__(self, path: Optional[str] = None):
+        # db_manager keeps one database per process
+        if path:
+            db_manager.DB_PATH = path
+
+    def init(self) -> int:
+        db_manager.init_database()
+        return db_manager.preload_trade_names()
+
+    # Trades
+    add_trade = staticmethod(db_manager.add_trade)
+    add_trades = staticmethod(db_manager.add_trades)
+    get_active_item_names = staticmethod(db_manager.get_active_item_names)
+    get_trade_by_id = staticmethod(db_manager.get_trade_by_id)
+    get_trade_guild = staticmethod(db_manager.get_trade_guild)
+    get_active_orders = staticmethod(db_manager.get_active_orders)
+    get_active_order = staticmethod(db_manager.get_active_order)
+    get_orders = staticmethod(db_manager.get_orders)
+    get_trades_page = staticmethod(db_manager.get_trades_page)
+    get_user_trades_page = staticmethod(db_manager.get_user_trades_page)
+    search_trades_page = staticmethod(db_manager.search_trades_page)
+    count_active_trades = staticmethod(db_manager.count_active_trades)
+    count_user_trades = staticmethod(db_manager.count_user_trades)
+    count_search_results = staticmethod(db_manager.count_search_results)
+    remove_trade = staticmethod(db_manager.remove_trade)
+    clear_all_trades = staticmethod(db_manager.clear_all_trades)
+
+    # Trade names
+    set_trade_name = staticmethod(db_manager.set_trade_name)
+    get_cached_trade_name = staticmethod(db_manager.get_cached_trade_name)
+    load_trade_name = staticmethod(db_manager.load_trade_name)
+    get_trade_name_cache_stats = staticmethod(db_manager.get_trade_name_cache_stats)
+
+    # Market boards
+    set_market_board = staticmethod(db_manager.set_market_board)
+    get_market_boards = staticmethod(db_manager.get_market_boards)
+    remove_market_board = staticmethod(db_manager.remove_market_board)
+
+    # Offers and completed trades
+    create_offer = staticmethod(db_manager.create_offer)
+    get_offer = staticmethod(db_manager.get_offer)
+    update_offer_status = staticmethod(db_manager.update_offer_status)
+    complete_trade = staticmethod(db_manager.complete_trade)
+    accept_offer = staticmethod(db_manager.accept_offer)
+    get_price_history = staticmethod(db_manager.get_price_history)
+
+    # Archive
+    archive_closed_trades = staticmethod(db_manager.archive_closed_trades)
+    archive_resolved_offers = staticmethod(db_manager.archive_resolved_offers)
+    incremental_vacuum = staticmethod(db_manager.incremental_vacuum)
+
+def create_storage(backend: Optional[str] = None) -> Storage:
+    """Build the configured backend (STORAGE_BACKEND, default 'sqlite')"""
+    backend = (backend or os.getenv('STORAGE_BACKEND') or 'sqlite').lower()
+    if backend == 'sqlite':
+        return SQLiteStorage(os.getenv('DB_PATH'))
+    if backend == 'memory':
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend '{backend}' (expected 'sqlite' or 'memory')")
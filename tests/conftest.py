@@ -0,0 +1,22 @@
+import pytest
+
+from database import db_manager
+from database.memory_storage import MemoryStorage
+from database.storage import SQLiteStorage
+
+@pytest.fixture
+def sqlite_storage(tmp_path, monkeypatch):
+    """An initialized SQLite database in a temp file"""
+    monkeypatch.setattr(db_manager, 'DB_PATH', db_manager.DB_PATH)  # Restored afterwards
+    storage = SQLiteStorage(str(tmp_path / 'trades.db'))
+    storage.init()
+    return storage
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request):
+    """A fresh, initialized storage backend: MemoryStorage or a temp-file SQLite database"""
+    if request.param == 'sqlite':
+        return request.getfixturevalue('sqlite_storage')
+    storage = MemoryStorage()
+    storage.init()
+    return storage
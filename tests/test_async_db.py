@@ -0,0 +1,46 @@
+import pytest
+
+from database import async_db, db_manager
+
+def add(n):
+    return db_manager.add_trade('1', 'u1', 'user1', 'WTS', f'item {n}', 1, '10g', None)
+
+def add_then_fail():
+    add('failed')
+    raise ValueError('job failed')
+
+def active_items():
+    with db_manager.transaction() as c:
+        c.execute('SELECT item_name FROM trades WHERE active = 1 ORDER BY id')
+        return [row[0] for row in c.fetchall()]
+
+def test_failing_job_rolls_back_only_itself(sqlite_storage, monkeypatch):
+    batches = []
+    commit_batch = async_db._WriterThread._commit_batch
+    def recording_commit(self, batch):
+        batches.append(len(batch))
+        commit_batch(self, batch)
+    monkeypatch.setattr(async_db._WriterThread, '_commit_batch', recording_commit)
+
+    # Queue every job before the writer starts, so they share one batch
+    writer = async_db._WriterThread()
+    first = writer.submit(add, (1,), {})
+    failing = writer.submit(add_then_fail, (), {})
+    last = writer.submit(add, (2,), {})
+    writer.start()
+    writer.stop()
+
+    assert batches == [3]
+    assert isinstance(first.result(), int) and isinstance(last.result(), int)
+    with pytest.raises(ValueError):
+        failing.result()
+    assert active_items() == ['item 1', 'item 2']
+
+def test_close_flushes_queued_writes(sqlite_storage):
+    async_db.start(sqlite_storage)
+    try:
+        futures = [async_db._writer.submit(add, (n,), {}) for n in range(200)]
+    finally:
+        async_db.close()
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert len(active_items()) == 200
@@ -0,0 +1,68 @@
+import io
+
+import pytest
+
+from database import backup, db_manager
+from database.backup import export_table, import_table, read_chunks
+from database.db_manager import BACKUP_TABLES
+from database.storage import SQLiteStorage
+
+def fill(storage):
+    storage.set_trade_name('seller', 'Seller "S", Esq.')
+    for n in range(12):
+        trade_id = storage.add_trade('1', 'seller', 'Seller', 'WTS', f'Iron Ore {n}', n + 1, f'{n + 1}g',
+                                     'line one\nline two, with comma' if n % 3 == 0 else None)
+        if n % 2:
+            offer_id = storage.create_offer(trade_id, 'buyer', 'Buyer', f'{n}g', None)
+            if n % 4 == 1:
+                storage.accept_offer(offer_id)
+    storage.add_trade('2', 'other', 'Other', 'WTB', 'ünïcødé ✨', 1, None, None)
+
+def dump(table):
+    return [row for rows in db_manager.export_rows(table) for row in rows]
+
+@pytest.mark.parametrize('fmt', ['jsonl', 'csv'])
+@pytest.mark.parametrize('compress', [False, True])
+def test_round_trip(sqlite_storage, tmp_path, monkeypatch, fmt, compress):
+    monkeypatch.setattr(backup, 'CHUNK_SIZE', 5)  # Several chunks per table
+    fill(sqlite_storage)
+    files, before = {}, {}
+    for table in BACKUP_TABLES:
+        files[table] = io.BytesIO()
+        assert export_table(table, files[table], fmt, compress) == len(dump(table))
+        before[table] = dump(table)
+    history = sqlite_storage.get_price_history('1', None, 'Iron Ore 1', 'day', 0)
+    assert history
+
+    SQLiteStorage(str(tmp_path / 'restored.db')).init()
+    for table, f in files.items():
+        f.seek(0)
+        assert import_table(table, f, fmt, compress) == (len(before[table]), len(before[table]))
+    for table in BACKUP_TABLES:
+        assert dump(table) == before[table], table
+    # Imported sales are folded into the price history
+    assert sqlite_storage.get_price_history('1', None, 'Iron Ore 1', 'day', 0) == history
+
+    # Importing again skips every row
+    for table, f in files.items():
+        f.seek(0)
+        assert import_table(table, f, fmt, compress) == (len(before[table]), 0)
+
+def test_guild_export(sqlite_storage):
+    fill(sqlite_storage)
+    out = io.BytesIO()
+    assert export_table('trades', out, 'jsonl', guild_id='2') == 1
+    out.seek(0)
+    (columns, rows), = read_chunks(out, 'jsonl')
+    assert dict(zip(columns, rows[0]))['item_name'] == 'ünïcødé ✨'
+
+def test_export_overwrites_partial_file(sqlite_storage):
+    fill(sqlite_storage)
+    out = io.BytesIO(b'partial export from a failed attempt')
+    out.seek(0, io.SEEK_END)
+    export_table('trade_names', out, 'csv')
+    assert out.getvalue().startswith(b'user_id,')
+
+def test_unknown_columns_rejected(sqlite_storage):
+    with pytest.raises(ValueError):
+        import_table('trades', io.BytesIO(b'{"id": 1, "bogus": 2}\n'), 'jsonl')
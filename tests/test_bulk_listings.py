@@ -0,0 +1,75 @@
+import asyncio
+
+from benchmarks.fakes import FakeBot, FakeInteraction, FakeUser
+from cogs.trading import MAX_BULK_LISTINGS, Trading
+from database import async_db
+from database.memory_storage import MemoryStorage
+from utils import ratelimit
+from utils.parsers import parse_bulk_listings
+from utils.ratelimit import COMMAND_LIMIT, USER_LIMIT, TokenBuckets
+
+def test_pipe_format():
+    listings, rejected = parse_bulk_listings(
+        "2x rare sword | 500g\n | 1k\n\n# comment\nshield | 1mg | mint\na | b | c | d\n0x bow")
+    assert listings == [(1, 'rare sword', 2, '500g', None), (5, 'shield', 1, '1mg', 'mint')]
+    assert [(number, line) for number, line, _ in rejected] == [(2, ' | 1k'), (6, 'a | b | c | d'), (7, '0x bow')]
+
+def test_csv_format():
+    listings, rejected = parse_bulk_listings('item,price,notes\n"sword, big",5g,\nbow\nx,1,2,3', csv_format=True)
+    assert listings == [(2, 'sword, big', 1, '5g', None), (3, 'bow', 1, None, None)]
+    assert [(number, line) for number, line, _ in rejected] == [(4, 'x,1,2,3')]
+
+def test_csv_pipes_in_fields():
+    listings, _ = parse_bulk_listings('a|b sword,5g', csv_format=True)
+    assert listings == [(1, 'a/b sword', 1, '5g', None)]
+
+def test_post_bulk_reports_lines_over_limit():
+    async def main():
+        async_db.start(MemoryStorage())
+        try:
+            bot = FakeBot()
+            cog = Trading(bot)
+            await bot.add_cog(cog)
+            interaction = FakeInteraction(bot, FakeUser(1, 'alice'), 1)
+            text = '\n'.join(f'item {n} | {n}g | note {n}' for n in range(MAX_BULK_LISTINGS + 2)) + '\n | 5g'
+            await cog.post_bulk(interaction, 'WTS', text)
+            events = bot.take_events()
+            await bot.drain()
+            return interaction.sent[-1][1]['embed'], events
+        finally:
+            async_db.close()
+
+    embed, events = asyncio.run(main())
+    assert embed.title.startswith(f'✅ {MAX_BULK_LISTINGS} ')
+    rejected = next(field.value for field in embed.fields if field.name.startswith('⚠️'))
+    assert f'Line {MAX_BULK_LISTINGS + 1}: over the limit' in rejected
+    assert f'(`item {MAX_BULK_LISTINGS} | {MAX_BULK_LISTINGS}g | note {MAX_BULK_LISTINGS}`)' in rejected
+    assert f'Line {MAX_BULK_LISTINGS + 3}: no item name' in rejected
+    # One event for the whole batch
+    assert [(event, len(args[1])) for event, args in events] == [('trades_added', MAX_BULK_LISTINGS)]
+
+def test_post_bulk_charges_by_listing_count(monkeypatch):
+    monkeypatch.setattr(ratelimit, 'user_buckets', TokenBuckets(USER_LIMIT))
+    monkeypatch.setattr(ratelimit, 'command_buckets', TokenBuckets(COMMAND_LIMIT))
+
+    async def main():
+        async_db.start(MemoryStorage())
+        try:
+            bot = FakeBot()
+            cog = Trading(bot)
+            await bot.add_cog(cog)
+            text = '\n'.join(f'item {n} | {n}g' for n in range(MAX_BULK_LISTINGS))
+            first = FakeInteraction(bot, FakeUser(2, 'bob'), 1)
+            await cog.post_bulk(first, 'WTS', text)
+            # A full post spends the whole burst, so the next one is turned away
+            second = FakeInteraction(bot, FakeUser(2, 'bob'), 1)
+            await cog.post_bulk(second, 'WTS', 'shield | 5g')
+            await bot.drain()
+            return first.sent[-1][1], second.sent[-1], await async_db.count_active_trades('1')
+        finally:
+            async_db.close()
+
+    first, second, active = asyncio.run(main())
+    assert first['embed'].title.startswith(f'✅ {MAX_BULK_LISTINGS} ')
+    assert 'bulksell' in second[0] and second[1]['ephemeral']
+    assert active == MAX_BULK_LISTINGS
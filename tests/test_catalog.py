@@ -0,0 +1,10 @@
+from utils.catalog import load_catalog
+from utils.prices import load_price_model
+
+def test_loads_outside_repo_root(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    catalog = load_catalog()
+    assert catalog.by_id
+    item = next(iter(catalog.by_id.values()))
+    assert catalog.resolve(item.name) == item.id
+    assert load_price_model().parse('5g') == 5
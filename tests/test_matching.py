@@ -0,0 +1,88 @@
+from utils.matching import COMPACT_RATIO, MatchingEngine, Order, OrderBook
+
+def order(trade_id, user_id, trade_type, price_value, created_ts=None, guild_id='1', item_name='Iron Ore'):
+    return Order(trade_id, guild_id, user_id, f'user{user_id}', trade_type, None, item_name,
+                 1, str(price_value), price_value, created_ts if created_ts is not None else trade_id)
+
+def test_crossing_best_price():
+    book = OrderBook()
+    book.add(order(1, 'a', 'WTS', 120))
+    book.add(order(2, 'b', 'WTS', 100))
+    bid = order(3, 'c', 'WTB', 110)
+    book.add(bid)
+    assert book.crossing(bid).trade_id == 2
+
+def test_no_crossing():
+    book = OrderBook()
+    book.add(order(1, 'a', 'WTS', 120))
+    bid = order(2, 'b', 'WTB', 110)
+    book.add(bid)
+    assert book.crossing(bid) is None
+
+def test_crossing_skips_own_orders():
+    book = OrderBook()
+    book.add(order(1, 'a', 'WTS', 90))
+    book.add(order(2, 'a', 'WTS', 95))
+    book.add(order(3, 'b', 'WTS', 100))
+    bid = order(4, 'a', 'WTB', 100)
+    book.add(bid)
+    assert book.crossing(bid).trade_id == 3
+    # The skipped orders are still in the book, best first
+    assert book.best('WTS').trade_id == 1
+    assert len(book.asks) == 3
+
+def test_crossing_stops_at_price():
+    book = OrderBook()
+    book.add(order(1, 'a', 'WTB', 100))
+    book.add(order(2, 'b', 'WTB', 80))
+    ask = order(3, 'a', 'WTS', 90)
+    book.add(ask)
+    # b's bid is behind a's own but doesn't reach the ask
+    assert book.crossing(ask) is None
+    assert book.best('WTB').trade_id == 1
+
+def test_crossing_only_own_orders():
+    book = OrderBook()
+    book.add(order(1, 'a', 'WTS', 90))
+    bid = order(2, 'a', 'WTB', 100)
+    book.add(bid)
+    assert book.crossing(bid) is None
+    assert book.best('WTS').trade_id == 1
+
+def test_best_skips_removed():
+    book = OrderBook()
+    book.add(order(1, 'a', 'WTS', 90))
+    book.add(order(2, 'b', 'WTS', 100))
+    book.remove(1)
+    assert book.best('WTS').trade_id == 2
+    assert book.remove(1) is None
+
+def test_time_priority():
+    book = OrderBook()
+    book.add(order(1, 'a', 'WTB', 100, created_ts=20))
+    book.add(order(2, 'b', 'WTB', 100, created_ts=10))
+    assert book.best('WTB').trade_id == 2
+
+def test_compaction():
+    book = OrderBook()
+    for trade_id in range(1000):
+        book.add(order(trade_id, 'a', 'WTS', 1000 - trade_id))
+    book.add(order(5000, 'b', 'WTB', 1))
+    # Removing from the bottom of the heap leaves dead entries behind
+    for trade_id in range(900):
+        book.remove(trade_id)
+    assert book.live == {'WTS': 100, 'WTB': 1}
+    assert len(book.asks) <= COMPACT_RATIO * book.live['WTS'] + 64
+    assert len(book.bids) == 1
+    assert book.best('WTS').trade_id == 999
+    assert len(book) == 101
+
+def test_engine_add_and_remove():
+    engine = MatchingEngine()
+    assert engine.add(order(1, 'a', 'WTS', 100)) is None
+    assert engine.add(order(2, 'b', 'WTS', 100, guild_id='2')) is None
+    assert engine.add(order(3, 'c', 'WTB', 100)).trade_id == 1
+    assert engine.remove(1).trade_id == 1
+    assert engine.best('1', None, 'iron ore', 'WTS') is None
+    engine.clear_guild('1')
+    assert len(engine) == 1
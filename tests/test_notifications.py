@@ -0,0 +1,70 @@
+import asyncio
+
+import discord
+
+from utils.notifications import MAX_EMBED_CHARS, MAX_EMBEDS, NotificationDispatcher, batches
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = 'Bad Request'
+
+class FakeChannel:
+    """DM channel that refuses messages over the character limit with a 400"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, embeds):
+        if sum(len(embed) for embed in embeds) > MAX_EMBED_CHARS or any(embed.title == 'bad' for embed in embeds):
+            raise discord.HTTPException(FakeResponse(400), 'Invalid Form Body')
+        self.sent.append(embeds)
+
+class FakeClient:
+    def __init__(self):
+        self.channel = FakeChannel()
+
+    def get_user(self, user_id):
+        return None
+
+    async def create_dm(self, user):
+        return self.channel
+
+def note(chars, title='x'):
+    return 'dm', discord.Embed(title=title, description='d' * (chars - len(title)))
+
+def test_batches_by_count():
+    notes = [note(10) for _ in range(MAX_EMBEDS * 2 + 1)]
+    assert [len(batch) for batch in batches(notes)] == [MAX_EMBEDS, MAX_EMBEDS, 1]
+
+def test_batches_by_characters():
+    notes = [note(2500) for _ in range(5)]
+    sizes = [[len(embed) for _, embed in batch] for batch in batches(notes)]
+    assert sizes == [[2500, 2500], [2500, 2500], [2500]]
+
+def test_oversized_embed_alone():
+    notes = [note(100), note(MAX_EMBED_CHARS + 1), note(100)]
+    assert [len(batch) for batch in batches(notes)] == [1, 1, 1]
+
+def run(dispatcher, notes):
+    async def main():
+        dispatcher.start(FakeClient())
+        for _, embed in notes:
+            dispatcher.notify(1, embed)
+        await dispatcher._queue.join()
+        channel = dispatcher.client.channel
+        await dispatcher.stop()
+        return channel
+    return asyncio.run(main())
+
+def test_delivers_within_limits():
+    dispatcher = NotificationDispatcher(workers=1)
+    channel = run(dispatcher, [note(2500) for _ in range(5)])
+    assert len(channel.sent) == 3
+    assert dispatcher.outcomes == {'delivered': 5}
+
+def test_rejected_batch_falls_back_to_single_embeds():
+    dispatcher = NotificationDispatcher(workers=1)
+    channel = run(dispatcher, [note(50), note(50, title='bad'), note(50)])
+    assert [len(embeds) for embeds in channel.sent] == [1, 1]
+    assert dispatcher.outcomes == {'delivered': 2, 'failed': 1}
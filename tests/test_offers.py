@@ -0,0 +1,49 @@
+
+def listing(storage, guild_id='1', price='100g'):
+    return storage.add_trade(guild_id, 'seller', 'Seller', 'WTS', 'Iron Ore', 1, price, None)
+
+def sales(storage, guild_id='1'):
+    return storage.get_price_history(guild_id, None, 'Iron Ore', 'hour', 0)
+
+def test_accept_offer_once(storage):
+    trade_id = listing(storage)
+    offer_id = storage.create_offer(trade_id, 'buyer', 'Buyer', '90g', None)
+    assert storage.accept_offer(offer_id)
+    assert not storage.accept_offer(offer_id)
+    assert storage.get_offer(offer_id)[6] == 'accepted'
+    assert storage.get_trade_by_id(trade_id)[8] == 0
+    assert sales(storage)[0][1] == 1  # One sale recorded
+
+def test_one_pending_offer_per_trade(storage):
+    trade_id = listing(storage)
+    assert storage.create_offer(trade_id, 'buyer', 'Buyer', '90g', None) is not None
+    assert storage.create_offer(trade_id, 'other', 'Other', '95g', None) is None
+
+def test_pending_offer_blocks_direct_accept(storage):
+    trade_id = listing(storage)
+    offer_id = storage.create_offer(trade_id, 'buyer', 'Buyer', '90g', None)
+    assert not storage.complete_trade(trade_id, 'other', 'Other', '100g', 'direct_accept',
+                                      require_no_pending_offer=True)
+    assert storage.get_trade_by_id(trade_id)[8] == 1
+
+    # Once the offer is declined the listing can be bought directly
+    assert storage.update_offer_status(offer_id, 'declined')
+    assert not storage.update_offer_status(offer_id, 'declined')
+    assert storage.complete_trade(trade_id, 'other', 'Other', '100g', 'direct_accept',
+                                  require_no_pending_offer=True)
+    assert not storage.complete_trade(trade_id, 'other', 'Other', '100g', 'direct_accept')
+
+def test_complete_trade_guild_scoped(storage):
+    trade_id = listing(storage, guild_id='1')
+    assert not storage.complete_trade(trade_id, 'buyer', 'Buyer', '100g', 'direct_accept', guild_id='2')
+    assert storage.complete_trade(trade_id, 'buyer', 'Buyer', '100g', 'direct_accept', guild_id='1')
+
+def test_failed_accept_rolls_back(storage):
+    trade_id = listing(storage)
+    offer_id = storage.create_offer(trade_id, 'buyer', 'Buyer', '90g', None)
+    # The listing closes while the offer is still pending
+    assert storage.remove_trade(trade_id, 'seller', '1')[0]
+    assert not storage.accept_offer(offer_id)
+    # Completing the trade failed, so the offer's status change was undone too
+    assert storage.get_offer(offer_id)[6] == 'pending'
+    assert sales(storage) == []
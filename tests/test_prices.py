@@ -0,0 +1,33 @@
+import pytest
+
+from utils.prices import PriceModel, load_price_model
+
+@pytest.fixture
+def model():
+    return PriceModel('g', {'g': 1, 'k': 1000, 'm': 1000000, 'mg': 1000000}, ['gold', 'gp'])
+
+@pytest.mark.parametrize('text, value', [
+    ('90', 90),
+    ('500g', 500),
+    ('500 g', 500),
+    ('500 gold', 500),
+    ('500 GP', 500),
+    ('2k gold', 2000),
+    ('1.5mg', 1500000),
+    ('1,5m', 1500000),
+    ('1,500 g each', 1500),
+    ('about 3k', 3000),
+])
+def test_accepted_forms(model, text, value):
+    assert model.parse(text) == value
+
+@pytest.mark.parametrize('text', [None, '', 'best offer', '5 swords', '10x'])
+def test_unreadable(model, text):
+    assert model.parse(text) is None
+
+def test_format_skips_currency_names(model):
+    assert model.format(500) == '500g'
+    assert model.format(1500000) == '1.5mg'
+
+def test_shipped_config_reads_gold():
+    assert load_price_model().parse('500 gold') == 500
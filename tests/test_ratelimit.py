@@ -0,0 +1,53 @@
+import pytest
+
+from database import async_db
+from utils.ratelimit import DEFAULT_MAX_DB_IN_FLIGHT, Limit, TokenBuckets, market_busy, max_db_in_flight
+
+def test_burst_then_deny():
+    buckets = TokenBuckets(Limit(3, 3.0))
+    for _ in range(3):
+        assert buckets.retry_after('u1', 0.0) == 0
+        buckets.take('u1', 0.0)
+    assert buckets.retry_after('u1', 0.0) == pytest.approx(1.0)
+    # Other keys have buckets of their own
+    assert buckets.retry_after('u2', 0.0) == 0
+
+def test_refill():
+    buckets = TokenBuckets(Limit(2, 2.0))  # One token per second
+    buckets.take('u1', 0.0)
+    buckets.take('u1', 0.0)
+    assert buckets.retry_after('u1', 0.5) == pytest.approx(0.5)
+    assert buckets.retry_after('u1', 1.0) == 0
+    buckets.take('u1', 1.0)
+    assert buckets.retry_after('u1', 1.0) > 0
+    # Never refills past the limit
+    assert buckets.retry_after('u1', 100.0) == 0
+    for _ in range(2):
+        buckets.take('u1', 100.0)
+    assert buckets.retry_after('u1', 100.0) > 0
+
+def test_idle_buckets_evicted():
+    buckets = TokenBuckets(Limit(5, 10.0))
+    buckets.take('u1', 0.0)
+    buckets.take('u2', 5.0)
+    assert len(buckets) == 2
+    buckets.retry_after('u3', 12.0)  # u1 has been idle for a full refill
+    assert len(buckets) == 2
+    buckets.retry_after('u3', 20.0)
+    assert len(buckets) == 1
+
+def test_max_db_in_flight(monkeypatch):
+    monkeypatch.delenv('MAX_DB_IN_FLIGHT', raising=False)
+    assert max_db_in_flight() == DEFAULT_MAX_DB_IN_FLIGHT
+    monkeypatch.setenv('MAX_DB_IN_FLIGHT', '3')
+    assert max_db_in_flight() == 3
+    monkeypatch.setenv('MAX_DB_IN_FLIGHT', 'lots')
+    assert max_db_in_flight() == DEFAULT_MAX_DB_IN_FLIGHT
+
+def test_market_busy(monkeypatch):
+    monkeypatch.setenv('MAX_DB_IN_FLIGHT', '2')
+    monkeypatch.setitem(async_db._in_flight, 'read', 1)
+    monkeypatch.setitem(async_db._in_flight, 'write', 0)
+    assert not market_busy()
+    monkeypatch.setitem(async_db._in_flight, 'write', 1)
+    assert market_busy()
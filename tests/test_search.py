@@ -0,0 +1,49 @@
+from database.db_manager import position_window
+
+def add(storage, item_name, notes=None, price='10g', guild_id='1'):
+    return storage.add_trade(guild_id, 'u1', 'user1', 'WTS', item_name, 1, price, notes)
+
+def test_position_window():
+    assert position_window(None, True, 10) == (0, 10)
+    assert position_window((9, 123), True, 10) == (10, 10)
+    assert position_window((10, 123), False, 10) == (0, 10)
+    assert position_window((3, 123), False, 10) == (0, 3)
+
+def test_relevance_pages_by_position(storage):
+    ids = {add(storage, f'iron sword {n}') for n in range(25)}
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, has_more = storage.search_trades_page('1', 'sword', cursor, True, 10)
+        seen.extend(row[0] for row in rows)
+        pages += 1
+        if not has_more:
+            break
+        cursor = (rows[-1][-1], rows[-1][0])
+    assert pages == 3
+    assert sorted(seen) == sorted(ids)
+    assert [row[-1] for row in rows] == [20, 21, 22, 23, 24]
+
+    # Back from the last page
+    back, has_more = storage.search_trades_page('1', 'sword', (rows[0][-1], rows[0][0]), False, 10)
+    assert [row[-1] for row in back] == list(range(10, 20))
+    assert has_more
+
+def test_relevance_cursor_survives_index_changes(storage):
+    for n in range(15):
+        add(storage, f'iron sword {n}')
+    rows, _ = storage.search_trades_page('1', 'sword', None, True, 10)
+    # Changes the bm25 statistics of every document
+    for n in range(30):
+        add(storage, f'shield {n}', notes='long notes ' * n)
+    more, has_more = storage.search_trades_page('1', 'sword', (rows[-1][-1], rows[-1][0]), True, 10)
+    assert len(more) == 5 and not has_more
+    assert not {row[0] for row in rows} & {row[0] for row in more}
+
+def test_price_sort_keyset(storage):
+    for n in range(12):
+        add(storage, f'axe {n}', price=f'{n + 1}g')
+    rows, has_more = storage.search_trades_page('1', 'axe', None, True, 10, 'price_low')
+    assert has_more
+    more, _ = storage.search_trades_page('1', 'axe', (rows[-1][-1], rows[-1][0]), True, 10, 'price_low')
+    assert [row[6] for row in more] == ['11g', '12g']
+    assert storage.count_search_results('1', 'axe') == 12
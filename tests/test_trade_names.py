@@ -0,0 +1,40 @@
+from database import db_manager
+from database.db_manager import _MISSING, TradeNameCache
+
+def test_put_if_absent_fills_missing():
+    cache = TradeNameCache(10)
+    cache.put_if_absent('u1', 'Old')
+    assert cache.get('u1') == 'Old'
+
+def test_write_beats_stale_load():
+    cache = TradeNameCache(10)
+    # A load read 'Old', then set_trade_name committed 'New' before the
+    # load's after-commit hook ran
+    cache.put('u1', 'New')
+    cache.put_if_absent('u1', 'Old')
+    assert cache.get('u1') == 'New'
+    cache.put('u1', 'Newer')
+    assert cache.get('u1') == 'Newer'
+
+def test_lru_eviction():
+    cache = TradeNameCache(2)
+    cache.put('u1', 'A')
+    cache.put('u2', 'B')
+    cache.get('u1')
+    cache.put_if_absent('u3', 'C')
+    assert cache.get('u2') is _MISSING
+    assert cache.get('u1') == 'A' and cache.get('u3') == 'C'
+
+def test_missing_name_cached_as_none(sqlite_storage):
+    db_manager.trade_name_cache.load([], complete=False)
+    assert sqlite_storage.get_cached_trade_name('u1') == (False, None)
+    assert sqlite_storage.load_trade_name('u1') is None
+    assert sqlite_storage.get_cached_trade_name('u1') == (True, None)
+    assert sqlite_storage.set_trade_name('u1', 'Trader')
+    assert sqlite_storage.get_cached_trade_name('u1') == (True, 'Trader')
+    assert sqlite_storage.load_trade_name('u1') == 'Trader'
+
+def test_trade_names(storage):
+    assert storage.set_trade_name('u1', 'Trader')
+    assert storage.get_cached_trade_name('u1') == (True, 'Trader')
+    assert storage.get_trade_name_cache_stats()['size'] >= 1
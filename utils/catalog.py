@@ -0,0 +1,80 @@
+import json
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from utils.parsers import normalize_item_name
+
+# Resolved from this file, not the working directory, so migrations and
+# scripts run from anywhere find it
+ITEMS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'items.json')
+
+class CatalogItem(NamedTuple):
+    id: int
+    name: str
+    category: Optional[str]
+    subcategory: Optional[str]
+    rarity: Optional[str]
+    description: Optional[str]
+    icon_url: Optional[str]
+
+class Catalog:
+    """Item catalog with O(1) lookup by id and by normalized name"""
+
+    def __init__(self, items: Iterable[CatalogItem]):
+        self.by_id: Dict[int, CatalogItem] = {}
+        self.by_name: Dict[str, CatalogItem] = {}
+        for item in items:
+            self.by_id[item.id] = item
+            self.by_name[normalize_item_name(item.name)] = item
+
+    def get(self, item_id: Optional[int]) -> Optional[CatalogItem]:
+        """Get a catalog item by id"""
+        return self.by_id.get(item_id)
+
+    def resolve(self, name: Optional[str]) -> Optional[int]:
+        """Map a free-text item name to a catalog item id (None if unknown)"""
+        if not name:
+            return None
+
+        key = normalize_item_name(name)
+        item = self.by_name.get(key)
+
+        # Tolerate a simple plural ("health potions")
+        if item is None and key.endswith('s'):
+            item = self.by_name.get(key[:-1])
+
+        return item.id if item else None
+
+    def names(self) -> List[str]:
+        """All catalog item names"""
+        return [item.name for item in self.by_id.values()]
+
+    def __len__(self):
+        return len(self.by_id)
+
+def load_catalog(path: str = ITEMS_PATH) -> Catalog:
+    """Load the item catalog from a JSON file"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    return Catalog(
+        CatalogItem(
+            id=int(item['id']),
+            name=item['name'],
+            category=item.get('category'),
+            subcategory=item.get('subcategory'),
+            rarity=item.get('rarity'),
+            description=item.get('description'),
+            icon_url=item.get('icon_url')
+        )
+        for item in data.get('items', [])
+    )
+
+_catalog: Optional[Catalog] = None
+
+def get_catalog() -> Catalog:
+    """Get the shared catalog, loading it on first use"""
+    global _catalog
+    if _catalog is None:
+        _catalog = load_catalog()
+    return _catalog
@@ -0,0 +1,75 @@
+"""
+Slash command syncing.
+
+Syncing uploads the whole command tree and counts against a tight rate
+limit, and on_ready runs again after every gateway reconnect. So the tree's
+payload is hashed, and the hash of the last successful sync is kept next to
+the database (<DB_PATH>-commands.json, one per scope: 'global' or a guild
+ID). sync_commands() only uploads when the hash for its scope has changed,
+or when forced (python bot.py --sync, or /synccommands).
+
+For development, DEV_GUILD_ID syncs the commands to that one server instead,
+where changes show up at once.
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+import discord
+from discord import app_commands
+
+from database import db_manager
+
+def dev_guild() -> Optional[discord.Object]:
+    """The server commands are synced to during development (DEV_GUILD_ID)"""
+    guild_id = os.getenv('DEV_GUILD_ID')
+    return discord.Object(id=int(guild_id)) if guild_id else None
+
+def signature_path() -> str:
+    return f'{db_manager.DB_PATH}-commands.json'
+
+def tree_signature(tree: app_commands.CommandTree, guild: Optional[discord.abc.Snowflake] = None) -> str:
+    """SHA-256 of what sync() would upload for this scope (and application)"""
+    commands = sorted((command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+                      key=lambda payload: (payload.get('type', 1), payload['name']))
+    payload = {'application_id': tree.client.application_id, 'commands': commands}
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def _load_signatures() -> Dict[str, str]:
+    try:
+        with open(signature_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}  # Never synced, or unreadable: sync again
+
+def _save_signatures(signatures: Dict[str, str]):
+    path = signature_path()
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(signatures, f, indent=2, sort_keys=True)
+    os.replace(f'{path}.tmp', path)
+
+async def sync_commands(tree: app_commands.CommandTree, guild: Optional[discord.abc.Snowflake] = None,
+                        force: bool = False) -> Optional[List[app_commands.AppCommand]]:
+    """Sync the global commands (or, with guild, copy them to that server and
+    sync them there) if they changed since the last sync.
+
+    Returns the synced commands, or None if the sync was skipped.
+    """
+    if guild is not None:
+        tree.copy_global_to(guild=guild)
+
+    scope = str(guild.id) if guild is not None else 'global'
+    signature = tree_signature(tree, guild)
+    signatures = _load_signatures()
+    if not force and signatures.get(scope) == signature:
+        return None
+
+    synced = await tree.sync(guild=guild)
+    signatures[scope] = signature
+    try:
+        _save_signatures(signatures)
+    except OSError as e:
+        print(f'[ERROR] Saving command signature: {type(e).__name__}: {e}', flush=True)
+    return synced
@@ -0,0 +1,100 @@
+import re
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Tuple
+
+from discord import app_commands
+
+from utils.parsers import normalize_item_name
+
+# Discord shows at most 25 autocomplete choices
+MAX_CHOICES = 25
+
+class ItemIndex:
+    """Memory-resident prefix index of item names for autocomplete.
+
+    Names live in a sorted list, so a prefix lookup is one bisect plus a
+    short forward walk. Catalog names are permanent; names that only come
+    from listings are reference-counted and dropped when their last active
+    listing closes.
+    """
+
+    def __init__(self):
+        self._keys: List[str] = []         # sorted normalized names
+        self._display: Dict[str, str] = {}  # normalized -> name as first seen
+        self._catalog = set()
+        self._counts: Dict[str, int] = {}
+
+    def build(self, catalog_names: Iterable[str], active_names: Iterable[Tuple[str, int]]):
+        """Rebuild from catalog names and (item_name, active listing count) pairs"""
+        self._display.clear()
+        self._catalog.clear()
+        self._counts.clear()
+
+        for name in catalog_names:
+            key = normalize_item_name(name)
+            self._catalog.add(key)
+            self._display.setdefault(key, name)
+
+        for name, count in active_names:
+            key = normalize_item_name(name)
+            self._counts[key] = self._counts.get(key, 0) + count
+            self._display.setdefault(key, name)
+
+        self._keys = sorted(self._display)
+
+    def add(self, name: str):
+        """Record one more active listing of an item"""
+        key = normalize_item_name(name)
+        if not key:
+            return
+        self._counts[key] = self._counts.get(key, 0) + 1
+        if key not in self._display:
+            self._display[key] = name
+            insort(self._keys, key)
+
+    def discard(self, name: str):
+        """Record that one active listing of an item closed"""
+        key = normalize_item_name(name)
+        count = self._counts.get(key, 0) - 1
+        if count > 0:
+            self._counts[key] = count
+            return
+
+        self._counts.pop(key, None)
+        if key in self._display and key not in self._catalog:
+            del self._display[key]
+            index = bisect_left(self._keys, key)
+            if index < len(self._keys) and self._keys[index] == key:
+                del self._keys[index]
+
+    def complete(self, prefix: str, limit: int = MAX_CHOICES) -> List[str]:
+        """Return up to `limit` names starting with `prefix`, alphabetically"""
+        key = normalize_item_name(prefix)
+        results = []
+        index = bisect_left(self._keys, key)
+        while index < len(self._keys) and len(results) < limit:
+            candidate = self._keys[index]
+            if not candidate.startswith(key):
+                break
+            results.append(self._display[candidate])
+            index += 1
+        return results
+
+    def __len__(self):
+        return len(self._keys)
+
+# Shared by every cog that offers item autocomplete
+item_index = ItemIndex()
+
+async def item_autocomplete(interaction, current: str) -> List[app_commands.Choice[str]]:
+    """Autocomplete callback for item arguments (keeps a leading "2x" quantity)"""
+    quantity = ''
+    match = re.match(r'(\d+\s*[xX×]\s*|\d+\s+)(.*)', current)
+    if match:
+        quantity, current = match.group(1), match.group(2)
+
+    choices = []
+    for name in item_index.complete(current):
+        value = f'{quantity}{name}'[:100]
+        choices.append(app_commands.Choice(name=value, value=value))
+    return choices
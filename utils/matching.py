@@ -0,0 +1,173 @@
+"""
+In-memory order book and WTS/WTB matching.
+
+Every active trade with a numeric price is an order: WTS listings are asks,
+WTB listings are bids. Orders are grouped per guild and item (catalog id, or
+the normalized name for items outside the catalog) and kept in two heaps with
+price-time priority - lowest ask first, highest bid first, oldest first at
+equal prices. A new order crosses the book when it meets the best opposite
+order from another user, so matching is a heap peek (plus one pop and push
+per crossing order of the same user's it skips) and each add/remove is
+O(log n).
+
+Closed orders are removed lazily: they are forgotten at once and their heap
+entries are skipped (and popped) the next time they reach the top.
+"""
+import heapq
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from utils.parsers import normalize_item_name
+
+# Rebuild a heap once it holds this many times more entries than live orders
+COMPACT_RATIO = 2
+
+class Order(NamedTuple):
+    trade_id: int
+    guild_id: Optional[str]
+    user_id: str
+    username: str
+    trade_type: str
+    item_id: Optional[int]
+    item_name: str
+    quantity: int
+    price: str
+    price_value: int
+    created_ts: int
+
+BookKey = Tuple[Optional[str], Union[int, str]]
+
+def book_key(guild_id: Optional[str], item_id: Optional[int], item_name: str) -> BookKey:
+    """Order book key: the guild plus the catalog id when known, normalized name otherwise"""
+    return guild_id, item_id if item_id is not None else normalize_item_name(item_name)
+
+class OrderBook:
+    """Bids and asks for one item"""
+
+    def __init__(self):
+        # Heap entries are (priority price, created_ts, trade_id)
+        self.asks: List[Tuple[int, int, int]] = []
+        self.bids: List[Tuple[int, int, int]] = []
+        self.orders: Dict[int, Order] = {}
+        self.live = {'WTS': 0, 'WTB': 0}  # Live orders per side
+
+    def _heap(self, trade_type: str) -> List[Tuple[int, int, int]]:
+        return self.asks if trade_type == 'WTS' else self.bids
+
+    def add(self, order: Order):
+        entry = (order.price_value if order.trade_type == 'WTS' else -order.price_value,
+                 order.created_ts, order.trade_id)
+        self.orders[order.trade_id] = order
+        self.live[order.trade_type] += 1
+        heapq.heappush(self._heap(order.trade_type), entry)
+
+    def remove(self, trade_id: int) -> Optional[Order]:
+        order = self.orders.pop(trade_id, None)
+        if order is not None:
+            self.live[order.trade_type] -= 1
+            self._compact(order.trade_type)
+        return order
+
+    def _compact(self, trade_type: str):
+        heap = self._heap(trade_type)
+        if len(heap) > COMPACT_RATIO * self.live[trade_type] + 64:
+            heap[:] = [entry for entry in heap if entry[2] in self.orders]
+            heapq.heapify(heap)
+
+    def best(self, trade_type: str) -> Optional[Order]:
+        """Best live order on one side (lowest ask or highest bid)"""
+        heap = self._heap(trade_type)
+        while heap:
+            order = self.orders.get(heap[0][2])
+            if order is not None:
+                return order
+            heapq.heappop(heap)  # Closed order
+        return None
+
+    def crossing(self, order: Order) -> Optional[Order]:
+        """Best opposite order from another user that this order crosses, if any"""
+        side = 'WTB' if order.trade_type == 'WTS' else 'WTS'
+        heap = self._heap(side)
+        skipped = []  # The same user's crossing orders, put back afterwards
+        match = None
+        while True:
+            other = self.best(side)
+            if other is None or not self._crosses(order, other):
+                break
+            if other.user_id != order.user_id:
+                match = other
+                break
+            skipped.append(heapq.heappop(heap))
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return match
+
+    @staticmethod
+    def _crosses(order: Order, other: Order) -> bool:
+        if order.trade_type == 'WTS':
+            return other.price_value >= order.price_value
+        return other.price_value <= order.price_value
+
+    def __len__(self):
+        return len(self.orders)
+
+class MatchingEngine:
+    """Order books for every guild and item, plus trade id -> book lookup"""
+
+    def __init__(self):
+        self.books: Dict[BookKey, OrderBook] = {}
+        self._keys: Dict[int, BookKey] = {}
+
+    def build(self, rows: List[Tuple]):
+        """Rebuild from get_active_orders() rows"""
+        self.clear()
+        for row in rows:
+            self._insert(Order(*row))
+
+    def clear(self):
+        self.books.clear()
+        self._keys.clear()
+
+    def clear_guild(self, guild_id: str):
+        """Forget every order in one guild (its market was cleared)"""
+        for key in [key for key in self.books if key[0] == guild_id]:
+            for trade_id in self.books.pop(key).orders:
+                self._keys.pop(trade_id, None)
+
+    def _insert(self, order: Order) -> OrderBook:
+        key = book_key(order.guild_id, order.item_id, order.item_name)
+        book = self.books.get(key)
+        if book is None:
+            book = self.books[key] = OrderBook()
+        book.add(order)
+        self._keys[order.trade_id] = key
+        return book
+
+    def add(self, order: Order) -> Optional[Order]:
+        """Add a new order; returns the resting order it crosses, if any"""
+        if order.trade_id in self._keys:
+            return None
+        book = self._insert(order)
+        return book.crossing(order)
+
+    def remove(self, trade_id: int) -> Optional[Order]:
+        """Forget a closed order"""
+        key = self._keys.pop(trade_id, None)
+        if key is None:
+            return None
+        book = self.books[key]
+        order = book.remove(trade_id)
+        if not book:
+            del self.books[key]
+        return order
+
+    def best(self, guild_id: Optional[str], item_id: Optional[int], item_name: str,
+             trade_type: str) -> Optional[Order]:
+        """Best live WTS (lowest) or WTB (highest) order for an item in a guild"""
+        book = self.books.get(book_key(guild_id, item_id, item_name))
+        return book.best(trade_type) if book else None
+
+    def __len__(self):
+        return len(self._keys)
+
+# Shared by the matching cog
+matching_engine = MatchingEngine()
@@ -0,0 +1,252 @@
+"""
+Runtime metrics.
+
+Slash commands and storage calls are timed into fixed-bucket latency
+histograms (with error counts), and gauges - cache hit rates, queue depths
+and the like - are read when someone asks. Everything is exposed in the
+Prometheus text format on a local HTTP port (METRICS_PORT) and summarized by
+the admin /stats command.
+
+Histograms are cheap enough to update on every call: one bisect and a few
+additions under a lock (storage calls are timed on the database threads).
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import discord
+from aiohttp import web
+from discord import app_commands
+
+# Prefix of every exported metric name
+NAMESPACE = 'tradebot'
+
+# Histogram bucket upper bounds (seconds)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+GaugeValue = Union[float, Dict[str, float]]
+
+class Histogram:
+    """Cumulative-bucket latency histogram (thread-safe)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self) -> Tuple[List[int], int, float]:
+        """(per-bucket counts, count, sum) at one instant"""
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside its bucket (like histogram_quantile)"""
+        counts, count, _ = self.snapshot()
+        if not count:
+            return None
+
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+class Metrics:
+    """Every histogram, error counter and gauge the bot exports"""
+
+    def __init__(self):
+        self.commands: Dict[str, Histogram] = {}
+        self.command_errors = Counter()
+        self.command_rejections = Counter()  # (command, reason)
+        self.storage: Dict[str, Histogram] = {}
+        self.storage_errors = Counter()
+        self.started = time.time()
+        self._gauges: Dict[str, Tuple[str, Optional[str], Callable[[], GaugeValue]]] = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, family: Dict[str, Histogram], name: str) -> Histogram:
+        histogram = family.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = family.setdefault(name, Histogram())
+        return histogram
+
+    def observe_command(self, name: str, seconds: float, failed: bool = False):
+        self._histogram(self.commands, name).observe(seconds)
+        if failed:
+            self.command_errors[name] += 1
+
+    def reject_command(self, name: str, reason: str):
+        """Count a command turned away before it ran (see utils.ratelimit)"""
+        self.command_rejections[(name, reason)] += 1
+
+    def observe_storage(self, name: str, seconds: float, failed: bool = False):
+        self._histogram(self.storage, name).observe(seconds)
+        if failed:
+            with self._lock:
+                self.storage_errors[name] += 1
+
+    def timed_storage(self, name: str, func: Callable) -> Callable:
+        """Wrap a blocking storage function so each call is timed under name"""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self.observe_storage(name, time.perf_counter() - start, failed)
+        return timed
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], GaugeValue], label: Optional[str] = None):
+        """Register a value read at scrape time; with label, read returns {label value: value}"""
+        self._gauges[name] = (help_text, label, read)
+
+    def gauges(self) -> Dict[str, GaugeValue]:
+        """Current value of every gauge (ones that fail to read are left out)"""
+        values = {}
+        for name, (_, _, read) in list(self._gauges.items()):
+            try:
+                values[name] = read()
+            except Exception as e:
+                print(f'[ERROR] Reading gauge {name}: {type(e).__name__}: {e}', flush=True)
+        return values
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format"""
+        lines = []
+        self._render_histograms(lines, 'command_duration_seconds', 'Slash command latency',
+                                'command', self.commands)
+        self._render_counter(lines, 'command_errors_total', 'Slash commands that failed',
+                             'command', self.command_errors)
+        self._render_counter(lines, 'command_rejections_total', 'Slash commands turned away by rate limits or admission control',
+                             ('command', 'reason'), self.command_rejections)
+        self._render_histograms(lines, 'storage_duration_seconds', 'Storage call latency (on the database threads)',
+                                'function', self.storage)
+        self._render_counter(lines, 'storage_errors_total', 'Storage calls that raised',
+                             'function', self.storage_errors)
+
+        values = self.gauges()
+        for name, (help_text, label, _) in list(self._gauges.items()):
+            if name not in values:
+                continue
+            metric = f'{NAMESPACE}_{name}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} gauge')
+            if label is None:
+                lines.append(f'{metric} {_number(values[name])}')
+            else:
+                for key, value in sorted(values[name].items()):
+                    lines.append(f'{metric}{{{label}="{_escape(key)}"}} {_number(value)}')
+
+        lines.append(f'# HELP {NAMESPACE}_uptime_seconds Seconds since the bot started')
+        lines.append(f'# TYPE {NAMESPACE}_uptime_seconds gauge')
+        lines.append(f'{NAMESPACE}_uptime_seconds {_number(time.time() - self.started)}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(lines: List[str], name: str, help_text: str, label: str,
+                           family: Dict[str, Histogram]):
+        metric = f'{NAMESPACE}_{name}'
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for key, histogram in sorted(family.items()):
+            counts, count, total = histogram.snapshot()
+            key = _escape(key)
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{{label}="{key}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{label}="{key}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{{label}="{key}"}} {_number(total)}')
+            lines.append(f'{metric}_count{{{label}="{key}"}} {count}')
+
+    @staticmethod
+    def _render_counter(lines: List[str], name: str, help_text: str, label: Union[str, Tuple[str, ...]],
+                        counter: Counter):
+        """With a tuple of labels, the counter's keys are tuples of their values"""
+        metric = f'{NAMESPACE}_{name}'
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        labels = label if isinstance(label, tuple) else (label,)
+        for key, count in sorted(counter.items()):
+            values = key if isinstance(label, tuple) else (key,)
+            pairs = ','.join(f'{label_name}="{_escape(label_value)}"' for label_name, label_value in zip(labels, values))
+            lines.append(f'{metric}{{{pairs}}} {count}')
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value: float) -> str:
+    if isinstance(value, float):
+        return 'NaN' if value != value else repr(value)
+    return str(value)
+
+# Shared by the bot, async_db and the stats cog
+metrics = Metrics()
+
+class MetricsTree(app_commands.CommandTree):
+    """Command tree that times every slash command.
+
+    The clock starts in interaction_check (before the command's own checks)
+    and stops when the command completes or fails. Commands that catch their
+    own errors and reply with a message count as completed.
+    """
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras['started'] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        record_command(interaction, failed=True)
+        await super().on_error(interaction, error)
+
+def record_command(interaction: discord.Interaction, failed: bool = False):
+    """Stop the clock started by MetricsTree for this interaction"""
+    started = interaction.extras.pop('started', None)
+    if started is None or interaction.command is None:
+        return
+    metrics.observe_command(interaction.command.qualified_name, time.perf_counter() - started, failed)
+
+class MetricsServer:
+    """Serves GET /metrics on a local port"""
+
+    def __init__(self):
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str, port: int):
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get('/metrics', self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @staticmethod
+    async def _metrics(request: web.Request) -> web.Response:
+        return web.Response(body=metrics.render().encode('utf-8'),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+                                     'Cache-Control': 'no-store'})
@@ -0,0 +1,164 @@
+"""
+Background DM delivery.
+
+Command handlers call notifier.notify() and return straight away; worker
+tasks deliver the DMs afterwards. Users are resolved from the gateway cache
+first (DM channels are opened by ID, so no fetch_user round trip), embeds
+queued for the same user are sent together (up to 10 per message and 6000
+characters in all), and transient failures are retried with exponential
+backoff. When Discord refuses a batch outright, its embeds are sent one by
+one so a single bad embed doesn't take the others down with it. Every delivery
+outcome is counted and the most recent ones are kept for inspection.
+"""
+import asyncio
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import discord
+
+# Worker tasks sending DMs concurrently
+WORKERS = 2
+
+# Attempts per message before giving up, and the first retry delay (seconds)
+MAX_ATTEMPTS = 4
+RETRY_DELAY = 1.0
+
+# Users with undelivered DMs; notify() drops new DMs beyond this
+MAX_PENDING_USERS = 5000
+
+# Discord allows at most 10 embeds per message, with at most 6000 characters
+# across all of them
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+
+def batches(notes: List[Tuple[str, discord.Embed]]) -> List[List[Tuple[str, discord.Embed]]]:
+    """Split queued (kind, embed) notes into messages within Discord's limits
+    (an embed over the character limit on its own still gets a message)"""
+    result, batch, chars = [], [], 0
+    for kind, embed in notes:
+        size = len(embed)
+        if batch and (len(batch) == MAX_EMBEDS or chars + size > MAX_EMBED_CHARS):
+            result.append(batch)
+            batch, chars = [], 0
+        batch.append((kind, embed))
+        chars += size
+    if batch:
+        result.append(batch)
+    return result
+
+class NotificationDispatcher:
+    """Queue of DMs drained by background worker tasks"""
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self.client: Optional[discord.Client] = None
+        self.outcomes = Counter()
+        self.recent: Deque[Tuple[float, int, str, str]] = deque(maxlen=100)
+        self._pending: Dict[int, List[Tuple[str, discord.Embed]]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self, client: discord.Client):
+        """Start the worker tasks (needs a running event loop)"""
+        if self._tasks:
+            return
+        self.client = client
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(), name=f'notifier-{i}')
+                       for i in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; anything still queued is counted as dropped"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for user_id, notes in self._pending.items():
+            for kind, _ in notes:
+                self._record(user_id, kind, 'dropped')
+        self._pending.clear()
+
+    def notify(self, user_id: int, embed: discord.Embed, kind: str = 'dm') -> bool:
+        """Queue a DM for a user; returns False if it was dropped"""
+        if self._queue is None:
+            self._record(user_id, kind, 'dropped')
+            return False
+
+        notes = self._pending.get(user_id)
+        if notes is None:
+            if len(self._pending) >= MAX_PENDING_USERS:
+                self._record(user_id, kind, 'dropped')
+                return False
+            notes = self._pending[user_id] = []
+            self._queue.put_nowait(user_id)
+        notes.append((kind, embed))
+        return True
+
+    def queue_depth(self) -> int:
+        """Number of DMs waiting to be sent"""
+        return sum(len(notes) for notes in self._pending.values())
+
+    def _record(self, user_id: int, kind: str, outcome: str):
+        if outcome == 'rejected':
+            outcome = 'failed'
+        self.outcomes[outcome] += 1
+        self.recent.append((time.time(), user_id, kind, outcome))
+
+    async def _worker(self):
+        while True:
+            user_id = await self._queue.get()
+            try:
+                for batch in batches(self._pending.pop(user_id, [])):
+                    outcome = await self._deliver(user_id, [embed for _, embed in batch])
+                    if outcome == 'rejected' and len(batch) > 1:
+                        # Find out which embeds Discord refuses by sending them alone
+                        for kind, embed in batch:
+                            self._record(user_id, kind, await self._deliver(user_id, [embed]))
+                        continue
+                    for kind, _ in batch:
+                        self._record(user_id, kind, outcome)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f'[ERROR] Notification worker: {type(e).__name__}: {e}', flush=True)
+            finally:
+                self._queue.task_done()
+
+    async def _resolve_channel(self, user_id: int) -> discord.DMChannel:
+        # Cached user or DM channel first; otherwise open the DM by ID,
+        # which costs one request instead of fetch_user + create_dm
+        user = self.client.get_user(user_id)
+        if user is not None:
+            return user.dm_channel or await user.create_dm()
+        return await self.client.create_dm(discord.Object(id=user_id))
+
+    async def _deliver(self, user_id: int, embeds: List[discord.Embed]) -> str:
+        """Send embeds to a user, retrying transient failures; returns the outcome
+        ('rejected' when Discord refuses the message itself, e.g. it is too long)"""
+        delay = RETRY_DELAY
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                channel = await self._resolve_channel(user_id)
+                await channel.send(embeds=embeds)
+                return 'delivered'
+            except (discord.Forbidden, discord.NotFound):
+                return 'forbidden'  # DMs disabled, bot blocked or user gone
+            except discord.HTTPException as e:
+                # discord.py already waits out per-route rate limits; retry
+                # the rest only if it looks transient
+                if e.status != 429 and e.status < 500:
+                    return 'rejected'
+                retry_after = getattr(e, 'retry_after', None)
+                wait = max(delay, retry_after or 0)
+            except (OSError, asyncio.TimeoutError):
+                wait = delay
+
+            if attempt < MAX_ATTEMPTS:
+                self.outcomes['retried'] += 1
+                await asyncio.sleep(wait)
+                delay *= 2
+        return 'failed'
+
+# Shared by every cog that sends DMs
+notifier = NotificationDispatcher()
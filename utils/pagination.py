@@ -0,0 +1,120 @@
+import discord
+from typing import Awaitable, Callable, List, Optional, Tuple
+from utils.ratelimit import MarketBusy, market_busy
+
+# Rows shown per page
+PAGE_SIZE = 10
+
+# How long (seconds) the Prev/Next buttons keep working after the last click
+PAGE_TIMEOUT = 300
+
+# Discord's limit on an embed field value
+FIELD_LIMIT = 1024
+
+def field_text(lines: List[str]) -> str:
+    """Join lines for an embed field, stopping before Discord's size limit"""
+    text = ""
+    for line in lines:
+        if len(text) + len(line) + 1 > FIELD_LIMIT - 4:
+            return text + "..."
+        text += line + "\n"
+    return text
+
+class PageView(discord.ui.View):
+    """Prev/Next navigation over a keyset-paginated query.
+
+    Only the cursors of the current page are kept: `fetch(cursor, forward)`
+    returns (rows, has_more) for the page after (or before) the cursor, and
+    `render(rows, page, total)` builds its embed. Rows end with their sort
+    key (or their position, for the sorts in db_manager.POSITION_SORTS), so
+    the cursor for a row is (row[-1], row[0]).
+    """
+
+    def __init__(self, owner_id: int,
+                 fetch: Callable[[Optional[Tuple], bool], Awaitable[Tuple[List[Tuple], bool]]],
+                 render: Callable[[List[Tuple], int, int], discord.Embed],
+                 total: int):
+        super().__init__(timeout=PAGE_TIMEOUT)
+        self.owner_id = owner_id
+        self.fetch = fetch
+        self.render = render
+        self.total = total
+        self.page = 0
+        self.rows: List[Tuple] = []
+        self.has_next = False
+        self.message: Optional[discord.InteractionMessage] = None
+
+    async def first_page(self) -> discord.Embed:
+        """Load the first page and return its embed"""
+        self.rows, self.has_next = await self.fetch(None, True)
+        self._update_buttons()
+        return self.render(self.rows, self.page, self.total)
+
+    def _update_buttons(self):
+        self.prev_button.disabled = self.page == 0
+        self.next_button.disabled = not self.has_next
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message(
+                "Run the command yourself to browse pages.",
+                ephemeral=True
+            )
+            return False
+        if market_busy():
+            await interaction.response.send_message(str(MarketBusy()), ephemeral=True)
+            return False
+        return True
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass  # Message was deleted
+
+    @discord.ui.button(label="Prev", style=discord.ButtonStyle.secondary)
+    async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        first = self.rows[0]
+        rows, _ = await self.fetch((first[-1], first[0]), False)
+        if rows:
+            self.rows = rows
+            self.page -= 1
+            self.has_next = True
+        self._update_buttons()
+        await interaction.response.edit_message(
+            embed=self.render(self.rows, self.page, self.total), view=self
+        )
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.primary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        last = self.rows[-1]
+        rows, has_next = await self.fetch((last[-1], last[0]), True)
+        if rows:
+            self.rows = rows
+            self.page += 1
+            self.has_next = has_next
+        else:
+            self.has_next = False
+        self._update_buttons()
+        await interaction.response.edit_message(
+            embed=self.render(self.rows, self.page, self.total), view=self
+        )
+
+    async def send(self, interaction: discord.Interaction, ephemeral: bool = False):
+        """Send the first page as the interaction response"""
+        embed = await self.first_page()
+        if self.has_next:
+            await interaction.response.send_message(embed=embed, view=self, ephemeral=ephemeral)
+            self.message = await interaction.original_response()
+        else:
+            # Everything fits on one page; no buttons needed
+            self.stop()
+            await interaction.response.send_message(embed=embed, ephemeral=ephemeral)
+
+def page_footer(page: int, total: int, page_size: int = PAGE_SIZE) -> str:
+    """Footer text like 'Page 2/5 - 47 trade(s)'"""
+    pages = max(1, -(-total // page_size))
+    return f"Page {page + 1}/{pages} - {total} trade(s)"
@@ -1,5 +1,6 @@
+import csv
 import re
-from typing import Tuple, Optional
+from typing import List, Optional, Tuple
 
 def parse_listing(text: str) -> Tuple[Optional[str], int, Optional[str], Optional[str]]:
     """
@@ -33,3 +34,56 @@ def parse_listing(text: str) -> Tuple[Optional[str], int, Optional[str], Optiona
             item_name = match.group(2).strip()
     
     return item_name, quantity, price, notes
+
+def parse_bulk_listings(text: str, csv_format: bool = False
+                        ) -> Tuple[List[Tuple[int, str, int, Optional[str], Optional[str]]], List[Tuple[int, str, str]]]:
+    """
+    Parse one listing per line, either "item | price | notes" or, with
+    csv_format, CSV columns item,price,notes (an "item" header row is
+    skipped). Blank lines and lines starting with # are ignored.
+    
+    Returns:
+        (listings as (line number, item_name, quantity, price, notes),
+         rejected lines as (line number, line, reason))
+    
+    Examples:
+        "2x rare sword | 500g\n | 1k"
+            -> ([(1, "rare sword", 2, "500g", None)], [(2, " | 1k", "no item name")])
+    """
+    listings, rejected = [], []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        if csv_format:
+            row = next(csv.reader([line]))
+            if number == 1 and row and row[0].strip().lower() == 'item':
+                continue  # Header
+            if len(row) > 3:
+                rejected.append((number, line, "too many columns (expected item,price,notes)"))
+                continue
+            fields = [field.replace('|', '/') for field in row]
+        else:
+            fields = line.split('|')
+            if len(fields) > 3:
+                rejected.append((number, line, "too many `|` fields (expected item | price | notes)"))
+                continue
+        
+        item_name, quantity, price, notes = parse_listing(' | '.join(fields))
+        if not item_name:
+            rejected.append((number, line, "no item name"))
+        elif quantity < 1:
+            rejected.append((number, line, "quantity must be at least 1"))
+        else:
+            listings.append((number, item_name, quantity, price or None, notes or None))
+    return listings, rejected
+
+def normalize_item_name(name: str) -> str:
+    """
+    Normalize an item name for lookups: case-folded, punctuation dropped,
+    whitespace collapsed.
+    
+    Examples:
+        "Gloves  of Feroxi" -> "gloves of feroxi"
+        "Sword-of-Fire!"    -> "sword of fire"
+    """
+    return ' '.join(re.sub(r"[^\w\s']|_", ' ', name.casefold()).replace("'", '').split())
@@ -0,0 +1,92 @@
+import json
+import os
+import re
+from typing import Dict, Iterable, Optional
+
+# Resolved from this file, like the item catalog
+PRICES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'prices.json')
+
+_AMOUNT = re.compile(r'(\d+(?:\.\d+)?)\s*([a-z]*)')
+
+class PriceModel:
+    """Converts free-text prices to integer amounts of the base unit"""
+
+    def __init__(self, base_unit: str, denominations: Dict[str, int], names: Iterable[str] = ()):
+        self.base_unit = base_unit
+        self.denominations = {unit.lower(): int(value) for unit, value in denominations.items()}
+        self.denominations.setdefault(base_unit.lower(), 1)
+        # Words for the currency itself ("gold"), read as the base unit
+        self.names = {name.lower() for name in names}
+
+    def parse(self, text: Optional[str]) -> Optional[int]:
+        """
+        Parse the first amount in a price into base units (None if unparseable)
+        
+        Examples (with g = 1, mg = 1,000,000):
+            "1.5mg"          -> 1500000
+            "500g"           -> 500
+            "1,500 g each"   -> 1500
+            "500 gold"       -> 500  (with "gold" among the currency names)
+            "2k gold"        -> 2000
+            "90"             -> 90
+            "best offer"     -> None
+        """
+        if not text:
+            return None
+
+        text = text.lower()
+        # "1,500" is a thousands separator, "1,5" a decimal comma
+        text = re.sub(r'(?<=\d),(?=\d{3}(?!\d))', '', text)
+        text = re.sub(r'(?<=\d),(?=\d)', '.', text)
+
+        match = _AMOUNT.search(text)
+        if not match:
+            return None
+
+        amount, unit = match.groups()
+        if unit in self.names:
+            unit = self.base_unit.lower()
+        multiplier = self.denominations.get(unit or self.base_unit.lower())
+        if multiplier is None:
+            return None
+        return round(float(amount) * multiplier)
+
+    def format(self, value: Optional[int]) -> str:
+        """Format base units with the largest denomination that fits, e.g. 1500000 -> '1.5mg'"""
+        if value is None:
+            return "-"
+
+        # Prefer the longest name for each multiplier ("mg" over "m")
+        units = {}
+        for unit, multiplier in self.denominations.items():
+            if len(unit) > len(units.get(multiplier, '')):
+                units[multiplier] = unit
+
+        for multiplier in sorted(units, reverse=True):
+            if value >= multiplier:
+                amount = f"{value / multiplier:.2f}".rstrip('0').rstrip('.')
+                return f"{amount}{units[multiplier]}"
+        return f"{value}{self.base_unit}"
+
+def load_price_model(path: str = PRICES_PATH) -> PriceModel:
+    """Load denominations and currency names from a JSON file"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return PriceModel(data.get('base_unit', 'g'), data.get('denominations', {}), data.get('names', []))
+
+_price_model: Optional[PriceModel] = None
+
+def get_price_model() -> PriceModel:
+    """Get the shared price model, loading it on first use"""
+    global _price_model
+    if _price_model is None:
+        _price_model = load_price_model()
+    return _price_model
+
+def parse_price(text: Optional[str]) -> Optional[int]:
+    """Parse a free-text price into base units with the shared price model"""
+    return get_price_model().parse(text)
+
+def format_price(value: Optional[int]) -> str:
+    """Format base units with the shared price model"""
+    return get_price_model().format(value)
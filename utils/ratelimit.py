@@ -0,0 +1,185 @@
+"""
+Rate limiting and admission control for slash commands.
+
+@rate_limit() is an app command check combining two token buckets - one per
+user per command, one per command shared by everyone - with a global cap on
+storage calls in flight. A user spamming a command runs out of tokens and
+gets a "slow down" reply without touching the database, and when too many
+storage calls are already waiting the command is turned away straight away
+with "market busy" instead of joining an ever longer queue.
+
+Commands whose cost is only known once their input is (a bulk post of many
+listings, submitted from a form) call spend() from their handler instead,
+charging several tokens at once.
+
+Buckets are kept in memory in least-recently-used order. A bucket left idle
+long enough to refill completely is no different from a new one, so those
+are evicted from the front as part of each check; both the check and the
+eviction are O(1) (amortized).
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional
+
+import discord
+from discord import app_commands
+
+from database import async_db
+from utils.metrics import MetricsTree, metrics
+
+class Limit(NamedTuple):
+    """At most `count` calls per `per` seconds (bursts of up to `count`)"""
+    count: int
+    per: float
+
+# Default buckets: per user per command, and per command across all users
+USER_LIMIT = Limit(5, 10.0)
+COMMAND_LIMIT = Limit(50, 1.0)
+
+# Storage calls in flight (queued or running) above which commands are turned
+# away, unless MAX_DB_IN_FLIGHT says otherwise
+DEFAULT_MAX_DB_IN_FLIGHT = 64
+
+class Throttled(app_commands.CheckFailure):
+    """A command turned away by @rate_limit(); the message is sent to the user"""
+
+class RateLimited(Throttled):
+    def __init__(self, command: str, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"⏳ Slow down! You can use `/{command}` again in {max(retry_after, 1):.0f}s.")
+
+class MarketBusy(Throttled):
+    def __init__(self):
+        super().__init__("🚧 The market is busy right now, please retry in a few seconds.")
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+class TokenBuckets:
+    """One token bucket per key, all with the same limit"""
+
+    def __init__(self, limit: Limit):
+        self.limit = limit
+        self.rate = limit.count / limit.per  # Tokens per second
+        self._buckets: 'OrderedDict[Hashable, _Bucket]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _refill(self, key: Hashable, now: float) -> _Bucket:
+        self._evict(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(float(self.limit.count), now)
+        else:
+            bucket.tokens = min(self.limit.count, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _evict(self, now: float):
+        """Drop buckets that have been idle long enough to be full again"""
+        while self._buckets:
+            bucket = next(iter(self._buckets.values()))
+            if now - bucket.updated < self.limit.per:
+                return
+            self._buckets.popitem(last=False)
+
+    def retry_after(self, key: Hashable, now: float, tokens: float = 1) -> float:
+        """Seconds until key has `tokens` tokens (0 if it has them now); a
+        cost above the limit counts as a full bucket"""
+        bucket = self._refill(key, now)
+        tokens = min(tokens, self.limit.count)
+        return 0.0 if bucket.tokens >= tokens else (tokens - bucket.tokens) / self.rate
+
+    def take(self, key: Hashable, now: float, tokens: float = 1):
+        """Spend some of key's tokens (check retry_after() first)"""
+        self._refill(key, now).tokens -= min(tokens, self.limit.count)
+
+# Shared by every rate-limited command
+user_buckets = TokenBuckets(USER_LIMIT)
+command_buckets = TokenBuckets(COMMAND_LIMIT)
+
+def max_db_in_flight() -> int:
+    """The MAX_DB_IN_FLIGHT cap, read when used (so a .env loaded after
+    import still applies)"""
+    try:
+        return int(os.getenv('MAX_DB_IN_FLIGHT', DEFAULT_MAX_DB_IN_FLIGHT))
+    except ValueError:
+        return DEFAULT_MAX_DB_IN_FLIGHT
+
+def market_busy() -> bool:
+    """Whether storage calls in flight have reached max_db_in_flight()"""
+    return sum(async_db.in_flight().values()) >= max_db_in_flight()
+
+def _charge(per_user: Optional[TokenBuckets], per_command: Optional[TokenBuckets], admission: bool,
+            name: str, user_id: int, cost: float = 1):
+    """Spend cost tokens from both buckets, or raise Throttled"""
+    if admission and market_busy():
+        raise MarketBusy()
+
+    now = time.monotonic()
+    user_key = (name, user_id)
+
+    # Check both buckets before spending from either
+    wait = max(per_user.retry_after(user_key, now, cost) if per_user is not None else 0.0,
+               per_command.retry_after(name, now, cost) if per_command is not None else 0.0)
+    if wait:
+        raise RateLimited(name, wait)
+    if per_user is not None:
+        per_user.take(user_key, now, cost)
+    if per_command is not None:
+        per_command.take(name, now, cost)
+
+async def reject(interaction: discord.Interaction, name: str, error: Throttled):
+    """Count a turned-away command and tell the user why"""
+    metrics.reject_command(name, 'busy' if isinstance(error, MarketBusy) else 'rate_limited')
+    if not interaction.response.is_done():
+        try:
+            await interaction.response.send_message(str(error), ephemeral=True)
+        except discord.HTTPException:
+            pass  # Interaction expired
+
+async def spend(interaction: discord.Interaction, name: str, cost: float = 1) -> bool:
+    """Charge /name's default buckets cost tokens from inside its handler
+    (or a form it opened), with the admission check. Returns False - after
+    answering the user, like @rate_limit() - if the command is turned away."""
+    try:
+        _charge(user_buckets, command_buckets, True, name, interaction.user.id, cost)
+    except Throttled as error:
+        await reject(interaction, name, error)
+        return False
+    return True
+
+def rate_limit(user: Optional[Limit] = USER_LIMIT, command: Optional[Limit] = COMMAND_LIMIT,
+               admission: bool = True):
+    """App command check: per-user and per-command token buckets (None to
+    skip one) and, with admission, the global cap on storage calls in flight.
+
+    Commands given a limit other than the default get buckets of their own.
+    """
+    per_user = user_buckets if user == USER_LIMIT else TokenBuckets(user) if user else None
+    per_command = command_buckets if command == COMMAND_LIMIT else TokenBuckets(command) if command else None
+
+    async def predicate(interaction: discord.Interaction) -> bool:
+        _charge(per_user, per_command, admission, interaction.command.qualified_name, interaction.user.id)
+        return True
+
+    return app_commands.check(predicate)
+
+class RateLimitedTree(MetricsTree):
+    """MetricsTree that answers commands turned away by @rate_limit()
+    (counted as rejections rather than timed) instead of logging them"""
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if not isinstance(error, Throttled):
+            await super().on_error(interaction, error)
+            return
+
+        interaction.extras.pop('started', None)
+        await reject(interaction, interaction.command.qualified_name if interaction.command else 'unknown', error)